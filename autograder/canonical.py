@@ -0,0 +1,306 @@
+# canonical forms of mentor files, so that submissions that differ only in
+# comments, whitespace, the order of their transitions or rules, or the names of
+# their states or nonterminals are recognized as the same (see 'verdict_memo_dir'
+# in grader.py). the canonical form of a file is again a valid mentor file of
+# the same type, describing the same language, and two files only have the same
+# canonical form if they describe the same language (or are both invalid).
+#
+# files that can't be parsed here (e.g., because they have a syntax error, or
+# use symbols that the parser here doesn't handle) still get a canonical form,
+# which only leaves out comments and extra whitespace.
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# comments, for each file type. mentor only recognizes a comment where a new
+# token could start (e.g., "q0/*x*/" is a state named "q0/*x*/"), and an
+# unterminated /* comment runs to the end of the file. cfg and re files only
+# have // comments, which start anywhere, and htm files only have // comments
+# (where a comment can also follow "[[" or "]]").
+boundary = r"(?:^|(?<=[\s{}(),])|(?<=->))"
+htm_boundary = r"(?:^|(?<=[\s{}(),\[\]]))"
+line_comment = r"//[^\n]*"
+block_comment = r"/\*.*?(?:\*/|\Z)"
+automaton_comments = re.compile(rf"{boundary}(?:{line_comment}|{block_comment})", re.S)
+comment_patterns = {
+    "dfa": automaton_comments,
+    "nfa": automaton_comments,
+    "pda": automaton_comments,
+    "tm": automaton_comments,
+    "re": re.compile(line_comment),
+    "cfg": re.compile(line_comment),
+    "htm": re.compile(rf"{htm_boundary}{line_comment}"),
+}
+
+# the names of states and nonterminals, which are alphanumeric.
+name_pattern = r"[A-Za-z0-9]+"
+
+# whitespace within a line. the parsers here don't allow anything to continue on
+# the next line where mentor might not allow it either, so that a file mentor
+# rejects never gets the same canonical form as a file mentor accepts.
+space = r"[ \t]*"
+
+# the alphabet symbols that the automaton parser handles, for each file type.
+# dfa and nfa symbols are alphanumeric strings; pda and tm symbols are single
+# characters, of which only those that can't be confused with the syntax are
+# handled.
+symbol_patterns = {
+    "dfa": name_pattern,
+    "nfa": name_pattern,
+    "pda": r"[^\s{}()._,\-><|\"]",
+    "tm": r"[^\s{}()._,\-><|\"]",
+}
+
+
+# return the canonical form of the given contents of a mentor file of the given
+# type.
+def CanonicalForm(content: str, file_type: str) -> str:
+    if file_type in comment_patterns:
+        content = comment_patterns[file_type].sub("", content)
+    canonical = None
+    if file_type in symbol_patterns:
+        canonical = CanonicalAutomaton(content, file_type)
+    elif file_type == "cfg":
+        canonical = CanonicalGrammar(content)
+    if canonical is None:
+        canonical = NormalizedLines(content)
+    return canonical
+
+
+# return the given contents (without comments) with each line's whitespace
+# collapsed into single spaces and without empty lines.
+def NormalizedLines(content: str) -> str:
+    lines = [" ".join(line.split()) for line in content.splitlines()]
+    return "".join(line + "\n" for line in lines if line)
+
+
+# return a mapping from the given states to canonical names, assigned in the
+# order in which a breadth-first search from 'start' reaches them. 'edges' maps
+# each state to its outgoing edges as pairs (label, destination), where the
+# label doesn't depend on the names of states (e.g., a string or a tuple of
+# strings); edges are followed in the order of their labels, and edges with the
+# same label in the order of their destinations' signatures, which summarize
+# each state without depending on the names of states either (e.g., its labels).
+# states that can't be reached from 'start' are named last, in the order of
+# their original names. 'fixed' states keep their names.
+def CanonicalNames(
+    start: str,
+    states: List[str],
+    edges: Dict[str, List[Tuple[Any, str]]],
+    signatures: Dict[str, Any],
+    prefix: str,
+    fixed=(),
+) -> Dict[str, str]:
+    names = {state: state for state in fixed}
+    order = []
+
+    def Visit(state):
+        if state not in names:
+            names[state] = f"{prefix}{len(order)}"
+            order.append(state)
+
+    Visit(start)
+    for state in order:  # 'order' grows as new states are reached.
+        for _, _, destination in sorted(
+            (label, signatures.get(destination, ()), destination)
+            for label, destination in edges.get(state, [])
+        ):
+            Visit(destination)
+    for state in sorted(states):
+        Visit(state)
+    return names
+
+
+# return the canonical form of a dfa, nfa, pda, or tm (without comments), or
+# None if it can't be parsed. every transition is written out separately, with
+# sets of symbols and '.' expanded into one transition per symbol, and the
+# states are renamed in a canonical order. each line of transitions stays a
+# separate line, with its transitions sorted.
+def CanonicalAutomaton(content: str, file_type: str) -> Optional[str]:
+    symbol = symbol_patterns[file_type]
+    header = (
+        rf"\s*alphabet:{space}\{{{space}((?:{symbol})(?:{space},{space}(?:{symbol}))*)"
+        rf"{space}\}}\s*start:{space}({name_pattern})"
+    )
+    if file_type != "tm":
+        names = rf"(?:{name_pattern}(?:{space},{space}{name_pattern})*)?"
+        header += rf"\s*accepting:{space}\{{{space}({names}){space}\}}"
+    match = re.match(header, content)
+    if not match:
+        return None
+    alphabet = [s.strip() for s in match.group(1).split(",")]
+    start = match.group(2)
+    accepting = []
+    if file_type != "tm" and match.group(3).strip():
+        accepting = [s.strip() for s in match.group(3).split(",")]
+
+    # the rest is a sequence of states, each followed by its transitions. each
+    # line of transitions is kept as a pair (source, [(label, destination),
+    # ...]).
+    state_lines = []
+    rest = content[match.end() :]
+    state_pattern = re.compile(rf"\s*({name_pattern})((?:{space}\([^()\n]*\))+)")
+    position = 0
+    while rest[position:].strip():
+        state_match = state_pattern.match(rest, position)
+        if not state_match:
+            return None
+        position = state_match.end()
+        transitions = []
+        for transition in re.findall(r"\(([^()]*)\)", state_match.group(2)):
+            expanded = ExpandTransition(transition, file_type, alphabet)
+            if expanded is None:
+                return None
+            transitions += expanded
+        state_lines.append((state_match.group(1), transitions))
+
+    edges: Dict[str, List[Tuple[Any, str]]] = {}
+    states = [start] + accepting
+    for source, transitions in state_lines:
+        edges.setdefault(source, []).extend(transitions)
+        states += [source] + [destination for _, destination in transitions]
+    signatures = {
+        state: (state in accepting, sorted(label for label, _ in edges[state]))
+        for state in edges
+    }
+    fixed = ["accept", "reject"] if file_type == "tm" else []
+    names = CanonicalNames(start, states, edges, signatures, "q", fixed)
+
+    lines = ["alphabet: {" + ", ".join(alphabet) + "}", f"start: {names[start]}"]
+    if file_type != "tm":
+        renamed = sorted(names[state] for state in accepting)
+        lines.append("accepting: {" + ", ".join(renamed) + "}")
+    state_lines = sorted(
+        (
+            len(names[source]),
+            names[source],
+            sorted(label + names[destination] for label, destination in transitions),
+        )
+        for source, transitions in state_lines
+    )
+    for _, source, transitions in state_lines:
+        lines.append(source + "".join(f" ({t})" for t in transitions))
+    return "".join(line + "\n" for line in lines)
+
+
+# return the given transition (the text between its parentheses) of an
+# automaton of the given type as a list of pairs (label, destination), one for
+# each symbol it reads, or None if it can't be parsed. the label is the
+# transition up to the destination, which comes last.
+def ExpandTransition(
+    transition: str, file_type: str, alphabet: List[str]
+) -> Optional[List[Tuple[str, str]]]:
+    symbol = symbol_patterns[file_type]
+    element = rf"(?:{symbol}|_)"
+    elements = rf"{element}(?:{space},{space}{element})*"
+    read = rf"(\.|_|{symbol}|\{{{space}{elements}{space}\}})"
+    if file_type in ["dfa", "nfa"]:
+        pattern = rf"{space}{read}{space}->{space}({name_pattern}){space}"
+    elif file_type == "pda":
+        pop = rf"(_|{symbol})"
+        push = rf"(_|\"\"|(?:{symbol})+)"
+        pattern = (
+            rf"{space}{read}{space},{space}{pop}{space}->{space}{push}{space},"
+            rf"{space}({name_pattern}){space}"
+        )
+    else:
+        write = rf"(\.|_|{symbol})"
+        pattern = (
+            rf"{space}{read}{space}->{space}{write}{space},{space}([LRSH])[ \t]+"
+            rf"({name_pattern}){space}"
+        )
+    match = re.fullmatch(pattern, transition)
+    if not match:
+        return None
+    groups = list(match.groups())
+    destination = groups.pop()
+
+    # the symbols read. '.' is any symbol of the alphabet, which for a tm also
+    # includes the blank '_'.
+    if groups[0] == ".":
+        reads = alphabet + (["_"] if file_type == "tm" else [])
+    elif groups[0].startswith("{"):
+        reads = [s.strip() for s in groups[0][1:-1].split(",")]
+    else:
+        reads = [groups[0]]
+
+    expanded = []
+    for read_symbol in reads:
+        if file_type in ["dfa", "nfa"]:
+            label = f"{read_symbol} -> "
+        elif file_type == "pda":
+            label = f"{read_symbol}, {groups[1]} -> {groups[2]}, "
+        else:
+            # a '.' written after reading a set of symbols or '.' means the
+            # symbol that was read.
+            write_symbol = groups[1]
+            if write_symbol == "." and groups[0] != read_symbol:
+                write_symbol = read_symbol
+            label = f"{read_symbol} -> {write_symbol},{groups[2]} "
+        expanded.append((label, destination))
+    return expanded
+
+
+# return the canonical form of a cfg (without comments), or None if it can't be
+# parsed. the alternatives of each rule are sorted and the nonterminals are
+# renamed in a canonical order, except for the start symbol's rules coming
+# first. rules for the same nonterminal on different lines stay separate.
+def CanonicalGrammar(content: str) -> Optional[str]:
+    rules = []  # (nonterminal, [[token, ...], ...]) pairs, one for each line
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        match = re.fullmatch(rf"\s*({name_pattern})\s*->(.*)", line)
+        if not match:
+            return None
+        alternatives = [
+            alternative.split() for alternative in match.group(2).split("|")
+        ]
+        if any(not tokens for tokens in alternatives):
+            return None
+        rules.append((match.group(1), alternatives))
+    if not rules:
+        return None
+
+    # tokens that aren't nonterminals are terminals. the new names mustn't be
+    # mistaken for terminals, so if any terminal looks like one of them, keep
+    # the original names.
+    nonterminals = {nonterminal for nonterminal, _ in rules}
+    terminals = {
+        token
+        for _, alternatives in rules
+        for tokens in alternatives
+        for token in tokens
+        if token not in nonterminals
+    }
+    if any(re.fullmatch(r"N[0-9]+", token) for token in terminals):
+        names = {nonterminal: nonterminal for nonterminal in nonterminals}
+    else:
+        # an edge's label is its alternative with every nonterminal replaced by
+        # '#', so that it doesn't depend on the names of nonterminals, and the
+        # position of the nonterminal in it.
+        edges: Dict[str, List[Tuple[Any, str]]] = {}
+        signatures: Dict[str, Any] = {}
+        for nonterminal, alternatives in rules:
+            for tokens in alternatives:
+                label = " ".join("#" if t in nonterminals else t for t in tokens)
+                signatures.setdefault(nonterminal, []).append(label)
+                for position, token in enumerate(tokens):
+                    if token in nonterminals:
+                        edges.setdefault(nonterminal, []).append(
+                            ((label, position), token)
+                        )
+        for labels in signatures.values():
+            labels.sort()
+        names = CanonicalNames(rules[0][0], list(nonterminals), edges, signatures, "N")
+
+    lines = []
+    for index, (nonterminal, alternatives) in enumerate(rules):
+        renamed = sorted(
+            " ".join(names.get(token, token) for token in tokens)
+            for tokens in alternatives
+        )
+        line = f"{names[nonterminal]} -> " + " | ".join(renamed)
+        # the first line stays first, since it gives the start symbol.
+        lines.append((index != 0, len(names[nonterminal]), names[nonterminal], line))
+    return "".join(line + "\n" for *_, line in sorted(lines))
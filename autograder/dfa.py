@@ -0,0 +1,257 @@
+# an in-process replacement for mentor's compare command on two dfa files, so
+# that grading the most common regular language problems doesn't need to start
+# mentor at all (see 'native_dfa_compare' in grader.py). ParseDfa() only accepts
+# dfa files that are certainly valid, in a plain layout; for anything else
+# (e.g., an invalid dfa, whose error message has to come from mentor) it returns
+# None and the grader uses mentor as usual. CompareDfas() gives exactly the same
+# output as mentor's compare.
+
+import re
+from typing import Any, Dict, List, Optional
+
+from canonical import comment_patterns, space
+
+# the alphabet symbols and state names that ParseDfa() handles.
+symbol_pattern = r"[A-Za-z0-9]"
+name_pattern = r"[A-Za-z0-9]+"
+
+# the largest product automaton (the number of states of one dfa times the
+# number of states of the other) that CompareDfas() explores.
+max_product_states = 10**7
+
+
+# parse the contents of a dfa file. returns a record in the format:
+#
+# { 'alphabet': [<symbol>, ...], // in the order they were declared
+#   'states': <int>, // the number of states, which are numbered from 0 (the
+#                    // start state) in the order they were declared
+#   'transitions': [[<state>, ...], ...], // the state reached from each state
+#                                         // on each symbol, in alphabet order
+#   'accepting': [<bool>, ...], // for each state
+# }
+#
+# or None if the file isn't a dfa that is certainly valid: a header of one line
+# each for the alphabet, the start state, and the accepting states, followed by
+# one line for each state with exactly one transition for each symbol of the
+# alphabet, and nothing else (besides comments and blank lines).
+def ParseDfa(content: str) -> Optional[Dict[str, Any]]:
+    # anything but printable ascii might be read differently by mentor.
+    if not re.fullmatch(r"[\x20-\x7e\t\n]*", content):
+        return None
+    content = comment_patterns["dfa"].sub("", content)
+    lines = [line.strip(" \t") for line in content.split("\n")]
+    lines = [line for line in lines if line]
+    if len(lines) < 4:
+        return None
+
+    symbols = rf"({symbol_pattern}(?:{space},{space}{symbol_pattern})*)"
+    match = re.fullmatch(rf"alphabet:{space}\{{{space}{symbols}{space}\}}", lines[0])
+    if not match:
+        return None
+    alphabet = []
+    for symbol in re.split(rf"{space},{space}", match.group(1)):
+        if symbol not in alphabet:
+            alphabet.append(symbol)
+
+    match = re.fullmatch(rf"start:[ \t]+({name_pattern})", lines[1])
+    if not match:
+        return None
+    start = match.group(1)
+
+    names = rf"((?:{name_pattern}(?:{space},{space}{name_pattern})*)?)"
+    match = re.fullmatch(rf"accepting:{space}\{{{space}{names}{space}\}}", lines[2])
+    if not match:
+        return None
+    accepting = set(re.split(rf"{space},{space}", match.group(1))) - {""}
+
+    # each state line, as the state and its transitions as a mapping from
+    # symbols to destinations.
+    state_transitions: Dict[str, Dict[str, str]] = {}
+    read = rf"(\.|{symbol_pattern}|\{{{space}{symbols}{space}\}})"
+    transition_pattern = re.compile(
+        rf"{space}\({space}{read}{space}->{space}({name_pattern}){space}\)"
+    )
+    for line in lines[3:]:
+        match = re.match(name_pattern, line)
+        if not match or match.group() in state_transitions:
+            return None
+        transitions: Dict[str, str] = {}
+        position = match.end()
+        while position < len(line):
+            transition = transition_pattern.match(line, position)
+            if not transition:
+                return None
+            position = transition.end()
+            if transition.group(1) == ".":
+                reads = alphabet
+            elif transition.group(1).startswith("{"):
+                reads = re.split(rf"{space},{space}", transition.group(2))
+            else:
+                reads = [transition.group(1)]
+            for symbol in reads:
+                if symbol not in alphabet or symbol in transitions:
+                    return None
+                transitions[symbol] = transition.group(3)
+        if len(transitions) != len(alphabet):
+            return None
+        state_transitions[match.group()] = transitions
+
+    states = list(state_transitions)
+    if start not in state_transitions:
+        return None
+    states.remove(start)
+    states.insert(0, start)
+    numbers = {state: number for number, state in enumerate(states)}
+    if not accepting <= numbers.keys():
+        return None
+    for transitions in state_transitions.values():
+        if not set(transitions.values()) <= numbers.keys():
+            return None
+    return {
+        "alphabet": alphabet,
+        "states": len(states),
+        "transitions": [
+            [numbers[state_transitions[state][symbol]] for symbol in alphabet]
+            for state in states
+        ],
+        "accepting": [state in accepting for state in states],
+    }
+
+
+# compare a student dfa against a solution dfa (both from ParseDfa()), and
+# return the output of mentor's compare command for them ('student' compare
+# 'solution'), or None if the dfas are too large to compare here (see
+# 'max_product_states'). the output either says that the languages are
+# equivalent, or gives the shortest word (first in shortlex order, using the
+# order of the student's alphabet) that the student's dfa wrongly accepts and
+# the one that it wrongly rejects, if any.
+#
+# this uses numpy if it is installed, which is much faster for large dfas;
+# numpy is optional, so without it this explores the states one at a time.
+def CompareDfas(student: Dict[str, Any], solution: Dict[str, Any]) -> Optional[str]:
+    if set(student["alphabet"]) != set(solution["alphabet"]):
+        return "The alphabet does not match the reference solution's alphabet.\n"
+    if student["states"] * solution["states"] > max_product_states:
+        return None
+
+    # the solution's transitions, with its symbols in the student's order.
+    order = [solution["alphabet"].index(s) for s in student["alphabet"]]
+    solution_transitions = [
+        [transitions[i] for i in order] for transitions in solution["transitions"]
+    ]
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        words = DistinguishingWordsNumpy(np, student, solution, solution_transitions)
+    else:
+        words = DistinguishingWords(student, solution, solution_transitions)
+    wrongly_accepted, wrongly_rejected = words
+
+    if wrongly_accepted is None and wrongly_rejected is None:
+        return "The languages are equivalent.\n"
+    output = ""
+    if wrongly_accepted is not None:
+        output += f"The input {wrongly_accepted or 'ε'} should be rejected.\n"
+    if wrongly_rejected is not None:
+        output += f"The input {wrongly_rejected or 'ε'} should be accepted.\n"
+    return output
+
+
+# explore the product of the two dfas breadth-first, with the symbols in the
+# student's alphabet order, so that each pair of states is first reached by the
+# first word in shortlex order that leads to it. returns a pair (the first word
+# that the student's dfa accepts but the solution rejects, the first word that
+# the solution accepts but the student's dfa rejects), with None for either if
+# there is no such word.
+def DistinguishingWords(student, solution, solution_transitions):
+    alphabet = student["alphabet"]
+    found: List[Optional[str]] = [None, None]
+    # the word that first reaches each pair of states, as (previous pair,
+    # symbol), with the start pair reached by the empty word.
+    reached = {(0, 0): None}
+    frontier = [(0, 0)]
+    while frontier and None in found:
+        for pair in frontier:
+            accepted = (student["accepting"][pair[0]], solution["accepting"][pair[1]])
+            if accepted == (True, False) and found[0] is None:
+                found[0] = Word(reached, pair)
+            elif accepted == (False, True) and found[1] is None:
+                found[1] = Word(reached, pair)
+        next_frontier = []
+        for pair in frontier:
+            for i, symbol in enumerate(alphabet):
+                next_pair = (
+                    student["transitions"][pair[0]][i],
+                    solution_transitions[pair[1]][i],
+                )
+                if next_pair not in reached:
+                    reached[next_pair] = (pair, symbol)
+                    next_frontier.append(next_pair)
+        frontier = next_frontier
+    return (found[0], found[1])
+
+
+# return the word that first reaches 'pair' (see DistinguishingWords()).
+def Word(reached, pair) -> str:
+    symbols = []
+    while reached[pair] is not None:
+        pair, symbol = reached[pair]
+        symbols.append(symbol)
+    return "".join(reversed(symbols))
+
+
+# DistinguishingWords() using numpy, exploring each level of the breadth-first
+# search all at once.
+def DistinguishingWordsNumpy(np, student, solution, solution_transitions):
+    alphabet = student["alphabet"]
+    size = solution["states"]
+    student_transitions = np.array(student["transitions"], dtype=np.int64)
+    solution_transitions = np.array(solution_transitions, dtype=np.int64)
+    student_accepting = np.array(student["accepting"], dtype=bool)
+    solution_accepting = np.array(solution["accepting"], dtype=bool)
+
+    # pairs of states are numbered student state * size + solution state. the
+    # word that first reaches each pair is kept as the previous pair and the
+    # index of the symbol, with -1 for pairs that weren't reached yet.
+    previous = np.full(student["states"] * size, -1, dtype=np.int32)
+    symbol = np.zeros(student["states"] * size, dtype=np.int32)
+    previous[0] = 0
+
+    def GetWord(pair) -> str:
+        symbols = []
+        while pair != 0:
+            symbols.append(alphabet[symbol[pair]])
+            pair = int(previous[pair])
+        return "".join(reversed(symbols))
+
+    found: List[Optional[str]] = [None, None]
+    frontier = np.zeros(1, dtype=np.int64)
+    while len(frontier) and None in found:
+        student_states = frontier // size
+        solution_states = frontier % size
+        accepted = student_accepting[student_states]
+        expected = solution_accepting[solution_states]
+        for index, mask in enumerate([accepted & ~expected, ~accepted & expected]):
+            hits = np.flatnonzero(mask)
+            if found[index] is None and len(hits):
+                found[index] = GetWord(int(frontier[hits[0]]))
+
+        # the successors of the frontier, in order of the frontier and then of
+        # the symbols; only the first occurrence of each new pair is kept.
+        next_pairs = (
+            student_transitions[student_states] * size
+            + solution_transitions[solution_states]
+        ).ravel()
+        parents = np.repeat(frontier, len(alphabet))
+        symbols = np.tile(np.arange(len(alphabet)), len(frontier))
+        _, first = np.unique(next_pairs, return_index=True)
+        first.sort()
+        first = first[previous[next_pairs[first]] == -1]
+        frontier = next_pairs[first]
+        previous[frontier] = parents[first]
+        symbol[frontier] = symbols[first]
+    return (found[0], found[1])
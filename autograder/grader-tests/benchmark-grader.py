@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+# end-to-end benchmark for grader.py, run locally instead of on gradescope. each
+# benchmarked submission runs a copy of grader.py, with its paths pointed at a
+# temporary directory, on a set of submitted files, solutions, and submission
+# metadata. reports submissions graded per second, the p50/p99 time to grade a
+# submission, and the peak memory use.
+#
+# by default the submissions are synthetic (see MakeSyntheticSet()) and are
+# graded using fake-mentor.py, so that this measures the grader itself rather
+# than mentor; --latency and --output-bytes make the fake mentor commands slower
+# and their output larger. with --tests the submissions are the ones in
+# test-submissions/ and test-solutions/ instead, and --mentor can be used to
+# grade them with the real mentor.
+#
+# usage: ./benchmark-grader.py [--tests] [--submissions N] [--jobs N] ...
+#        (see ./benchmark-grader.py --help)
+
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+autograder_dir = os.path.dirname(tests_dir)
+
+
+# write a synthetic set of 'num_problems' problems into 'set_dir': solutions in
+# 'set_dir'/solutions, submitted files in 'set_dir'/submission, and submission
+# metadata with 'history' previous submissions in 'set_dir'/metadata.json. the
+# problems cycle through the three language classes, and are a mix of correct
+# submissions, incorrect submissions, and submissions with errors (see
+# fake-mentor.py).
+def MakeSyntheticSet(set_dir: str, num_problems: int, history: int, num_words: int):
+    os.makedirs(os.path.join(set_dir, "solutions"))
+    os.makedirs(os.path.join(set_dir, "submission"))
+
+    def Write(subdir, name, content):
+        with open(os.path.join(set_dir, subdir, name), "w") as handle:
+            handle.write(content)
+
+    for i in range(num_problems):
+        problem_id = f"p{i}"
+        if i % 10 == 9:
+            submission = "// fake: error\r\n"
+        elif (i // 3) % 2 == 1:
+            submission = "// fake: incorrect\r\n"
+        else:
+            submission = "// fake: correct\r\n"
+        file_type = ["dfa", "cfg", "htm"][i % 3]
+        if file_type == "dfa":
+            Write("solutions", f"{problem_id}.1.dfa.dfa", "// fake: correct\n")
+        elif file_type == "cfg":
+            Write("solutions", f"{problem_id}.1.{num_words}.cfg.cfg", "// fake\n")
+        else:
+            Write(
+                "solutions",
+                f"{problem_id}.1.1000.htm.wordlist",
+                "## ACCEPT ##\nab\n## REJECT ##\nc\n",
+            )
+        Write("submission", f"{problem_id}.{file_type}", submission)
+
+    # the previous submissions are all older than the cooldown period, so that
+    # every problem gets graded.
+    now = datetime.datetime(2018, 7, 1, 14, 22, 32, 365935)
+    previous_submissions = []
+    for h in range(history):
+        submission_time = now - datetime.timedelta(hours=h + 1)
+        tests = [
+            {
+                "name": f"p{i}",
+                "score": random.randint(0, 1),
+                "output": "",
+                "extra_data": {
+                    "graded": True,
+                    "grading-time": round(random.uniform(0, 1), 3),
+                },
+            }
+            for i in range(num_problems)
+        ]
+        previous_submissions.append(
+            {
+                "submission_time": submission_time.isoformat() + "-07:00",
+                "results": {"tests": tests},
+            }
+        )
+    metadata = {
+        "created_at": now.isoformat() + "-07:00",
+        "previous_submissions": previous_submissions,
+    }
+    Write("", "metadata.json", json.dumps(metadata))
+
+
+# write the test set from test-submissions/ and test-solutions/ into 'set_dir',
+# in the same layout as MakeSyntheticSet().
+def MakeTestSet(set_dir: str):
+    shutil.copytree(
+        os.path.join(tests_dir, "test-solutions"), os.path.join(set_dir, "solutions")
+    )
+    shutil.copytree(
+        os.path.join(tests_dir, "test-submissions"),
+        os.path.join(set_dir, "submission"),
+    )
+    metadata = {
+        "created_at": "2018-07-01T14:22:32.365935-07:00",
+        "previous_submissions": [],
+    }
+    with open(os.path.join(set_dir, "metadata.json"), "w") as handle:
+        handle.write(json.dumps(metadata))
+
+
+# return the source of grader.py with its settings (e.g., its paths) changed to
+# the given values.
+def GraderSource(settings) -> str:
+    with open(os.path.join(autograder_dir, "grader.py"), "r") as handle:
+        source = handle.read()
+    for name, value in settings.items():
+        source, count = re.subn(
+            f"^{name} = .*$", f"{name} = {value!r}", source, flags=re.M
+        )
+        assert count == 1, f"no '{name}' in grader.py"
+    return source
+
+
+# grade one submission of the set in 'set_dir' using a copy of grader.py in a
+# new directory 'run_dir'. returns a pair (seconds, peak memory in kilobytes)
+# for the grader process, including the mentor commands it ran. 'settings' are
+# further settings to change in grader.py.
+def GradeSubmission(set_dir: str, run_dir: str, mentor: str, settings):
+    # the grader converts the submitted files in place, so each run gets its own
+    # copy of them.
+    shutil.copytree(
+        os.path.join(set_dir, "submission"), os.path.join(run_dir, "submission")
+    )
+    settings = {
+        **settings,
+        "results_file": os.path.join(run_dir, "results.json"),
+        "checkpoint_file": os.path.join(run_dir, "checkpoint.json"),
+        "student_submission_dir": os.path.join(run_dir, "submission") + "/",
+        "solution_dir": os.path.join(set_dir, "solutions") + "/",
+        "submission_metadata_file": os.path.join(set_dir, "metadata.json"),
+        "mentor": mentor,
+    }
+    with open(os.path.join(run_dir, "grader.py"), "w") as handle:
+        handle.write(GraderSource(settings))
+
+    env = dict(os.environ, PYTHONPATH=autograder_dir)
+    with open(os.path.join(run_dir, "grader.log"), "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "grader.py"],
+            cwd=run_dir,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        _, status, rusage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        with open(os.path.join(run_dir, "grader.log"), "r") as log:
+            sys.exit(f"grader.py failed in {run_dir}:\n{log.read()}")
+    return (seconds, rusage.ru_maxrss)
+
+
+# return the p-th percentile of the given values, using the nearest rank.
+def Percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+parser = argparse.ArgumentParser(description="Benchmark grader.py end to end.")
+parser.add_argument(
+    "--tests",
+    action="store_true",
+    help="grade test-submissions/ against test-solutions/ instead of a synthetic set",
+)
+parser.add_argument(
+    "--mentor",
+    default=os.path.join(tests_dir, "fake-mentor.py"),
+    help="the mentor executable to use (default: fake-mentor.py)",
+)
+parser.add_argument(
+    "--submissions", type=int, default=20, help="number of submissions to grade"
+)
+parser.add_argument(
+    "--jobs", type=int, default=1, help="number of submissions to grade at once"
+)
+parser.add_argument(
+    "--problems", type=int, default=30, help="problems per synthetic submission"
+)
+parser.add_argument(
+    "--history",
+    type=int,
+    default=10,
+    help="previous submissions in the synthetic submission metadata",
+)
+parser.add_argument(
+    "--num-words",
+    type=int,
+    default=1000,
+    help="words compared for synthetic context-free problems",
+)
+parser.add_argument(
+    "--latency", type=float, default=0, help="seconds each fake mentor command takes"
+)
+parser.add_argument(
+    "--output-bytes",
+    type=int,
+    default=0,
+    help="extra bytes of output from each fake mentor command",
+)
+parser.add_argument(
+    "--keep", action="store_true", help="keep the temporary directory, for debugging"
+)
+args = parser.parse_args()
+
+os.environ["FAKE_MENTOR_LATENCY"] = str(args.latency)
+os.environ["FAKE_MENTOR_OUTPUT_BYTES"] = str(args.output_bytes)
+
+work_dir = tempfile.mkdtemp(prefix="benchmark-grader-")
+try:
+    set_dir = os.path.join(work_dir, "set")
+    settings = {}
+    if args.tests:
+        MakeTestSet(set_dir)
+    else:
+        MakeSyntheticSet(set_dir, args.problems, args.history, args.num_words)
+        # the synthetic files are only meant for fake-mentor.py, so they would
+        # all fail the grader's own checks of submitted files.
+        settings["precheck_submissions"] = False
+
+    def Run(i):
+        run_dir = os.path.join(work_dir, f"run{i}")
+        os.makedirs(run_dir)
+        return GradeSubmission(set_dir, run_dir, os.path.abspath(args.mentor), settings)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        runs = list(pool.map(Run, range(args.submissions)))
+    total = time.perf_counter() - start
+
+    latencies = [seconds for seconds, _ in runs]
+    print(
+        f"{args.submissions} submissions in {total:.2f}s: "
+        f"{args.submissions / total:.2f} submissions/s"
+    )
+    print(
+        f"latency: p50 {Percentile(latencies, 50):.3f}s, "
+        f"p99 {Percentile(latencies, 99):.3f}s"
+    )
+    print(f"peak memory: {max(rss for _, rss in runs) / 1024:.1f} MB")
+finally:
+    if args.keep:
+        print(f"kept {work_dir}")
+    else:
+        shutil.rmtree(work_dir)
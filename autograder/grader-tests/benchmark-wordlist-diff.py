@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# benchmark for ShortlexDiff() (used by the grader to compare context-free
+# wordlists) on large wordlists. if numpy is installed, also times the
+# np.setdiff1d comparison the grader used to do, and checks that both find the
+# same differences.
+#
+# usage: ./benchmark-wordlist-diff.py [<num-words> ...]
+
+import itertools
+import os.path
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from wordlist import ShortlexDiff
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# the first 'num_words' words over {a, b, d} in shortlex order, as generated by
+# mentor.
+def ShortlexWords(num_words: int):
+    words = ["ε"]
+    for length in itertools.count(1):
+        for letters in itertools.product("abd", repeat=length):
+            if len(words) == num_words:
+                return words
+            words.append("".join(letters))
+
+
+# time f(), returning (seconds, result).
+def Time(f):
+    start = time.perf_counter()
+    result = f()
+    return (time.perf_counter() - start, result)
+
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [10**5, 10**6]
+for size in sizes:
+    solution = ShortlexWords(size)
+
+    # the student wordlist for an incorrect submission: a word missing every
+    # 100 words and some extra words containing 'c', keeping shortlex order.
+    incorrect = []
+    for i, word in enumerate(solution):
+        if i % 100 != 50:
+            incorrect.append(word)
+        if i % 1000 == 500 and word.endswith("b"):
+            incorrect.append(word[:-1] + "c")
+    incorrect = incorrect[:size]
+
+    for name, student in [("correct", list(solution)), ("incorrect", incorrect)]:
+        seconds, (false_positives, false_negatives) = Time(
+            lambda: ShortlexDiff(student, solution)
+        )
+        print(
+            f"{size} words, {name}: ShortlexDiff {seconds:.3f}s "
+            f"({len(false_positives)} false positives, "
+            f"{len(false_negatives)} false negatives)"
+        )
+
+        if np is not None:
+            seconds, (np_positives, np_negatives) = Time(
+                lambda: (
+                    np.setdiff1d(student, solution),
+                    np.setdiff1d(solution, student),
+                )
+            )
+            print(f"{size} words, {name}: np.setdiff1d {seconds:.3f}s")
+            assert sorted(false_positives) == sorted(np_positives)
+            assert sorted(false_negatives) == sorted(np_negatives)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# check that the grader's in-process dfa comparison (see dfa.py) gives exactly
+# the same output as mentor's compare command. compares random pairs of dfas
+# (of random sizes, over the same alphabet declared in different orders, so that
+# the order of the distinguishing words matters) both ways, and also compares
+# the dfas in test-submissions/ and test-solutions/. prints every pair for which
+# the outputs differ and exits with an error if there are any.
+#
+# usage: ./check-dfa-compare.py [--mentor PATH] [--pairs N] [--seed N]
+
+import argparse
+import glob
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+autograder_dir = os.path.dirname(tests_dir)
+sys.path.insert(0, autograder_dir)
+from dfa import CompareDfas, ParseDfa
+
+
+# return the contents of a random dfa file over 'alphabet' with 1 to
+# 'max_states' states, using a random mix of the ways to write transitions.
+def RandomDfa(rng: random.Random, alphabet, max_states: int) -> str:
+    states = [f"q{i}" for i in range(rng.randint(1, max_states))]
+    accepting = [state for state in states if rng.random() < 0.4]
+    lines = [
+        "alphabet: {" + ", ".join(alphabet) + "}",
+        f"start: {rng.choice(states)}",
+        "accepting: {" + ", ".join(accepting) + "}",
+    ]
+    for state in rng.sample(states, len(states)):
+        destinations = {symbol: rng.choice(states) for symbol in alphabet}
+        if len(set(destinations.values())) == 1 and rng.random() < 0.5:
+            lines.append(f"{state} (. -> {destinations[alphabet[0]]})")
+            continue
+        transitions = []
+        for destination in sorted(set(destinations.values())):
+            reads = [s for s in alphabet if destinations[s] == destination]
+            if len(reads) > 1 and rng.random() < 0.5:
+                transitions.append(f"({{{', '.join(reads)}}} -> {destination})")
+            else:
+                transitions += [f"({s} -> {destination})" for s in reads]
+        rng.shuffle(transitions)
+        lines.append(f"{state} " + " ".join(transitions))
+    return "".join(line + "\n" for line in lines)
+
+
+# return the output of mentor's compare command on the given files, as the
+# grader sees it (see ExecMentor() in grader.py).
+def MentorCompare(mentor: str, student_file: str, solution_file: str) -> str:
+    process = subprocess.run(
+        [mentor, student_file, "compare", solution_file],
+        capture_output=True,
+        encoding="utf-8",
+    )
+    return process.stdout + "\n" + process.stderr
+
+
+# return the output of the in-process comparison of the given files, as the
+# grader sees it, or None if it can't compare them.
+def NativeCompare(student_file: str, solution_file: str) -> str:
+    dfas = []
+    for file in [student_file, solution_file]:
+        with open(file) as handle:
+            dfas.append(ParseDfa(handle.read()))
+    if None in dfas:
+        return None
+    output = CompareDfas(*dfas)
+    return None if output is None else output + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-check dfa.py against mentor.")
+    parser.add_argument(
+        "--mentor",
+        default=os.path.join(autograder_dir, "mentor"),
+        help="the mentor executable to check against (default: ../mentor)",
+    )
+    parser.add_argument(
+        "--pairs", type=int, default=200, help="number of random pairs of dfas"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pairs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.pairs):
+            alphabet = ["a", "b", "c", "0", "1"][: rng.randint(1, 5)]
+            files = []
+            for name in ["student", "solution"]:
+                files.append(os.path.join(tmp, f"{i}-{name}.dfa"))
+                shuffled = rng.sample(alphabet, len(alphabet))
+                with open(files[-1], "w") as handle:
+                    handle.write(RandomDfa(rng, shuffled, rng.choice([2, 4, 8, 30])))
+            pairs += [tuple(files), tuple(reversed(files))]
+
+        test_dfas = sorted(
+            glob.glob(os.path.join(tests_dir, "test-submissions", "*.dfa"))
+            + glob.glob(os.path.join(tests_dir, "test-solutions", "*.dfa"))
+        )
+        pairs += [(a, b) for a in test_dfas for b in test_dfas]
+
+        compared = 0
+        mismatches = 0
+        for student_file, solution_file in pairs:
+            native = NativeCompare(student_file, solution_file)
+            if native is None:
+                continue
+            compared += 1
+            expected = MentorCompare(args.mentor, student_file, solution_file)
+            if native != expected:
+                mismatches += 1
+                print(f"{student_file} compare {solution_file}:")
+                print(f"  mentor: {expected!r}")
+                print(f"  dfa.py: {native!r}")
+
+    print(f"compared {compared} of {len(pairs)} pairs, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# check that the grader's precheck of submitted files (see precheck.py) never
+# rejects a file that mentor accepts. makes random small edits (deleting,
+# inserting, or replacing characters, and deleting or duplicating lines) to the
+# example files and to the files in test-submissions/ and test-solutions/, and
+# runs both the precheck and mentor on each edited file. prints every file that
+# the precheck rejects but mentor accepts and exits with an error if there are
+# any. also prints how many of the files that mentor rejects the precheck
+# already catches.
+#
+# usage: ./check-precheck.py [--mentor PATH] [--edits N] [--seed N]
+
+import argparse
+import glob
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+autograder_dir = os.path.dirname(tests_dir)
+sys.path.insert(0, autograder_dir)
+from precheck import PrecheckFile
+
+# characters to insert into files, which are mostly part of the syntax.
+edit_characters = "{}(),->_.$|&*+?:; \n/aq01RLS"
+
+
+# return the given contents with a random small edit.
+def RandomEdit(rng: random.Random, content: str) -> str:
+    kind = rng.choice(["delete", "insert", "replace", "lines"])
+    position = rng.randrange(len(content) + 1)
+    if kind == "delete":
+        return content[:position] + content[position + rng.randint(1, 3) :]
+    if kind == "insert":
+        return content[:position] + rng.choice(edit_characters) + content[position:]
+    if kind == "replace":
+        replacement = rng.choice(edit_characters)
+        return content[:position] + replacement + content[position + 1 :]
+    lines = content.split("\n")
+    line = rng.randrange(len(lines))
+    if rng.random() < 0.5:
+        return "\n".join(lines[:line] + lines[line + 1 :])
+    return "\n".join(lines[: line + 1] + lines[line:])
+
+
+# return whether mentor accepts the given file, or None if it takes too long to
+# tell. the command only needs the file to be valid.
+def MentorAccepts(mentor: str, file: str, empty_wordlist: str):
+    if file.endswith((".tm", ".htm")):
+        command = [mentor, file, "accept_file", empty_wordlist]
+    else:
+        command = [mentor, file, "gen_words", "1"]
+    try:
+        process = subprocess.run(command, capture_output=True, timeout=10)
+    except subprocess.TimeoutExpired:
+        return None
+    return process.returncode == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cross-check precheck.py against mentor."
+    )
+    parser.add_argument(
+        "--mentor",
+        default=os.path.join(autograder_dir, "mentor"),
+        help="the mentor executable to check against (default: ../mentor)",
+    )
+    parser.add_argument(
+        "--edits", type=int, default=50, help="number of edited files per file"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    originals = sorted(
+        glob.glob(os.path.join(autograder_dir, "..", "examples", "*.*"))
+        + glob.glob(os.path.join(tests_dir, "test-submissions", "*.*"))
+        + glob.glob(os.path.join(tests_dir, "test-solutions", "*.*"))
+    )
+    file_types = ["dfa", "nfa", "re", "cfg", "pda", "tm", "htm"]
+    originals = [file for file in originals if file.split(".")[-1] in file_types]
+
+    rng = random.Random(args.seed)
+    counts = {"checked": 0, "rejected": 0, "caught": 0, "wrong": 0}
+    with tempfile.TemporaryDirectory() as tmp:
+        empty_wordlist = os.path.join(tmp, "empty.txt")
+        with open(empty_wordlist, "w") as handle:
+            handle.write("## ACCEPT ##\n## REJECT ##\n")
+        for original in originals:
+            file_type = original.split(".")[-1]
+            with open(original, errors="surrogateescape") as handle:
+                content = handle.read()
+            # the original, and then edited versions of it.
+            versions = [content] + [RandomEdit(rng, content) for _ in range(args.edits)]
+            for version in versions:
+                file = os.path.join(tmp, f"edited.{file_type}")
+                with open(file, "w", errors="surrogateescape") as handle:
+                    handle.write(version)
+                accepted = MentorAccepts(args.mentor, file, empty_wordlist)
+                if accepted is None:
+                    continue
+                error = PrecheckFile(version, file_type)["error"]
+                counts["checked"] += 1
+                if not accepted:
+                    counts["rejected"] += 1
+                    counts["caught"] += error is not None
+                elif error is not None:
+                    counts["wrong"] += 1
+                    print(f"edited {original}, which mentor accepts:")
+                    print("  " + version.replace("\n", "\n  "))
+                    print(f"  precheck: {error}")
+
+    print(
+        f"checked {counts['checked']} files, mentor rejected {counts['rejected']}, "
+        f"the precheck caught {counts['caught']} of those, "
+        f"and wrongly rejected {counts['wrong']}"
+    )
+    if counts["wrong"]:
+        sys.exit(1)
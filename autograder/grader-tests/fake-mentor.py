@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# a stand-in for mentor, for benchmarking the grader without mentor itself (see
+# benchmark-grader.py). it supports the mentor commands the grader uses, with
+# the same output format:
+#
+#   fake-mentor.py <file> compare <file>
+#   fake-mentor.py <file> gen_words <num-words>
+#   fake-mentor.py <file> accept <word>
+#   fake-mentor.py <file> accept_file <wordlist-file> <max-steps>
+#
+# the files aren't parsed. every file describes the language of all words over
+# {a, b}, except that a file containing "fake: incorrect" leaves out the word
+# "ab", and a file containing "fake: error" makes the command fail as if the
+# file had a syntax error.
+#
+# the environment variables FAKE_MENTOR_LATENCY (in seconds) and
+# FAKE_MENTOR_OUTPUT_BYTES make every command take at least that long and print
+# that many extra bytes to standard error, to simulate slower commands and
+# larger output.
+
+import itertools
+import os
+import sys
+import time
+
+
+# the words over {a, b} in shortlex order, with the empty word as "ε".
+def ShortlexWords():
+    yield "ε"
+    for length in itertools.count(1):
+        for letters in itertools.product("ab", repeat=length):
+            yield "".join(letters)
+
+
+# return whether the language of the given file contains the given word.
+def Accepts(content: str, word: str) -> bool:
+    if word == "ε":
+        word = ""
+    if "fake: incorrect" in content and word == "ab":
+        return False
+    return set(word) <= {"a", "b"}
+
+
+start = time.monotonic()
+with open(sys.argv[1], "r", encoding="utf-8") as handle:
+    content = handle.read()
+command = sys.argv[2]
+
+if "fake: error" in content:
+    print(f"Syntax error in {sys.argv[1]}", file=sys.stderr)
+    exit_code = 1
+elif command == "compare":
+    with open(sys.argv[3], "r", encoding="utf-8") as handle:
+        other = handle.read()
+    if Accepts(content, "ab") == Accepts(other, "ab"):
+        print("The languages are equivalent.")
+    elif Accepts(content, "ab"):
+        print("The input ab should be rejected.")
+    else:
+        print("The input ab should be accepted.")
+    exit_code = 0
+elif command == "gen_words":
+    words = (word for word in ShortlexWords() if Accepts(content, word))
+    sys.stdout.write(
+        "".join(word + "\n" for word in itertools.islice(words, int(sys.argv[3])))
+    )
+    exit_code = 0
+elif command == "accept":
+    word = sys.argv[3] if len(sys.argv) > 3 else ""
+    if Accepts(content, word):
+        print("Input is accepted.")
+    else:
+        print("Input is not accepted.")
+    exit_code = 0
+elif command == "accept_file":
+    if "fake: incorrect" in content:
+        print("Input ab should have been accepted.")
+    else:
+        print("All inputs correctly categorized.")
+    exit_code = 0
+else:
+    print(f"Unknown command: {command}", file=sys.stderr)
+    exit_code = 1
+
+output_bytes = int(os.environ.get("FAKE_MENTOR_OUTPUT_BYTES", "0"))
+sys.stderr.write(("." * 79 + "\n") * (output_bytes // 80) + "." * (output_bytes % 80))
+
+latency = float(os.environ.get("FAKE_MENTOR_LATENCY", "0"))
+time.sleep(max(0.0, latency - (time.monotonic() - start)))
+sys.exit(exit_code)
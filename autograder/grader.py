@@ -2,13 +2,37 @@
 
 import re
 import json
+import contextlib
+import hashlib
+import mmap
+import shutil
+import signal
 import subprocess
+import tempfile
+import threading
+import time
 import os.path
-import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
 from os import listdir
 from os.path import isfile, join
-from typing import Dict, List, TextIO, Any, Tuple
+from typing import Callable, Dict, List, TextIO, Any, Tuple
+from canonical import CanonicalForm
+from dfa import CompareDfas, ParseDfa
+from memo import FileDigest, MemoKey, OpenMemo, WriteMemo
+from metadata import ReadSubmissionMetadata
+from precheck import PrecheckFile
+from wordlist import (
+    CountWordlistFileWords,
+    FingerprintDiff,
+    FingerprintWordlistFile,
+    MapFingerprints,
+    ReadWordlistFile,
+    ShortlexDiff,
+    ShortlexKey,
+    WordlistFileWords,
+    WordlistFileWordsAt,
+)
 
 # the output that the grader needs to create, and where the grader output needs
 # to go for gradescope to see. format (ignoring optional fields that we don't
@@ -20,7 +44,12 @@ from typing import Dict, List, TextIO, Any, Tuple
 #       'name': <problem-id>,
 #       'score': <score>,
 #       'output': <message to student>,
-#       'extra_data': { 'graded': <bool> } // was this actually graded?
+#       'extra_data': {
+#         'graded': <bool>, // was this actually graded?
+#         'grading-time': <seconds>, // how long grading took, if it was graded
+#         'submission-hash': <hash>, // if it was graded, see ProblemHashes()
+#         'solution-hash': <hash>, // if it was graded, see ProblemHashes()
+#       }
 #     },
 #     ...
 #   ]
@@ -29,6 +58,29 @@ from typing import Dict, List, TextIO, Any, Tuple
 # each test case corresponds to one homework problem.
 results_file = "/autograder/results/results.json"
 
+# where the grader keeps track of the problems of the submission that it has
+# already graded, or None. while grading, 'results_file' is rewritten after
+# every problem that finishes (with the problems that aren't graded yet keeping
+# their previous scores), and the finished problems are recorded here, so that
+# if grading is stopped partway through (e.g., by gradescope's autograder
+# timeout) the problems graded so far aren't lost, and running the grader again
+# on the same submission only grades the problems that are left. format:
+#
+# { 'key': <hash>, // see CheckpointKey()
+#   'problems': {
+#     <problem-id>: {
+#       'hashes': <hashes>, // see ProblemHashes()
+#       'grade': <grade> // the problem's record in 'grades', see NewGrading()
+#     },
+#     ...
+#   }
+# }
+#
+# a problem is only taken from the checkpoint if neither the submitted file nor
+# the solution has changed, and the whole checkpoint is ignored if the mentor
+# executable or the settings that change the feedback have.
+checkpoint_file = "/autograder/results/checkpoint.json"
+
 # where the student's submitted files are located, provided by gradescope. not
 # all files need to be submitted every time; if a file is missing then we re-use
 # its previous score (or 0 if it hasn't been previously submitted).
@@ -95,6 +147,31 @@ student_submission_dir = "/autograder/submission/"
 # appropriate result.
 solution_dir = "/autograder/source/solutions/"
 
+# the name of the manifest of 'solution_dir', which manifest.py writes into it
+# when the autograder is zipped (see zip-autograder.sh), so that looking up a
+# problem's solution doesn't need to read any solution files. format:
+#
+# { 'files': { // every other file in 'solution_dir'
+#     <file>: { 'size': <bytes>, 'hash': <hash> }, // see FileDigest()
+#     ...
+#   },
+#   'solutions': { // for every file, its solution info (see GetSolutionInfo()),
+#                  // with its files named relative to 'solution_dir'
+#     <file>: <solution info>,
+#     ...
+#   }
+# }
+#
+# the manifest is ignored if the files in 'solution_dir' aren't the ones it
+# lists, and a solution's entry is ignored if any of its files was changed
+# after the manifest was written, so a stale manifest is never used.
+solution_manifest = "manifest.json"
+
+# the name of the record of the solution wordlists that precompute.py generated
+# in 'solution_dir' (see ReadPrecomputeRecord()). like the manifest, it isn't a
+# solution file.
+solution_precompute_record = "precompute.json"
+
 # metadata about the student's submissions, provided by gradescope. format
 # (ignoring fields we don't care about):
 #
@@ -108,6 +185,9 @@ solution_dir = "/autograder/source/solutions/"
 #     ...
 #   ]
 # }
+#
+# only the parts of the results that the grader uses are read, see
+# ReadSubmissionMetadata() in metadata.py.
 submission_metadata_file = "/autograder/submission_metadata.json"
 
 # the mentor executable, provided by the instructors.
@@ -117,6 +197,183 @@ mentor = "/autograder/source/mentor"
 # problem), in minutes.
 cooldown = 30
 
+# the largest submitted file, in bytes, that is graded. a larger file gets an
+# error message instead (and isn't graded, so it doesn't start a cooldown); no
+# machine or grammar for a homework problem comes anywhere near this size.
+max_submission_bytes = 2**20
+
+# submitted files of at least this many bytes are read with mmap, see
+# IngestFile().
+mmap_bytes = 2**16
+
+# whether to reuse the result of a problem that was graded in a previous
+# submission if neither the submitted file nor the solution has changed since
+# then, instead of grading it again (see ProblemHashes()). the reused result
+# isn't marked as graded, so it doesn't start a new cooldown.
+reuse_results = True
+
+# the maximum number of mentor processes to run at the same time. independent
+# problems are graded in parallel, and independent mentor commands within a
+# problem overlap with each other, but there are never more than this many
+# mentor processes running at once. setting this to 1 grades everything
+# sequentially.
+max_concurrency = os.cpu_count() or 1
+
+# whether to grade regular problems where both the submission and the solution
+# are dfas by comparing them in-process (see dfa.py) instead of with mentor's
+# compare command, which gives the same result without starting mentor. dfas
+# that dfa.py can't parse (e.g., invalid ones) are still compared by mentor, as
+# are nfas and regular expressions.
+native_dfa_compare = True
+
+# whether to check each submitted file for mistakes that make mentor fail (see
+# precheck.py), such as syntax errors or, for regular problems, an alphabet that
+# doesn't match the solution's, before running mentor on it. a file with such a
+# mistake isn't graded, as when mentor fails, and the student gets an error
+# message pointing at the line with the mistake instead of mentor's.
+precheck_submissions = True
+
+# whether to compare the student's gen_words output for context-free problems
+# against the solution wordlist while it is being generated, stopping mentor
+# early once 'stream_candidates' words that differ from the solution have been
+# found. otherwise the student's gen_words always runs to completion before
+# comparing.
+stream_gen_words = True
+
+# see 'stream_gen_words'.
+stream_candidates = 10
+
+# whether to split the solution wordlist of an unrestricted problem into parts
+# (shards) that are run through the student's machine by separate accept_file
+# commands at the same time, instead of one accept_file command for the whole
+# wordlist. there are at most 'max_concurrency' shards, with at least
+# 'shard_words' words each, so short wordlists aren't split. the student gets
+# the same message either way (see RunAcceptFile()).
+shard_accept_file = True
+
+# see 'shard_accept_file'.
+shard_words = 50
+
+# whether to stop the remaining shards of an unrestricted problem (see
+# 'shard_accept_file') as soon as one of them finds a miscategorized input. this
+# grades wrong submissions faster, but the input the student is told about is
+# then the first one found by any shard, which isn't always the first one in the
+# wordlist, so it can differ between runs.
+shard_fail_fast = False
+
+# for an incorrect context-free submission, the number of words that differ from
+# the solution (of each kind: words that should be accepted and words that
+# should be rejected) to check with mentor before giving feedback, see
+# GradeContextFree().
+verify_candidates = 5
+
+# the maximum number of checked words of each kind to give the student as
+# feedback.
+feedback_words = 1
+
+# context-free problems with at least this many words compare the student and
+# solution wordlists using 64-bit fingerprints of the words instead of the words
+# themselves (see wordlist.py), which takes much less memory for very large
+# wordlists. these problems don't use 'stream_gen_words'.
+fingerprint_words = 100000
+
+# the maximum number of bytes of output from a single mentor command (standard
+# output and standard error each) that the grader keeps, e.g., to show to the
+# student; anything in between the beginning and the end of longer output is
+# left out. see ReadOutput().
+max_output_bytes = 65536
+
+# the maximum time, in seconds, that a single mentor command may run before it is
+# killed. the problem is then not graded.
+mentor_timeout = 120
+
+# the maximum total time, in seconds, to spend grading a submission. this should
+# be less than the autograder timeout set on gradescope, so that the results are
+# always written out. problems are graded cheapest first (see
+# EstimateGradingTime()); problems that haven't been graded when the time runs
+# out keep their previous score and are marked as not graded.
+time_budget = 480
+
+# the estimated time, in seconds, to grade a problem of each language class that
+# hasn't been graded before, see EstimateGradingTime().
+default_grading_time = {"regular": 1, "context-free": 10, "unrestricted": 10}
+
+# resource limits for each mentor command, by the language class of the file the
+# command runs on (see MentorLimits()): 'memory' is the maximum size of its
+# address space in bytes, 'cpu' is the maximum cpu time it may use in seconds,
+# and 'output' is the maximum size of its standard output (and standard error)
+# in bytes. a command that goes over one of its limits is stopped, and the
+# problem is not graded. these keep a runaway command (e.g., gen_words on a
+# highly ambiguous grammar) from slowing down everything else running at the
+# same time.
+mentor_limits = {
+    "regular": {"memory": 2 * 2**30, "cpu": 60, "output": 256 * 2**20},
+    "context-free": {"memory": 4 * 2**30, "cpu": 100, "output": 256 * 2**20},
+    "unrestricted": {"memory": 2 * 2**30, "cpu": 100, "output": 256 * 2**20},
+}
+
+# a directory in which to remember the results of mentor commands (see memo.py),
+# or None to not remember them. a mentor command's result only depends on the
+# mentor executable, the command, and the contents of the files it reads, so a
+# command that was run before (e.g., the solution's gen_words for a
+# context-free problem, which is the same for every submission) is read from
+# here instead of being run again. only commands that terminated normally or
+# failed because of their input are remembered (see FailedByItself()), not ones
+# that were stopped (e.g., by a timeout or a resource limit) or crashed. only
+# the mentor executable itself is part of what identifies a command, so if it is
+# a script that runs another program (as on gradescope), clear the directory
+# when that program changes. this can be shared by several graders at once
+# (e.g., regrade.py's workers).
+mentor_memo_dir = None
+
+# the maximum size in bytes of 'mentor_memo_dir'. the least recently used
+# results are removed to keep it under this size.
+mentor_memo_bytes = 2**30
+
+# a directory in which to remember the results of grading problems by the
+# canonical form of the submitted file (see canonical.py), or None to not
+# remember them. submissions that only differ from one graded before in their
+# comments, whitespace, order of transitions or rules, or names of states or
+# nonterminals then get the same result without running mentor at all, e.g.,
+# across a batch of submissions graded by regrade.py. only results of problems
+# that were actually graded are remembered.
+verdict_memo_dir = None
+
+# the maximum size in bytes of 'verdict_memo_dir'.
+verdict_memo_bytes = 2**28
+
+# where to write a trace of where the time grading a submission goes, or None to
+# not write a trace. the trace is a JSONL file (one JSON record per line) with a
+# record for every mentor command that was run:
+#
+# { 'event': "mentor",
+#   'problem': <problem-id>,
+#   'command': [<mentor command>],
+#   'status': <status>, // see ExecMentor()
+#   'wall-time': <seconds>,
+#   'cpu-time': <seconds>, // user and system time of mentor
+#   'max-rss': <kilobytes>, // maximum resident set size of mentor
+#   'memoized': true // only if the result was read from 'mentor_memo_dir',
+#                    // in which case mentor wasn't run and the times are those
+#                    // of reading the result
+# }
+#
+# and for every phase of the grader itself that was timed (see TracePhase()):
+#
+# { 'event': "phase",
+#   'phase': <name>, // e.g., "metadata", "solution-lookup", "diff"
+#   'problem': <problem-id>, // or null for phases that aren't per problem
+#   'wall-time': <seconds>
+# }
+#
+# records are appended to the file, so grading several submissions (e.g., with
+# regrade.py) traces all of them.
+trace_file = None
+
+# whether to add a summary of where the time went grading each problem to its
+# extra_data in 'results_file', as 'timing' (see Trace()).
+trace_results = False
+
 
 # return the language class of the give file type: regular, context-free, or
 # unrestricted.
@@ -133,67 +390,255 @@ def LanguageClass(file_type: str) -> str:
     return "unknown"
 
 
-# the submitted files in 'student_submission_dir'.
-submitted_files = [
-    file
-    for file in listdir(student_submission_dir)
-    if isfile(join(student_submission_dir, file))
-    and LanguageClass(file.split(".").pop()) != "unknown"
-]
-
-# the solutions present in 'solution_dir'.
-solution_files = [
-    file for file in listdir(solution_dir) if isfile(join(solution_dir, file))
-]
-
-# the submission metadata from 'submission_metadata_file'.
-metadata = json.loads(open(submission_metadata_file).read())
+# record a trace record (see 'trace_file') and add it to the problem's timing
+# summary in 'timings'. does nothing unless tracing is turned on.
+def Trace(grading: Dict[str, Any], record: Dict[str, Any]) -> None:
+    if grading["trace-out"] is None and not trace_results:
+        return
+    with grading["trace-lock"]:
+        if grading["trace-out"] is not None:
+            grading["trace-out"].write(json.dumps(record) + "\n")
+        if not trace_results or record["problem"] is None:
+            return
+        timing = grading["timings"].setdefault(record["problem"], {})
+        if record["event"] == "mentor":
+            for key, value in [
+                ("mentor-commands", 1),
+                ("mentor-time", record["wall-time"]),
+                ("mentor-cpu-time", record["cpu-time"]),
+                ("memoized-commands", int(record.get("memoized", False))),
+            ]:
+                timing[key] = round(timing.get(key, 0) + value, 6)
+            timing["max-rss"] = max(timing.get("max-rss", 0), record["max-rss"])
+        else:
+            key = record["phase"] + "-time"
+            timing[key] = round(timing.get(key, 0) + record["wall-time"], 6)
+
+
+# time the code in a 'with TracePhase(...)' block, recording it in the trace as
+# the given phase of grading (for the given problem, if any).
+@contextlib.contextmanager
+def TracePhase(grading: Dict[str, Any], phase: str, problem_id: str = None):
+    start = time.perf_counter()
+    yield
+    Trace(
+        grading,
+        {
+            "event": "phase",
+            "phase": phase,
+            "problem": problem_id,
+            "wall-time": round(time.perf_counter() - start, 6),
+        },
+    )
 
-# for submitted files, convert dos text format to unix format.
-for file in submitted_files:
-    fullname = student_submission_dir + file
-    with open(fullname, "rb") as f:
-        content = f.read()
-        content = content.replace(b"\r\n", b"\n")
-    with open(fullname, "wb") as f:
-        f.write(content)
 
+# the state of grading a single submission, which is passed around as 'grading'
+# (see NewGrading()). format:
+#
+# { 'submission-dir': "</path/to/dir/>", // the submitted files
+#   'solution-dir': "</path/to/dir/>", // the solutions
+#   'solution-files': [<file>, ...], // the solutions present in 'solution-dir'
+#   'solution-index': { <problem-id>: [<file>, ...], ... }, // 'solution-files'
+#                                                           // by problem id
+#   'manifest': <manifest>, // see 'solution_manifest', or None
+#   'solution-wordlists': { <problem-id>: <record>, ... }, // see NewGrading()
+#   'precompute-record': <record>, // see ReadPrecomputeRecord()
+#   'mentor': "</path/to/mentor>",
+#   'previous-info': <previous info>, // see below
+#   'grades': <grades>, // see below
+#   'deadline': <seconds>, // the time.monotonic() by which grading has to be
+#                          // finished, see 'time_budget'
+#   'mentor-pool': <ThreadPoolExecutor>, // runs all mentor commands, see
+#                                        // StartMentor()
+#   'trace-out': <file>, // the open 'trace_file', or None
+#   'trace-lock': <threading.Lock>, // for writing to 'trace-out' from several
+#                                   // threads
+#   'timings': <timings>, // see below
+#   'results-file': "</path/to/file>", // where to write the results while
+#                                      // grading, or None (see
+#                                      // 'checkpoint_file')
+#   'checkpoint-file': "</path/to/file>", // or None, see 'checkpoint_file'
+#   'checkpoint': { <problem-id>: <record>, ... } // the problems that are
+#                                                 // finished, in the format of
+#                                                 // 'checkpoint_file'
+# }
+#
 # the metadata for previous submissions can have submissions in an arbitrary
 # order (i think), and some of those submission may have results for a problem
 # that wasn't actually graded (e.g., it automatically got a 0 because the
 # student didn't submit that particular problem). to make things easier, we'll
 # process the metadata into a format that summarizes everything necessary and is
-# easily accessible by problem-id:
+# easily accessible by problem-id (see ReadPreviousInfo()), as 'previous-info':
 #
 # {
 #   <problem-id>: {
 #     'elapsed-time': <minutes> // minutes since this problem was last graded
 #     'previous-score': <score> // previous score
+#     'grading-time': <seconds> // how long grading took, if it was recorded
+#     'hashed-results': { // the most recent result for each pair of hashes of
+#                         // the submitted file and the solution it was graded
+#                         // with, if they were recorded (see ProblemHashes())
+#       "<submission-hash> <solution-hash>": {
+#         'score': <score>,
+#         'output': <message to student>
+#       },
+#       ...
+#     }
 #   },
 #   ...
 # }
 #
 # if a problem was not graded in some previous submission then an entry for its
-# problem id won't exist in previous_info.
-previous_info: Dict[str, Dict[str, int]] = {}
-
-# stores the results of grading in a way that makes it easy to look up by
-# problem-id. format:
+# problem id won't exist in 'previous-info'.
+#
+# 'grades' stores the results of grading in a way that makes it easy to look up
+# by problem-id. format:
 #
 # { <problem-id>: {
 #     'score': <int>,
 #     'output': <message to student>
 #     'graded': <bool>
+#     'grading-time': <seconds> // present only if the problem was graded
+#     'submission-hash': <hash> // present only if the problem was graded, see
+#                               // ProblemHashes()
+#     'solution-hash': <hash> // present only if the problem was graded
+#     'over-budget': True // present only if the problem wasn't (fully) graded
+#                         // because 'time_budget' ran out, see
+#                         // StoreOverBudget()
 #   },
 #   ...
 # }
-grades = {}
+#
+# 'timings' has the per problem timing summaries added to 'results_file' if
+# 'trace_results' is set. format:
+#
+# { <problem-id>: {
+#     'mentor-commands': <int>, // number of mentor commands run
+#     'memoized-commands': <int>, // how many of those were read from
+#                                 // 'mentor_memo_dir'
+#     'mentor-time': <seconds>, // total wall time of the mentor commands
+#     'mentor-cpu-time': <seconds>, // total cpu time of the mentor commands
+#     'max-rss': <kilobytes>, // largest maximum resident set size of a command
+#     '<phase>-time': <seconds>, // total wall time of each timed phase
+#   },
+#   ...
+# }
+
+
+# return a new grading state (see above) for grading the submission in
+# 'submission_dir' against the solutions in 'solution_dir' using the given
+# mentor executable. the state must be finished with FinishGrading().
+#
+# 'solution_wordlists' can give pre-generated solution wordlists for
+# context-free problems (e.g., generated once for a whole batch of submissions
+# by regrade.py), which are used instead of generating them or looking for a
+# wordlist solution file. each is a record in the format:
+#
+# { 'wordlist-file': "</path/to/file>",
+#   'num-words': <int>, // the number of words to compare, see GetSolutionInfo()
+#   'fingerprint-file': "</path/to/file>" // optional, see MapFingerprints()
+# }
+#
+# 'manifest' can give a manifest of the solutions that is already in memory
+# (e.g., kept by server.py), in the format of 'solution_manifest' plus its
+# 'modified' time, which is used instead of reading the one in 'solution_dir'.
+# it is checked in the same way, so a stale manifest is never used.
+def NewGrading(
+    submission_dir: str,
+    solution_dir: str,
+    mentor: str,
+    solution_wordlists: Dict[str, Dict[str, Any]] = None,
+    manifest: Dict[str, Any] = None,
+) -> Dict[str, Any]:
+    # the directories are used as prefixes of file names, so they need to end in
+    # a '/'.
+    solution_dir = join(solution_dir, "")
+    solution_files = [
+        file
+        for file in listdir(solution_dir)
+        if isfile(join(solution_dir, file))
+        and file not in [solution_manifest, solution_precompute_record]
+    ]
+    solution_index: Dict[str, List[str]] = {}
+    for file in solution_files:
+        solution_index.setdefault(file.split(".")[0], []).append(file)
+    if manifest is None or set(manifest["files"]) != set(solution_files):
+        manifest = ReadSolutionManifest(solution_dir, solution_files)
+    return {
+        "submission-dir": join(submission_dir, ""),
+        "solution-dir": solution_dir,
+        "solution-files": solution_files,
+        "solution-index": solution_index,
+        "manifest": manifest,
+        "solution-wordlists": solution_wordlists or {},
+        "precompute-record": ReadPrecomputeRecord(solution_dir),
+        "mentor": mentor,
+        "previous-info": {},
+        "grades": {},
+        "deadline": time.monotonic() + time_budget,
+        "mentor-pool": ThreadPoolExecutor(max_workers=max_concurrency),
+        "trace-out": open(trace_file, "a") if trace_file is not None else None,
+        "trace-lock": threading.Lock(),
+        "timings": {},
+        "results-file": None,
+        "checkpoint-file": None,
+        "checkpoint": {},
+    }
+
+
+# read the record of the wordlists that precompute.py generated in
+# 'solution_dir' (see 'solution_precompute_record'), in the format:
+#
+# { <problem-id>: {
+#     'wordlist-file': <file>, // the name of the wordlist in 'solution_dir'
+#     'solution-hash': <hash>, // the solution file it was generated from
+#     'num-words': <int>, // the number of words it was generated with
+#     'mentor-hash': <hash>, // the mentor executable that generated it
+#     'wordlist-hash': <hash>, // the wordlist itself
+#   },
+#   ...
+# }
+#
+# the hashes are those of FileDigest(). returns an empty record if there isn't
+# one yet.
+def ReadPrecomputeRecord(solution_dir: str) -> Dict[str, Any]:
+    try:
+        with open(join(solution_dir, solution_precompute_record), "r") as handle:
+            return json.loads(handle.read())
+    except FileNotFoundError:
+        return {}
+
+
+# return whether the wordlist that precompute.py generated for a context-free
+# solution, recorded in 'entry' (see ReadPrecomputeRecord()), was generated from
+# the current solution file with its <num-words> by the current mentor
+# executable.
+def IsPrecomputeCurrent(
+    grading: Dict[str, Any], entry: Dict[str, Any], solution_info
+) -> bool:
+    try:
+        return (
+            entry["num-words"] == solution_info["num-words"]
+            and entry["solution-hash"] == FileDigest(solution_info["file"])
+            and entry["mentor-hash"] == FileDigest(grading["mentor"])
+        )
+    except OSError:
+        return False
+
+
+# release the resources held by a grading state from NewGrading().
+def FinishGrading(grading: Dict[str, Any]) -> None:
+    grading["mentor-pool"].shutdown()
+    if grading["trace-out"] is not None:
+        grading["trace-out"].close()
 
 
 # convert a string containing time information into a datetime object. the
-# expected format is as given in the second argument to strptime.
+# expected format is "%Y-%m-%dT%H:%M:%S" (as strptime would say), followed by
+# anything (e.g., a fraction of a second and a time zone, which are ignored).
+# datetime.fromisoformat() reads this format much faster than strptime().
 def GetTimeFromString(time_string) -> datetime:
-    return datetime.strptime(time_string.split(".")[0], "%Y-%m-%dT%H:%M:%S")
+    return datetime.fromisoformat(time_string[:19])
 
 
 # return the solution filename matching the given problem id. if there is no
@@ -201,8 +646,8 @@ def GetTimeFromString(time_string) -> datetime:
 # files, one in format (2) and one in format (3), returns the one in format (2).
 # other than that case, if there are multiple matching files returns "multiple
 # matching solutions".
-def FindMatchingSolutionFile(problem_id: str) -> str:
-    solutions = [soln for soln in solution_files if soln.split(".")[0] == problem_id]
+def FindMatchingSolutionFile(grading: Dict[str, Any], problem_id: str) -> str:
+    solutions = grading["solution-index"].get(problem_id, [])
     if len(solutions) == 0:
         return "no matching solution"
     if len(solutions) == 1:
@@ -220,16 +665,18 @@ def FindMatchingSolutionFile(problem_id: str) -> str:
 # { 'file': "</path/to/file>"
 #   'file-type': "<{dfa, nda, re, cfg, pda, tm, htm}>"
 #   'id': "<problem-id>"
+#   'size': <bytes> // added by IngestFile()
+#   'submission-hash': <hash> // added by IngestFile()
 # }
 #
 # returns an empty dictionary {} if the filename was not in the correct format
 # or it couldn't read the file.
-def GetProblemInfo(problem_file: str):
+def GetProblemInfo(grading: Dict[str, Any], problem_file: str):
     pieces = problem_file.split(".")
     if len(pieces) != 2:
         return {}
     return {
-        "file": student_submission_dir + problem_file,
+        "file": grading["submission-dir"] + problem_file,
         "file-type": pieces[1],
         "id": pieces[0],
     }
@@ -243,14 +690,20 @@ def GetProblemInfo(problem_file: str):
 #   'file-type': "<{dfa, nfa, re}>",
 #   'expected-type': "<{dfa, nfa, re}>"
 #   'point-value': <int>,
+#   'file-hash': <hash>, // present only if it came from the manifest
 # }
 #
 # { 'file': "</path/to/file>"
 #   'file-type': "<{cfg, pda}>",
 #   'expected-type': "<{cfg, pda}>",
 #   'point-value': <int>,
-#   'num-words': <int>,
-#   'wordlist': "<list of words>" // present only if solution is a wordlist.
+#   'num-words': <int>, // see CountSolutionWords()
+#   'count-words': True, // present only if 'num-words' still has to be counted
+#   'wordlist-file': "</path/to/file>" // present only if there is a wordlist.
+#   'fingerprint-file': "</path/to/file>" // present only if the wordlist was
+#                                         // pre-generated with fingerprints
+#   'file-hash': <hash>, // present only if it came from the manifest
+#   'wordlist-hash': <hash>, // present only if it came from the manifest
 # }
 #
 # { 'file': "</path/to/file>"
@@ -258,11 +711,16 @@ def GetProblemInfo(problem_file: str):
 #   'expected-type': "<{tm, htm}>",
 #   'point-value': <int>,
 #   'max-steps': <int>,
+#   'file-hash': <hash>, // present only if it came from the manifest
 # }
 #
 # returns an empty dictionary {} if the filename was not in the correct format
-# or it couldn't read the file.
-def GetSolutionInfo(solution_file: str):
+# or it couldn't read the file. if the manifest has the solution (see
+# 'solution_manifest'), the solution info comes from there instead.
+def GetSolutionInfo(grading: Dict[str, Any], solution_file: str):
+    info = ManifestSolutionInfo(grading, solution_file)
+    if info is not None:
+        return info
     pieces = solution_file.split(".")
 
     # <problem-id>.<point-value>.<expected format>.{dfa, nfa, re}
@@ -270,7 +728,7 @@ def GetSolutionInfo(solution_file: str):
         if not pieces[1].isdigit():
             return {}
         return {
-            "file": solution_dir + solution_file,
+            "file": grading["solution-dir"] + solution_file,
             "file-type": pieces[3],
             "expected-type": pieces[2],
             "point-value": int(pieces[1]),
@@ -281,7 +739,7 @@ def GetSolutionInfo(solution_file: str):
         if not pieces[1].isdigit() or not pieces[2].isdigit():
             return {}
         info = {
-            "file": solution_dir + solution_file,
+            "file": grading["solution-dir"] + solution_file,
             "file-type": pieces[4],
             "expected-type": pieces[3],
             "point-value": int(pieces[1]),
@@ -290,17 +748,27 @@ def GetSolutionInfo(solution_file: str):
 
         # see if there is a wordlist available (if there is more than one, just
         # ignore them all). if the wordlist has a different number of words than
-        # specified by <num-words>, that overrides the specified value.
+        # specified by <num-words>, that overrides the specified value, unless
+        # precompute.py generated it: a finite language can have fewer words
+        # than <num-words>, and the student's words beyond those are still
+        # compared. a generated wordlist that is out of date (the solution or
+        # mentor changed since) is ignored, so the solution's words are
+        # generated instead. a pre-generated wordlist (see NewGrading()) takes
+        # precedence.
         files = [
             f
-            for f in solution_files
-            if f.split(".")[0] == pieces[0] and f.endswith(".wordlist")
+            for f in grading["solution-index"].get(pieces[0], [])
+            if f.endswith(".wordlist")
         ]
-        if len(files) == 1:
-            with open(solution_dir + files[0], "r") as handle:
-                words = handle.read()
-            info["wordlist"] = words.strip().splitlines()
-            info["num-words"] = len(info["wordlist"])
+        generated = grading["precompute-record"].get(pieces[0], {})
+        if pieces[0] in grading["solution-wordlists"]:
+            info.update(grading["solution-wordlists"][pieces[0]])
+        elif len(files) == 1 and generated.get("wordlist-file") == files[0]:
+            if IsPrecomputeCurrent(grading, generated, info):
+                info["wordlist-file"] = grading["solution-dir"] + files[0]
+        elif len(files) == 1:
+            info["wordlist-file"] = grading["solution-dir"] + files[0]
+            info["count-words"] = True
 
         return info
 
@@ -315,7 +783,7 @@ def GetSolutionInfo(solution_file: str):
 
         # get wordlist from file to make some sanity checks.
         words = ""
-        with open(solution_dir + solution_file, "r") as handle:
+        with open(grading["solution-dir"] + solution_file, "r") as handle:
             words = handle.read()
         wordlist = words.strip().splitlines()
 
@@ -328,7 +796,7 @@ def GetSolutionInfo(solution_file: str):
             return {}
 
         return {
-            "file": solution_dir + solution_file,
+            "file": grading["solution-dir"] + solution_file,
             "file-type": pieces[3],
             "expected-type": pieces[3],
             "point-value": int(pieces[1]),
@@ -339,112 +807,1032 @@ def GetSolutionInfo(solution_file: str):
     return {}
 
 
-# store the result for a problem id in 'grades'.
-def StoreGrade(problem_id: str, score: int, msg: str, graded: bool) -> None:
+# read the manifest of the solutions in 'solution_dir' (see 'solution_manifest'),
+# which has the given 'solution_files'. returns None if there is no manifest, or
+# if it doesn't list exactly those files.
+def ReadSolutionManifest(solution_dir: str, solution_files: List[str]):
+    path = solution_dir + solution_manifest
+    try:
+        with open(path, "r") as handle:
+            modified = os.fstat(handle.fileno()).st_mtime_ns
+            manifest = json.loads(handle.read())
+    except (OSError, ValueError):
+        return None
+    if set(manifest.get("files", {})) != set(solution_files):
+        return None
+    manifest["modified"] = modified
+    return manifest
+
+
+# return the solution info for 'solution_file' from the manifest (see
+# 'solution_manifest'), with the hashes of its files, or None if it isn't there
+# (or is stale). a pre-generated wordlist (see NewGrading()) takes precedence
+# over the manifest.
+def ManifestSolutionInfo(grading: Dict[str, Any], solution_file: str):
+    manifest = grading["manifest"]
+    if (
+        manifest is None
+        or solution_file not in manifest["solutions"]
+        or solution_file.split(".")[0] in grading["solution-wordlists"]
+    ):
+        return None
+    info = dict(manifest["solutions"][solution_file])
+
+    # the solution's files (the solution file and its wordlist, if it has one),
+    # as tuples (key in 'info', file, key for its hash in 'info').
+    files = [("file", info.get("file", solution_file), "file-hash")]
+    if "wordlist-file" in info:
+        files.append(("wordlist-file", info["wordlist-file"], "wordlist-hash"))
+    for key, file, hash_key in files:
+        try:
+            stat = os.stat(grading["solution-dir"] + file)
+        except OSError:
+            return None
+        entry = manifest["files"][file]
+        if stat.st_size != entry["size"] or stat.st_mtime_ns > manifest["modified"]:
+            return None
+        # an invalid solution's info is empty.
+        if info:
+            info[key] = grading["solution-dir"] + file
+            info[hash_key] = entry["hash"]
+    return info
+
+
+# return the manifest of the solutions of 'grading' (see 'solution_manifest'),
+# which manifest.py writes. the solution info is found as usual, ignoring any
+# existing manifest.
+def BuildSolutionManifest(grading: Dict[str, Any]) -> Dict[str, Any]:
+    grading = dict(grading, manifest=None)
+    manifest: Dict[str, Any] = {"files": {}, "solutions": {}}
+    for file in sorted(grading["solution-files"]):
+        path = grading["solution-dir"] + file
+        manifest["files"][file] = {
+            "size": os.stat(path).st_size,
+            "hash": FileDigest(path),
+        }
+        info = GetSolutionInfo(grading, file)
+        if info and LanguageClass(info["file-type"]) == "context-free":
+            CountSolutionWords(info)
+        for key in ["file", "wordlist-file"]:
+            if key in info:
+                info[key] = os.path.relpath(info[key], grading["solution-dir"])
+        manifest["solutions"][file] = info
+    return manifest
+
+
+# replace <num-words> of a context-free solution by the number of words in its
+# wordlist, if the wordlist was written by hand (see GetSolutionInfo()). this is
+# only done once the words are needed, when the problem is graded, so that
+# looking up a solution doesn't read its wordlist.
+def CountSolutionWords(solution_info: Dict[str, Any]) -> None:
+    if solution_info.pop("count-words", False):
+        solution_info["num-words"] = CountWordlistFileWords(
+            solution_info["wordlist-file"]
+        )
+
+
+# store the result for a problem id in 'grades' (see 'grading').
+def StoreGrade(
+    grading: Dict[str, Any], problem_id: str, score: int, msg: str, graded: bool
+) -> None:
     # verify that this problem id hasn't already had a grade stored.
-    assert not problem_id in grades
-    grades[problem_id] = {"score": score, "output": msg, "graded": graded}
-
-
-# run the given mentor command. returns a pair s.t. the boolean indicates
-# whether the command terminated normally (True) or not (False) and the string
-# contains the output of the command. if the command did not terminate normally,
-# it stores an appropriate grade for the problem id.
-def RunMentor(problem_id: str, mentor_cmd: List[str]) -> Tuple[bool, str]:
-    proc = subprocess.run(mentor_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output = (proc.stdout + b"\n" + proc.stderr).decode("utf-8")
-    if proc.returncode != 0:  # error
+    assert not problem_id in grading["grades"]
+    grading["grades"][problem_id] = {"score": score, "output": msg, "graded": graded}
+
+
+# store the result for a problem id that couldn't be graded because
+# 'time_budget' ran out. the problem keeps its previous score, if any.
+def StoreOverBudget(grading: Dict[str, Any], problem_id: str) -> None:
+    score = 0
+    if problem_id in grading["previous-info"]:
+        score = grading["previous-info"][problem_id]["previous-score"]
+    StoreGrade(
+        grading,
+        problem_id,
+        score,
+        f"Not graded: time budget exceeded. Using previous score: {score}",
+        False,
+    )
+    grading["grades"][problem_id]["over-budget"] = True
+
+
+# read mentor output from 'handle' (an open binary file). at most
+# 'max_output_bytes' bytes are read: if the output is longer than that, only its
+# beginning and end are kept, with a marker in between saying how much was left
+# out.
+def ReadOutput(handle) -> bytes:
+    size = handle.seek(0, os.SEEK_END)
+    handle.seek(0)
+    if size <= max_output_bytes:
+        return handle.read()
+    head = handle.read(max_output_bytes // 2)
+    handle.seek(size - max_output_bytes // 2)
+    tail = handle.read()
+    omitted = size - len(head) - len(tail)
+    return head + f"\n[... {omitted} bytes of output omitted ...]\n".encode() + tail
+
+
+# returns a pair (timeout, status) s.t. 'timeout' is how long a mentor command
+# started now may run and 'status' is the status the command ends with if it
+# runs that long (see ExecMentor()). that is 'mentor_timeout', unless there is
+# less time than that left in 'time_budget'.
+def MentorTimeout(grading: Dict[str, Any]) -> Tuple[float, str]:
+    remaining = grading["deadline"] - time.monotonic()
+    if remaining < mentor_timeout:
+        return (max(remaining, 0), "over-budget")
+    return (mentor_timeout, "timeout")
+
+
+# return the resource limits for the given mentor command from 'mentor_limits',
+# based on the type of the file it runs on (the first argument to mentor), or
+# None if there are no limits for it.
+def MentorLimits(mentor_cmd: List[str]) -> Dict[str, int]:
+    return mentor_limits.get(LanguageClass(mentor_cmd[1].split(".").pop()))
+
+
+# return the command that runs 'mentor_cmd' with the given resource limits (see
+# 'mentor_limits'). the limits are set with ulimit by a shell that then replaces
+# itself with mentor, rather than by a 'preexec_fn' of subprocess.Popen(), which
+# isn't safe to use while other threads are running (as they are while grading,
+# see 'max_concurrency'). going over the cpu time limit sends the process
+# SIGXCPU, and writing more than the output limit sends it SIGXFSZ; going over
+# the memory limit makes allocations fail.
+def LimitedMentorCommand(mentor_cmd: List[str], limits: Dict[str, int]) -> List[str]:
+    if limits is None:
+        return mentor_cmd
+    # ulimit takes the memory limit in kilobytes and the output limit in blocks
+    # of 512 bytes. the hard cpu limit is a second later so that the process
+    # gets SIGXCPU rather than SIGKILL, which can be told apart from being
+    # killed by us.
+    cpu = limits["cpu"]
+    script = (
+        f"ulimit -v {limits['memory'] // 1024}"
+        f" && ulimit -f {limits['output'] // 512}"
+        f" && ulimit -S -t {cpu}"
+        f" && ulimit -H -t {cpu + 1}"
+        ' && exec "$@"'
+    )
+    return ["/bin/sh", "-c", script, "sh"] + mentor_cmd
+
+
+# return the status (see ExecMentor()) of a mentor command that exited with the
+# given return code, where 'errors' is its standard error output.
+def ExitStatus(returncode: int, errors: bytes) -> str:
+    if returncode == 0:
+        return "ok"
+    # a process killed by a signal has a return code of minus the signal
+    # number; mentor is usually run through a shell script, which instead exits
+    # with 128 plus the signal number.
+    signum = -returncode if returncode < 0 else returncode - 128
+    if signum == signal.SIGXCPU:
+        return "cpu-limit"
+    if signum == signal.SIGXFSZ:
+        return "output-limit"
+    # mentor aborts with std::bad_alloc when an allocation fails.
+    if signum == signal.SIGABRT and b"std::bad_alloc" in errors:
+        return "memory-limit"
+    return "error"
+
+
+# return whether a mentor process that failed with the given return code and
+# standard error output (see ExitStatus()) failed because of its input, so that
+# running it again would fail the same way: it exited with a nonzero exit code,
+# or aborted on a failed check, which is how mentor reports a mistake in its
+# input. a process killed by any other signal (which may have been sent from
+# outside, or be caused by a resource limit) didn't.
+def FailedByItself(returncode: int, errors: bytes) -> bool:
+    if 0 < returncode < 128:
+        return True
+    signum = -returncode if returncode < 0 else returncode - 128
+    return signum == signal.SIGABRT and b"Check failed" in errors
+
+
+# kill a running mentor process, started in its own session, along with any
+# processes it started. the process still has to be waited for, see
+# WaitMentor().
+def KillMentor(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:  # it already exited.
+        pass
+
+
+# start a timer that kills the given mentor process if it is still running after
+# 'timeout' seconds. returns a pair (timer, timed out) s.t. the timer must be
+# stopped once the process has exited (see WaitMentor()) and the event is set if
+# the process was killed.
+def StartMentorTimer(
+    proc: subprocess.Popen, timeout: float
+) -> Tuple[threading.Timer, threading.Event]:
+    timed_out = threading.Event()
+
+    def Kill():
+        timed_out.set()
+        KillMentor(proc)
+
+    timer = threading.Timer(timeout, Kill)
+    timer.start()
+    return (timer, timed_out)
+
+
+# wait for a mentor process, started at time.perf_counter() 'start', to exit and
+# set its return code. 'timer' is its timer from StartMentorTimer(), and 'group'
+# the group it is in, if any (see JoinMentorGroup()). returns the resources it
+# used, in the format:
+#
+# { 'wall-time': <seconds>,
+#   'cpu-time': <seconds>, // user and system time, including its children
+#   'max-rss': <kilobytes> // maximum resident set size, including its children
+# }
+#
+# the process is killed by its process group id (see KillMentor()), which is
+# its process id, and can be reused by another process as soon as the process
+# is reaped. so the process is only reaped once nothing can kill it anymore:
+# after it has exited, the timer is stopped and the process leaves its group
+# first. this uses os.wait4() rather than proc.wait(), which doesn't say how much
+# cpu time and memory the process used.
+def WaitMentor(
+    proc: subprocess.Popen,
+    start: float,
+    timer: threading.Timer,
+    group: Dict[str, Any] = None,
+) -> Dict[str, float]:
+    os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+    timer.cancel()
+    # if the timer already went off, wait for it to finish killing the process.
+    timer.join()
+    if group is not None:
+        LeaveMentorGroup(group, proc)
+    _, wait_status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(wait_status)
+    return {
+        "wall-time": round(time.perf_counter() - start, 6),
+        "cpu-time": round(rusage.ru_utime + rusage.ru_stime, 6),
+        "max-rss": rusage.ru_maxrss,
+    }
+
+
+# the mentor commands that read a second file, as the given argument.
+mentor_file_arguments = {"compare": 3, "accept_file": 3}
+
+
+# return the key under which the result of the given mentor command is
+# remembered in 'mentor_memo_dir'. the files the command reads are identified by
+# their contents rather than their names, so that the same command on a copy of
+# a file (e.g., a solution file in a different directory) has the same key.
+def MentorMemoKey(mentor_cmd: List[str]) -> str:
+    arguments: List[Any] = mentor_cmd[1:]
+    arguments[0] = {"file": FileDigest(mentor_cmd[1])}
+    if mentor_cmd[2] in mentor_file_arguments:
+        index = mentor_file_arguments[mentor_cmd[2]] - 1
+        arguments[index] = {"file": FileDigest(arguments[index])}
+    return MemoKey(FileDigest(mentor_cmd[0]), arguments)
+
+
+# remember the result of a mentor command in 'mentor_memo_dir' under 'key' (see
+# MentorMemoKey()). 'stdout' is the file with the command's standard output and
+# 'error_output' is its standard error (see ReadOutput()). a result is stored as
+# a JSON header line, followed by the standard error and then the standard
+# output:
+#
+# { 'status': <status>, // see ExecMentor()
+#   'error-bytes': <int> // the size of the standard error
+# }
+def WriteMentorMemo(key: str, status: str, stdout, error_output: bytes) -> None:
+    def Write(handle):
+        header = {"status": status, "error-bytes": len(error_output)}
+        handle.write(json.dumps(header).encode("utf-8") + b"\n")
+        handle.write(error_output)
+        stdout.seek(0)
+        shutil.copyfileobj(stdout, handle)
+
+    WriteMemo(mentor_memo_dir, key, Write, mentor_memo_bytes)
+
+
+# return the result of a mentor command remembered in 'mentor_memo_dir' under
+# 'key', in the same form as ExecMentor() (including writing the standard output
+# to 'stdout_file', if given), or None if it isn't there.
+def ReadMentorMemo(key: str, stdout_file: str) -> Tuple[str, str, Dict[str, Any]]:
+    start = time.perf_counter()
+    handle = OpenMemo(mentor_memo_dir, key)
+    if handle is None:
+        return None
+    with handle:
+        header = json.loads(handle.readline())
+        status = header["status"]
+        error_output = handle.read(header["error-bytes"])
+        if stdout_file is None:
+            stdout = tempfile.TemporaryFile()
+        else:
+            stdout = open(stdout_file, "w+b")
+        with stdout:
+            shutil.copyfileobj(handle, stdout)
+            output = b""
+            if stdout_file is None or status != "ok":
+                output = ReadOutput(stdout)
+    output += b"\n" + error_output
+    usage = {
+        "wall-time": round(time.perf_counter() - start, 6),
+        "cpu-time": 0.0,
+        "max-rss": 0,
+        "memoized": True,
+    }
+    return (status, output.decode("utf-8", errors="replace"), usage)
+
+
+# run the given mentor command. returns a triple s.t. the first element is the
+# status of the command, the second contains the output of the command (see
+# ReadOutput()), and the third is the resources it used (see WaitMentor()), or
+# None if it wasn't run. the status is one of:
+#
+# - "ok": the command terminated normally.
+# - "error": the command did not terminate normally.
+# - "timeout": the command ran for longer than 'mentor_timeout' and was killed.
+# - "over-budget": 'time_budget' ran out before the command finished (the
+#   command may not have been run at all).
+# - "memory-limit", "cpu-limit", "output-limit": the command went over one of
+#   its resource limits (see 'mentor_limits') and was stopped.
+# - "stopped": the command's 'group' was stopped (see StopMentors()) before the
+#   command finished (the command may not have been run at all).
+#
+# the output goes to temporary files rather than being kept in memory, so that
+# it doesn't matter how much mentor prints. if 'stdout_file' is given then the
+# standard output goes to that file instead, and can be read from there in full
+# (e.g., with WordlistFileWords()); in that case it is only included in the
+# returned output if the command did not terminate normally.
+#
+# if 'mentor_memo_dir' is set, the result of a command that was run before is
+# read from there instead of running the command again.
+#
+# if 'group' is given (see NewMentorGroup()), the command is part of that group
+# while it runs.
+def ExecMentor(
+    grading: Dict[str, Any],
+    mentor_cmd: List[str],
+    stdout_file: str = None,
+    group: Dict[str, Any] = None,
+) -> Tuple[str, str, Dict[str, float]]:
+    if group is not None and group["stopped"]:
+        return ("stopped", "", None)
+    memo_key = None
+    if mentor_memo_dir is not None:
+        memo_key = MentorMemoKey(mentor_cmd)
+        result = ReadMentorMemo(memo_key, stdout_file)
+        if result is not None:
+            return result
+
+    timeout, timeout_status = MentorTimeout(grading)
+    if timeout == 0:
+        return (timeout_status, "", None)
+
+    with tempfile.TemporaryFile() as errors:
+        if stdout_file is None:
+            stdout = tempfile.TemporaryFile()
+        else:
+            stdout = open(stdout_file, "w+b")
+        with stdout:
+            start = time.perf_counter()
+            proc = subprocess.Popen(
+                LimitedMentorCommand(mentor_cmd, MentorLimits(mentor_cmd)),
+                stdout=stdout,
+                stderr=errors,
+                start_new_session=True,
+            )
+            if group is not None:
+                JoinMentorGroup(group, proc)
+            timer, timed_out = StartMentorTimer(proc, timeout)
+            usage = WaitMentor(proc, start, timer, group)
+            error_output = ReadOutput(errors)
+            if timed_out.is_set():
+                status = timeout_status
+            else:
+                status = ExitStatus(proc.returncode, error_output)
+            if group is not None and group["stopped"] and status != "ok":
+                status = "stopped"
+            if memo_key is not None and (
+                status == "ok"
+                or status == "error"
+                and FailedByItself(proc.returncode, error_output)
+            ):
+                WriteMentorMemo(memo_key, status, stdout, error_output)
+            output = b""
+            if stdout_file is None or status != "ok":
+                output = ReadOutput(stdout)
+        output += b"\n" + error_output
+    return (status, output.decode("utf-8", errors="replace"), usage)
+
+
+# start running the given mentor command in 'mentor-pool' and return a future
+# for the result of ExecMentor(). this lets independent mentor commands for the
+# same problem run at the same time; the result must be collected with
+# FinishMentor().
+def StartMentor(
+    grading: Dict[str, Any],
+    mentor_cmd: List[str],
+    stdout_file: str = None,
+    group: Dict[str, Any] = None,
+) -> Future:
+    return grading["mentor-pool"].submit(
+        ExecMentor, grading, mentor_cmd, stdout_file, group
+    )
+
+
+# return a new group of mentor commands, which can all be stopped at once with
+# StopMentors() once their results are no longer needed (see ExecMentor()). a
+# group is a record in the format:
+#
+# { 'lock': <threading.Lock>,
+#   'stopped': <bool>, // whether the group was stopped
+#   'procs': {<subprocess.Popen>, ...}, // the group's running mentor processes
+# }
+def NewMentorGroup() -> Dict[str, Any]:
+    return {"lock": threading.Lock(), "stopped": False, "procs": set()}
+
+
+# add a mentor process that was just started to 'group', killing it right away
+# if the group was already stopped.
+def JoinMentorGroup(group: Dict[str, Any], proc: subprocess.Popen) -> None:
+    with group["lock"]:
+        if group["stopped"]:
+            KillMentor(proc)
+        else:
+            group["procs"].add(proc)
+
+
+# remove a mentor process that has exited (but hasn't been reaped yet, see
+# WaitMentor()) from 'group'.
+def LeaveMentorGroup(group: Dict[str, Any], proc: subprocess.Popen) -> None:
+    with group["lock"]:
+        group["procs"].discard(proc)
+
+
+# stop all the mentor commands in 'group': running ones are killed, and ones
+# that haven't started yet won't run. their status is "stopped".
+def StopMentors(group: Dict[str, Any]) -> None:
+    with group["lock"]:
+        group["stopped"] = True
+        for proc in group["procs"]:
+            KillMentor(proc)
+
+
+# run the given mentor command, passing each line of its standard output
+# (without the newline) to 'consume' as soon as mentor produces it. if 'consume'
+# returns False then mentor is killed without producing the rest of its output.
+# returns the same triple as ExecMentor(), where the output contains only the
+# standard output that was read; a command that was killed this way counts as
+# terminating normally. since the standard output is a pipe rather than a file,
+# its size limit (see 'mentor_limits') is enforced here. so that a single line
+# is never held in memory whole, a line longer than 'max_output_bytes' (which no
+# word is) also counts as going over the limit. if 'group' is given, the command
+# is part of that group while it runs, as with ExecMentor().
+def StreamMentor(
+    grading: Dict[str, Any],
+    mentor_cmd: List[str],
+    consume: Callable[[str], bool],
+    group: Dict[str, Any] = None,
+) -> Tuple[str, str, Dict[str, float]]:
+    if group is not None and group["stopped"]:
+        return ("stopped", "", None)
+    timeout, timeout_status = MentorTimeout(grading)
+    if timeout == 0:
+        return (timeout_status, "", None)
+
+    with tempfile.TemporaryFile() as lines, tempfile.TemporaryFile() as errors:
+        limits = MentorLimits(mentor_cmd)
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            LimitedMentorCommand(mentor_cmd, limits),
+            stdout=subprocess.PIPE,
+            stderr=errors,
+            start_new_session=True,
+        )
+        if group is not None:
+            JoinMentorGroup(group, proc)
+
+        # kill mentor if it runs for too long.
+        timer, timed_out = StartMentorTimer(proc, timeout)
+
+        stopped = False
+        over_limit = False
+        output_size = 0
+        while True:
+            line = proc.stdout.readline(max_output_bytes + 1)
+            if not line:
+                break
+            output_size += len(line)
+            if (limits is not None and output_size > limits["output"]) or (
+                len(line) > max_output_bytes and not line.endswith(b"\n")
+            ):
+                over_limit = True
+                KillMentor(proc)
+                break
+            lines.write(line)
+            if not consume(line.rstrip(b"\n").decode("utf-8")):
+                stopped = True
+                KillMentor(proc)
+                break
+        proc.stdout.close()
+        usage = WaitMentor(proc, start, timer, group)
+        error_output = ReadOutput(errors)
+        output = ReadOutput(lines) + b"\n" + error_output
+
+    if timed_out.is_set():
+        status = timeout_status
+    elif over_limit:
+        status = "output-limit"
+    elif stopped:
+        status = "ok"
+    else:
+        status = ExitStatus(proc.returncode, error_output)
+    if group is not None and group["stopped"] and status != "ok":
+        status = "stopped"
+    return (status, output.decode("utf-8", errors="replace"), usage)
+
+
+# like StartMentor(), but runs the command using StreamMentor(). if 'consume'
+# waits on the result of another mentor command, that command must have been
+# started first: 'mentor-pool' runs commands in the order they are started, so
+# the other command is then guaranteed to be running already and can't be stuck
+# waiting for this one to free up a slot in the pool.
+def StartStreamingMentor(
+    grading: Dict[str, Any],
+    mentor_cmd: List[str],
+    consume: Callable[[str], bool],
+    group: Dict[str, Any] = None,
+) -> Future:
+    return grading["mentor-pool"].submit(
+        StreamMentor, grading, mentor_cmd, consume, group
+    )
+
+
+# wait for a mentor command started by StartMentor() to finish. returns a pair
+# s.t. the boolean indicates whether the command terminated normally (True) or
+# not (False) and the string contains the output of the command. if the command
+# did not terminate normally, it stores an appropriate grade for the problem id.
+# the command is recorded in the trace, see 'trace_file'.
+def FinishMentor(
+    grading: Dict[str, Any], problem_id: str, mentor_cmd: List[str], future: Future
+) -> Tuple[bool, str]:
+    status, output, usage = future.result()
+    TraceMentor(grading, problem_id, mentor_cmd, status, usage)
+    StoreMentorFailure(grading, problem_id, mentor_cmd, status, output)
+    return (status == "ok", output)
+
+
+# record a finished mentor command in the trace (see 'trace_file'), given its
+# result from ExecMentor().
+def TraceMentor(grading, problem_id: str, mentor_cmd: List[str], status, usage):
+    if usage is not None:
+        Trace(
+            grading,
+            {
+                "event": "mentor",
+                "problem": problem_id,
+                "command": mentor_cmd,
+                "status": status,
+                **usage,
+            },
+        )
+
+
+# if a mentor command with the given status and output (see ExecMentor()) did
+# not terminate normally, store an appropriate grade for the problem id.
+def StoreMentorFailure(grading, problem_id: str, mentor_cmd: List[str], status, output):
+    if status == "error":
         StoreGrade(
+            grading,
             problem_id,
             0,
             f"Mentor terminated abnormally on command '{mentor_cmd}':\n{output}",
             False,
         )
-        return (False, output)
-    else:
-        return (True, output)
+    elif status == "timeout":
+        StoreGrade(
+            grading,
+            problem_id,
+            0,
+            f"Mentor timed out after {mentor_timeout} seconds on command '{mentor_cmd}':\n{output}",
+            False,
+        )
+    elif status == "over-budget":
+        StoreOverBudget(grading, problem_id)
+    elif status == "memory-limit":
+        limit = MentorLimits(mentor_cmd)["memory"] // 2**20
+        StoreGrade(
+            grading,
+            problem_id,
+            0,
+            f"Mentor ran out of memory (limit {limit} MB) on command '{mentor_cmd}':\n{output}",
+            False,
+        )
+    elif status == "cpu-limit":
+        limit = MentorLimits(mentor_cmd)["cpu"]
+        StoreGrade(
+            grading,
+            problem_id,
+            0,
+            f"Mentor went over its cpu time limit of {limit} seconds on command '{mentor_cmd}':\n{output}",
+            False,
+        )
+    elif status == "output-limit":
+        limit = MentorLimits(mentor_cmd)["output"] // 2**20
+        StoreGrade(
+            grading,
+            problem_id,
+            0,
+            f"Mentor went over its output limit of {limit} MB on command '{mentor_cmd}':\n{output}",
+            False,
+        )
+
+
+# run the given mentor command and wait for it to finish. returns a pair s.t.
+# the boolean indicates whether the command terminated normally (True) or not
+# (False) and the string contains the output of the command. if the command did
+# not terminate normally, it stores an appropriate grade for the problem id.
+def RunMentor(
+    grading: Dict[str, Any], problem_id: str, mentor_cmd: List[str]
+) -> Tuple[bool, str]:
+    return FinishMentor(
+        grading, problem_id, mentor_cmd, StartMentor(grading, mentor_cmd)
+    )
+
+
+# returns a function for StreamMentor() that compares a student's gen_words
+# output against the solution wordlist one word at a time, assuming both are in
+# shortlex order. 'get_solution_words' returns an iterator over the words of the
+# solution wordlist (or None if there isn't one); it is called when the first
+# word arrives, and the solution words are then read as the student words reach
+# them, so the solution wordlist is never in memory as a whole. the results are
+# kept in 'diff', which is filled in with:
+#
+# { 'student-words': [<word>, ...], // the student words read so far
+#   'false-positives': [<word>, ...], // student words not in the solution
+#   'false-negatives': [<word>, ...], // solution words not in the student list
+#   'stopped': <bool>, // whether we stopped before the end of the output
+#   'in-order': <bool>, // false if either list wasn't in shortlex order
+#   'solution-words': <iterator>, // the solution words after 'next-word'
+#   'next-word': "<word>", // the first solution word not yet compared, or None
+#   'next-key': <key>, // ShortlexKey() of 'next-word'
+#   'previous-key': <key>, // ShortlexKey() of the last student word
+# }
+#
+# the function returns False (stopping mentor) once there are at least
+# 'stream_candidates' false positives and negatives together. at that point the
+# false positives/negatives found so far are the first ones in shortlex order,
+# except that the false negatives don't include the solution words from
+# 'next-word' on---those are false negatives only if the student list ended
+# before reaching them, see FinishWordlistDiff(). if the lists weren't both in
+# order then 'false-positives' and 'false-negatives' are meaningless and the
+# caller has to compare 'student-words' against the solution itself.
+def WordlistDiffConsumer(
+    get_solution_words: Callable[[], Any], diff: Dict[str, Any]
+) -> Callable[[str], bool]:
+    diff.update(
+        {
+            "student-words": [],
+            "false-positives": [],
+            "false-negatives": [],
+            "stopped": False,
+            "in-order": True,
+            "previous-key": None,
+        }
+    )
+
+    def Consume(word: str) -> bool:
+        if word == "":
+            return True
+        diff["student-words"].append(word)
+        if not diff["in-order"] or not StartSolutionWords(get_solution_words, diff):
+            return True
+
+        key = ShortlexKey(word)
+        if diff["previous-key"] is not None and diff["previous-key"] >= key:
+            diff["in-order"] = False
+            return True
+        diff["previous-key"] = key
+
+        # every solution word before this student word is missing from the
+        # student list; this student word is extra unless it matches the next
+        # solution word.
+        while diff["next-key"] is not None and diff["next-key"] < key:
+            diff["false-negatives"].append(diff["next-word"])
+            if not NextSolutionWord(diff):
+                return True
+        if diff["next-key"] == key:
+            if not NextSolutionWord(diff):
+                return True
+        else:
+            diff["false-positives"].append(word)
+
+        found = len(diff["false-positives"]) + len(diff["false-negatives"])
+        if found >= stream_candidates:
+            diff["stopped"] = True
+            return False
+        return True
+
+    return Consume
+
+
+# start reading the solution words of a diff (see WordlistDiffConsumer()), if
+# that hasn't been done yet. returns whether the lists can still be compared in
+# order, which they can't if there is no solution wordlist.
+def StartSolutionWords(
+    get_solution_words: Callable[[], Any], diff: Dict[str, Any]
+) -> bool:
+    if "solution-words" not in diff:
+        solution_words = get_solution_words()
+        if solution_words is None:
+            diff["in-order"] = False
+            return False
+        diff["solution-words"] = solution_words
+        diff["next-key"] = None
+        NextSolutionWord(diff)
+    return diff["in-order"]
+
+
+# move a diff (see WordlistDiffConsumer()) on to the next solution word. returns
+# False (and clears 'in-order') if that word isn't after the one before it in
+# shortlex order.
+def NextSolutionWord(diff: Dict[str, Any]) -> bool:
+    previous_key = diff["next-key"]
+    word = next(diff["solution-words"], None)
+    diff["next-word"] = word
+    diff["next-key"] = None if word is None else ShortlexKey(word)
+    if (
+        word is not None
+        and previous_key is not None
+        and previous_key >= diff["next-key"]
+    ):
+        diff["in-order"] = False
+    return diff["in-order"]
+
+
+# finish a diff (see WordlistDiffConsumer()) once the student's output has ended:
+# the solution words that weren't reached are false negatives, of which only as
+# many are kept as the function would have found before stopping. the rest of
+# the solution wordlist is still read (though not kept) even if the diff was
+# stopped, to check that all of it is in order.
+def FinishWordlistDiff(
+    get_solution_words: Callable[[], Any], diff: Dict[str, Any]
+) -> None:
+    if not diff["in-order"] or not StartSolutionWords(get_solution_words, diff):
+        return
+    false_negatives = diff["false-negatives"]
+    found = len(diff["false-positives"]) + len(false_negatives)
+    while diff["next-word"] is not None:
+        if not diff["stopped"] and found < stream_candidates:
+            false_negatives.append(diff["next-word"])
+            found += 1
+        if not NextSolutionWord(diff):
+            return
 
 
 # grade a problem involving regular languages. fills in an appropriate entry in
 # 'grades' for the given problem id. assumes problem_info comes from
 # GetProblemInfo() and solution_info comes from GetSolutionInfo(), and hence are
 # in the expected formats.
-def GradeRegular(problem_info, solution_info) -> None:
+def GradeRegular(grading, problem_info, solution_info) -> None:
     assert (
         LanguageClass(problem_info["file-type"]) == "regular"
         and LanguageClass(solution_info["file-type"]) == "regular"
     )
 
     if problem_info["file-type"] != solution_info["expected-type"]:
-        StoreGrade(problem_info["id"], 0, "Wrong format\n", True)
+        StoreGrade(grading, problem_info["id"], 0, "Wrong format\n", True)
         return
 
     problem_id = problem_info["id"]
-    ok, output = RunMentor(
-        problem_id, [mentor, problem_info["file"], "compare", solution_info["file"]]
-    )
+    output = None
+    if native_dfa_compare and problem_info["file-type"] == "dfa":
+        output = CompareDfaFiles(grading, problem_info, solution_info)
+    if output is not None:
+        ok = True
+    else:
+        ok, output = RunMentor(
+            grading,
+            problem_id,
+            [grading["mentor"], problem_info["file"], "compare", solution_info["file"]],
+        )
 
     if ok and "The languages are equivalent" in output:
         StoreGrade(
+            grading,
             problem_info["id"],
             solution_info["point-value"],
             f"Correct (points = {solution_info['point-value']})",
             True,
         )
     elif ok:
-        StoreGrade(problem_info["id"], 0, "Incorrect (points = 0):\n" + output, True)
+        StoreGrade(
+            grading, problem_info["id"], 0, "Incorrect (points = 0):\n" + output, True
+        )
+
+
+# compare the student's dfa for a regular problem against the solution in-process
+# (see 'native_dfa_compare'), returning the output that mentor's compare command
+# would give, or None if either file isn't a dfa that can be compared here.
+def CompareDfaFiles(grading, problem_info, solution_info):
+    if solution_info["file-type"] != "dfa":
+        return None
+    with TracePhase(grading, "dfa-compare", problem_info["id"]):
+        dfas = []
+        for info in [problem_info, solution_info]:
+            with open(info["file"], "r", errors="surrogateescape") as handle:
+                dfas.append(ParseDfa(handle.read()))
+        student, solution = dfas
+        if student is None or solution is None:
+            return None
+        output = CompareDfas(student, solution)
+    # mentor's output is followed by its (empty) standard error, see
+    # ExecMentor().
+    return None if output is None else output + "\n"
+
+
+# get the student and solution wordlists for a context-free problem and compare
+# them. returns a pair (false positives, false negatives) s.t. false positives
+# are words in the student list that aren't in the solution and false negatives
+# are words in the solution that aren't in the student list, both in shortlex
+# order. when the lists are compared as the student's gen_words runs (see
+# 'stream_gen_words'), only the first of them are returned (see
+# WordlistDiffConsumer()), which is all GradeContextFree() checks. returns None
+# if mentor did not terminate normally, in which case a grade has already been
+# stored.
+def CompareWordlists(grading, problem_info, solution_info):
+    problem_id = problem_info["id"]
+    with tempfile.TemporaryDirectory() as tmp:
+        # get the student and solution wordlists. the two gen_words commands are
+        # independent, so they run at the same time, in a group so that the
+        # solution command can be stopped if the student command fails. the
+        # solution command is started first; see StartStreamingMentor() for why
+        # that matters.
+        group = NewMentorGroup()
+        if "wordlist-file" in solution_info:
+            solution_file = solution_info["wordlist-file"]
+        else:
+            solution_file = os.path.join(tmp, "solution.wordlist")
+            solution_cmd = [
+                grading["mentor"],
+                solution_info["file"],
+                "gen_words",
+                str(solution_info["num-words"]),
+            ]
+            solution_future = StartMentor(grading, solution_cmd, solution_file, group)
+
+        # returns an iterator over the words of the solution wordlist, or None
+        # if the solution's gen_words terminated abnormally.
+        def GetSolutionWords():
+            if "wordlist-file" not in solution_info:
+                status, _, _ = solution_future.result()
+                if status != "ok":
+                    return None
+            return WordlistFileWords(solution_file)
+
+        student_file = os.path.join(tmp, "student.wordlist")
+        student_cmd = [
+            grading["mentor"],
+            problem_info["file"],
+            "gen_words",
+            str(solution_info["num-words"]),
+        ]
+        if stream_gen_words:
+            diff = {}
+            student_future = StartStreamingMentor(
+                grading,
+                student_cmd,
+                WordlistDiffConsumer(GetSolutionWords, diff),
+                group,
+            )
+        else:
+            student_future = StartMentor(grading, student_cmd, student_file, group)
+
+        ok, _ = FinishMentor(grading, problem_id, student_cmd, student_future)
+        if not ok:
+            # the solution command may already be running, and has to finish
+            # before its output file is removed along with 'tmp'.
+            StopMentors(group)
+            if "wordlist-file" not in solution_info:
+                status, _, usage = solution_future.result()
+                TraceMentor(grading, problem_id, solution_cmd, status, usage)
+            return None
+
+        if "wordlist-file" not in solution_info:
+            ok, _ = FinishMentor(grading, problem_id, solution_cmd, solution_future)
+            if not ok:
+                return None
+
+        # compute differences between student and solution.
+        with TracePhase(grading, "diff", problem_id):
+            if stream_gen_words:
+                FinishWordlistDiff(GetSolutionWords, diff)
+            if stream_gen_words and diff["in-order"]:
+                false_positives = diff["false-positives"]
+                false_negatives = diff["false-negatives"]
+            else:
+                if stream_gen_words:
+                    student_wordlist = diff["student-words"]
+                else:
+                    student_wordlist = ReadWordlistFile(student_file)
+                false_positives, false_negatives = ShortlexDiff(
+                    student_wordlist, ReadWordlistFile(solution_file)
+                )
+        return (false_positives, false_negatives)
+
+
+# like CompareWordlists(), but the wordlists are compared using fingerprints of
+# their words (see wordlist.py): the gen_words output goes to temporary files,
+# and only the words that are returned are ever read back as strings. returns
+# only the first 'verify_candidates' false positives and false negatives, since
+# that's all GradeContextFree() checks.
+def CompareFingerprintedWordlists(grading, problem_info, solution_info):
+    problem_id = problem_info["id"]
+    with tempfile.TemporaryDirectory() as tmp:
+        # the two gen_words commands run in a group, as in CompareWordlists().
+        group = NewMentorGroup()
+        if "wordlist-file" in solution_info:
+            solution_file = solution_info["wordlist-file"]
+        else:
+            solution_file = os.path.join(tmp, "solution.wordlist")
+            solution_cmd = [
+                grading["mentor"],
+                solution_info["file"],
+                "gen_words",
+                str(solution_info["num-words"]),
+            ]
+            solution_future = StartMentor(grading, solution_cmd, solution_file, group)
+
+        student_file = os.path.join(tmp, "student.wordlist")
+        student_cmd = [
+            grading["mentor"],
+            problem_info["file"],
+            "gen_words",
+            str(solution_info["num-words"]),
+        ]
+        student_future = StartMentor(grading, student_cmd, student_file, group)
+
+        ok, _ = FinishMentor(grading, problem_id, student_cmd, student_future)
+        if not ok:
+            # the solution command may already be running, and has to finish
+            # before its output file is removed along with 'tmp'.
+            StopMentors(group)
+            if "wordlist-file" not in solution_info:
+                status, _, usage = solution_future.result()
+                TraceMentor(grading, problem_id, solution_cmd, status, usage)
+            return None
+        if "wordlist-file" not in solution_info:
+            ok, _ = FinishMentor(grading, problem_id, solution_cmd, solution_future)
+            if not ok:
+                return None
+
+        with TracePhase(grading, "diff", problem_id):
+            student_wordlist = FingerprintWordlistFile(student_file)
+            if "fingerprint-file" in solution_info:
+                solution_wordlist = MapFingerprints(
+                    solution_file, solution_info["fingerprint-file"]
+                )
+            else:
+                solution_wordlist = FingerprintWordlistFile(solution_file)
+            false_positives, false_negatives = FingerprintDiff(
+                student_wordlist, solution_wordlist, verify_candidates
+            )
+            return (
+                WordlistFileWordsAt(student_wordlist, false_positives),
+                WordlistFileWordsAt(solution_wordlist, false_negatives),
+            )
 
 
 # grade a problem involving context-free languages. fills in an appropriate
 # entry in 'grades' for the given problem id. assumes problem_info comes from
 # GetProblemInfo() and solution_info comes from GetSolutionInfo(), and hence are
 # in the expected formats.
-def GradeContextFree(problem_info, solution_info) -> None:
+def GradeContextFree(grading, problem_info, solution_info) -> None:
     assert (
         LanguageClass(problem_info["file-type"]) == "context-free"
         and LanguageClass(solution_info["file-type"]) == "context-free"
     )
 
     if problem_info["file-type"] != solution_info["expected-type"]:
-        StoreGrade(problem_info["id"], 0, "Wrong format\n", False)
-        return
-
-    # get student wordlist.
-    problem_id = problem_info["id"]
-    ok, output = RunMentor(
-        problem_id,
-        [mentor, problem_info["file"], "gen_words", str(solution_info["num-words"])],
-    )
-    if not ok:
+        StoreGrade(grading, problem_info["id"], 0, "Wrong format\n", False)
         return
-    student_wordlist = output.strip().splitlines()
-
-    # get solution wordlist.
-    if "wordlist" in solution_info:
-        solution_wordlist = solution_info["wordlist"]
-    else:
-        ok, output = RunMentor(
-            problem_id,
-            [
-                mentor,
-                solution_info["file"],
-                "gen_words",
-                str(solution_info["num-words"]),
-            ],
-        )
-        if not ok:
-            return
-        solution_wordlist = output.strip().splitlines()
 
     # compute differences between student and solution. false positives are
     # words in the student list that aren't in the solution; false negatives are
-    # words in the solution that aren't in the student list.
-    false_positives = np.setdiff1d(student_wordlist, solution_wordlist)
-    false_negatives = np.setdiff1d(solution_wordlist, student_wordlist)
+    # words in the solution that aren't in the student list. both are in
+    # shortlex order, so the shortest counterexamples come first.
+    CountSolutionWords(solution_info)
+    if solution_info["num-words"] >= fingerprint_words:
+        differences = CompareFingerprintedWordlists(
+            grading, problem_info, solution_info
+        )
+    else:
+        differences = CompareWordlists(grading, problem_info, solution_info)
+    if differences is None:
+        return
+    false_positives, false_negatives = differences
 
     # student solution is exactly correct.
     if len(false_positives) == 0 and len(false_negatives) == 0:
         StoreGrade(
+            grading,
             problem_info["id"],
             solution_info["point-value"],
             f"Correct (points = {solution_info['point-value']})",
@@ -468,36 +1856,42 @@ def GradeContextFree(problem_info, solution_info) -> None:
     # sometimes there can be thousands of "false false positives/negatives",
     # which can take prohibitively long to run through mentor. we are guaranteed
     # that one of the two lists doesn't have any false entries, so we'll check
-    # the first entry of both (thus ensuring we have at least one word for
-    # feedback) and just use those results instead of looking through all the
-    # potential false positives/negatives.
-
-    real_false_positive = None
-    real_false_negative = None
-
-    if len(false_positives) > 0:
-        word = false_positives[0]
-        ok, output = RunMentor(
-            problem_id, [mentor, solution_info["file"], "accept", word]
-        )
+    # the first 'verify_candidates' entries of both (thus ensuring we have at
+    # least one word for feedback) and just use those results instead of looking
+    # through all the potential false positives/negatives. each check is a
+    # separate mentor command, but they are independent and so run at the same
+    # time.
+    problem_id = problem_info["id"]
+    positive_checks = []
+    for word in false_positives[:verify_candidates]:
+        cmd = [grading["mentor"], solution_info["file"], "accept", word]
+        positive_checks.append((word, cmd, StartMentor(grading, cmd)))
+
+    negative_checks = []
+    for word in false_negatives[:verify_candidates]:
+        cmd = [grading["mentor"], problem_info["file"], "accept", word]
+        negative_checks.append((word, cmd, StartMentor(grading, cmd)))
+
+    real_false_positives = []
+    for word, cmd, future in positive_checks:
+        ok, output = FinishMentor(grading, problem_id, cmd, future)
         if not ok:
             return
         if "Input is not accepted" in output:
-            real_false_positive = word if word != "" else "ε"
+            real_false_positives.append(word if word != "" else "ε")
 
-    if len(false_negatives) > 0:
-        word = false_negatives[0]
-        ok, output = RunMentor(
-            problem_id, [mentor, problem_info["file"], "accept", word]
-        )
+    real_false_negatives = []
+    for word, cmd, future in negative_checks:
+        ok, output = FinishMentor(grading, problem_id, cmd, future)
         if not ok:
             return
         if "Input is not accepted" in output:
-            real_false_negative = word if word != "" else "ε"
+            real_false_negatives.append(word if word != "" else "ε")
 
     # it should be impossible not to have found at least one word.
-    if real_false_negative == None and real_false_positive == None:
+    if not real_false_negatives and not real_false_positives:
         StoreGrade(
+            grading,
             problem_info["id"],
             0,
             "existence assumption incorrect; contact instructor",
@@ -507,34 +1901,35 @@ def GradeContextFree(problem_info, solution_info) -> None:
 
     # construct the feedback to the student and store their grade.
     msg = "Incorrect (points = 0):\n"
-    if real_false_negative != None:
-        msg += f"The word {real_false_negative} should be accepted.\n"
-    if real_false_positive != None:
-        msg += f"The word {real_false_positive} should be rejected.\n"
-    StoreGrade(problem_info["id"], 0, msg, True)
+    for word in real_false_negatives[:feedback_words]:
+        msg += f"The word {word} should be accepted.\n"
+    for word in real_false_positives[:feedback_words]:
+        msg += f"The word {word} should be rejected.\n"
+    StoreGrade(grading, problem_info["id"], 0, msg, True)
 
 
 # grade a problem involving unrestricted languages. fills in an appropriate
 # entry in 'grades' for the given problem id. assumes problem_info comes from
 # GetProblemInfo() and solution_info comes from GetSolutionInfo(), and hence are
 # in the expected formats.
-def GradeUnrestricted(problem_info, solution_info) -> None:
+def GradeUnrestricted(grading, problem_info, solution_info) -> None:
     assert (
         LanguageClass(problem_info["file-type"]) == "unrestricted"
         and LanguageClass(solution_info["expected-type"]) == "unrestricted"
     )
 
     if problem_info["file-type"] != solution_info["expected-type"]:
-        StoreGrade(problem_info["id"], 0, "Wrong format\n", True)
+        StoreGrade(grading, problem_info["id"], 0, "Wrong format\n", True)
         return
 
     problem_id = problem_info["id"]
 
     # run student submission on wordlist.
-    ok, output = RunMentor(
+    ok, output = RunAcceptFile(
+        grading,
         problem_id,
         [
-            mentor,
+            grading["mentor"],
             problem_info["file"],
             "accept_file",
             solution_info["file"],
@@ -543,9 +1938,10 @@ def GradeUnrestricted(problem_info, solution_info) -> None:
     )
     if not ok:
         return
-    
+
     if "All inputs correctly categorized" in output:
         StoreGrade(
+            grading,
             problem_info["id"],
             solution_info["point-value"],
             f"Correct (points = {solution_info['point-value']})",
@@ -553,139 +1949,811 @@ def GradeUnrestricted(problem_info, solution_info) -> None:
         )
     else:
         StoreGrade(
+            grading,
             problem_info["id"],
             0,
             output,
             True,
         )
 
-# get the current submission time.
-now = GetTimeFromString(metadata["created_at"])
 
-# fill in 'previous_info' with the information about previous submissions.
-for submission in metadata["previous_submissions"]:
-    # elapsed time since previous submission, in minutes.
-    elapsed_time = int(
-        (now - GetTimeFromString(submission["submission_time"])).total_seconds() // 60
+# the headers of the two lists of words in the solution wordlist of an
+# unrestricted problem: the inputs that should be accepted, and the inputs that
+# should be rejected.
+accept_header = "## ACCEPT ##"
+reject_header = "## REJECT ##"
+
+
+# run the given accept_file command for an unrestricted problem (see
+# GradeUnrestricted()) like RunMentor() does, but if the solution wordlist is
+# long enough, split it into shards that run at the same time (see
+# 'shard_accept_file'). each shard only has words from one of the two lists of
+# the wordlist, so that its output says which list each miscategorized input is
+# from, and the outputs of the shards are merged into the output of the whole
+# wordlist (see MergeAcceptFileOutputs()). if the shards' outputs can't be
+# merged, the command runs on the whole wordlist after all.
+def RunAcceptFile(
+    grading: Dict[str, Any], problem_id: str, mentor_cmd: List[str]
+) -> Tuple[bool, str]:
+    lists = None
+    if shard_accept_file:
+        lists = ReadAcceptFileLists(mentor_cmd[3])
+    num_words = 0 if lists is None else len(lists["accept"]) + len(lists["reject"])
+    num_shards = min(max_concurrency, num_words // max(shard_words, 1))
+    if num_shards < 2:
+        return RunMentor(grading, problem_id, mentor_cmd)
+
+    # the shards, as tuples (list, command, future) in wordlist order. the
+    # lists are split into pieces of the same size, so there may be one more
+    # shard than 'num_shards'.
+    shards: List[Tuple[str, List[str], Future]] = []
+    shard_size = -(-num_words // num_shards)
+    group = NewMentorGroup()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ["accept", "reject"]:
+            words = lists[name]
+            for start in range(0, len(words), shard_size):
+                shard_file = join(tmp, f"shard{len(shards)}.wordlist")
+                with open(shard_file, "w", errors="surrogateescape") as handle:
+                    handle.write(accept_header + "\n")
+                    if name == "reject":
+                        handle.write(reject_header + "\n")
+                    for word in words[start : start + shard_size]:
+                        handle.write(word + "\n")
+                    if name == "accept":
+                        handle.write(reject_header + "\n")
+                cmd = mentor_cmd[:3] + [shard_file] + mentor_cmd[4:]
+                shards.append((name, cmd, StartMentor(grading, cmd, group=group)))
+
+        # the result is known as soon as a shard fails, or, with
+        # 'shard_fail_fast', as soon as a shard finds a miscategorized input,
+        # so the other shards are stopped then.
+        for future in as_completed([future for _, _, future in shards]):
+            status, output, _ = future.result()
+            if status != "ok" or (
+                shard_fail_fast and "All inputs correctly categorized" not in output
+            ):
+                StopMentors(group)
+                break
+
+        results = []
+        for name, cmd, future in shards:
+            status, output, usage = future.result()
+            TraceMentor(grading, problem_id, cmd, status, usage)
+            results.append((name, status, output))
+
+    # a shard that failed fails the whole command, which is what the student is
+    # told about.
+    for name, status, output in results:
+        if status not in ["ok", "stopped"]:
+            StoreMentorFailure(grading, problem_id, mentor_cmd, status, output)
+            return (False, output)
+    output = MergeAcceptFileOutputs(
+        [(name, output) for name, status, output in results if status == "ok"]
+    )
+    if output is None:
+        return RunMentor(grading, problem_id, mentor_cmd)
+    return (True, output)
+
+
+# read the solution wordlist of an unrestricted problem and return its lists of
+# words as a record { 'accept': [<word>, ...], 'reject': [<word>, ...] }, or None
+# if it isn't simply the accept list followed by the reject list (which mentor
+# also reads, but which isn't split into shards, see RunAcceptFile()). the empty
+# word is an empty line.
+def ReadAcceptFileLists(wordlist_file: str) -> Dict[str, List[str]]:
+    with open(wordlist_file, "r", newline="", errors="surrogateescape") as handle:
+        lines = handle.read().split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    if (
+        not lines
+        or lines[0] != accept_header
+        or lines.count(accept_header) != 1
+        or lines.count(reject_header) != 1
+    ):
+        return None
+    reject_start = lines.index(reject_header)
+    return {"accept": lines[1:reject_start], "reject": lines[reject_start + 1 :]}
+
+
+# merge the outputs of the accept_file commands for the shards of a wordlist (see
+# RunAcceptFile()), given as pairs (list, output) in wordlist order, into the
+# output of the command for the whole wordlist, or return None if an output
+# isn't what accept_file prints. for each of the two lists, mentor only reports
+# the first input that is miscategorized or that doesn't finish within the
+# maximum number of steps: first the input that should have been rejected, then
+# the input that should have been accepted, and then one input that didn't
+# finish (from the accept list, if both lists have one).
+def MergeAcceptFileOutputs(outputs: List[Tuple[str, str]]) -> str:
+    first: Dict[str, Any] = {"accept": None, "reject": None}
+    expected = {
+        "accept": "should have been accepted",
+        "reject": "should have been rejected",
+    }
+    for name, output in outputs:
+        for line in output.split("\n"):
+            if line in ["", "All inputs correctly categorized."]:
+                continue
+            match = re.fullmatch(
+                r"Input .* (should have been accepted|should have been rejected|"
+                r"execution timed out)\.",
+                line,
+            )
+            if not match or match.group(1) not in [
+                expected[name],
+                "execution timed out",
+            ]:
+                return None
+            if first[name] is None:
+                first[name] = (match.group(1) == "execution timed out", line)
+
+    lines = [
+        first[name][1]
+        for name in ["reject", "accept"]
+        if first[name] and not first[name][0]
+    ]
+    timed_out = [
+        first[name][1]
+        for name in ["accept", "reject"]
+        if first[name] and first[name][0]
+    ]
+    lines += timed_out[:1]
+    if not lines:
+        lines = ["All inputs correctly categorized."]
+    # mentor's output is followed by its (empty) standard error, see
+    # ExecMentor().
+    return "".join(line + "\n" for line in lines) + "\n"
+
+
+# return the estimated time, in seconds, to grade the given problem: the time it
+# took to grade the last time it was graded if that was recorded, otherwise the
+# default for its language class (see 'default_grading_time').
+def EstimateGradingTime(
+    grading: Dict[str, Any], problem_id: str, problem_type: str
+) -> float:
+    previous_info = grading["previous-info"]
+    if problem_id in previous_info and "grading-time" in previous_info[problem_id]:
+        return previous_info[problem_id]["grading-time"]
+    return default_grading_time[LanguageClass(problem_type)]
+
+
+# return the hashes that identify what a problem's result depends on, as a
+# record:
+#
+# { 'submission-hash': <hash>, // the contents of the submitted file
+#   'solution-hash': <hash>, // the name and contents of the solution file, and
+#                            // of its wordlist if it has one
+# }
+#
+# these are recorded in the results for every graded problem, so that a later
+# submission with the same hashes can reuse the result, see 'reuse_results'.
+def ProblemHashes(problem_info, solution_info) -> Dict[str, str]:
+    solution = [os.path.basename(solution_info["file"])]
+    solution.append(solution_info.get("file-hash") or FileDigest(solution_info["file"]))
+    if "wordlist-file" in solution_info:
+        solution.append(
+            solution_info.get("wordlist-hash")
+            or FileDigest(solution_info["wordlist-file"])
+        )
+    return {
+        "submission-hash": problem_info.get("submission-hash")
+        or FileDigest(problem_info["file"]),
+        "solution-hash": MemoKey(*solution),
+    }
+
+
+# return the key under which the result of grading the given problem is
+# remembered in 'verdict_memo_dir': a hash of the canonical form of the
+# submitted file, the solution (see ProblemHashes()), the mentor executable, and
+# the settings that change what feedback is given.
+def VerdictKey(grading: Dict[str, Any], problem_info, hashes) -> str:
+    with open(problem_info["file"], "r", errors="surrogateescape") as handle:
+        canonical = CanonicalForm(handle.read(), problem_info["file-type"])
+    return MemoKey(
+        "verdict",
+        problem_info["file-type"],
+        canonical,
+        hashes["solution-hash"],
+        FileDigest(grading["mentor"]),
+        [verify_candidates, feedback_words, max_output_bytes],
+    )
+
+
+# return the result remembered in 'verdict_memo_dir' under 'key' (see
+# VerdictKey()), as a record { 'score': <score>, 'output': <message to student> },
+# or None if there isn't one.
+def ReadVerdict(key: str) -> Dict[str, Any]:
+    handle = OpenMemo(verdict_memo_dir, key)
+    if handle is None:
+        return None
+    with handle:
+        return json.loads(handle.read())
+
+
+# remember the result of grading a problem in 'verdict_memo_dir' under 'key'.
+def WriteVerdict(key: str, score: int, output: str) -> None:
+    verdict = json.dumps({"score": score, "output": output}).encode("utf-8")
+    WriteMemo(
+        verdict_memo_dir, key, lambda handle: handle.write(verdict), verdict_memo_bytes
     )
 
-    if not "tests" in submission["results"]:
-        continue
 
-    for problem in submission["results"]["tests"]:
-        problem_id = problem["name"]
-        if problem["extra_data"]["graded"] != True:
+# check the student's file for a problem for mistakes that make mentor fail (see
+# 'precheck_submissions'). returns whether the file can be graded; if not, an
+# error has already been stored for the problem. files in the wrong format are
+# left to the grader, which reports that.
+def PrecheckSubmission(grading, problem_info, solution_info) -> bool:
+    problem_id = problem_info["id"]
+    file_type = problem_info["file-type"]
+    if file_type != solution_info["expected-type"]:
+        return True
+    with TracePhase(grading, "precheck", problem_id):
+        with open(problem_info["file"], "r", errors="surrogateescape") as handle:
+            result = PrecheckFile(handle.read(), file_type)
+        error = result["error"]
+
+        # mentor's compare command doesn't compare languages over different
+        # alphabets. the solution should always be valid, but if it isn't,
+        # mentor reports that instead.
+        if error is None and LanguageClass(file_type) == "regular":
+            with open(solution_info["file"], "r", errors="surrogateescape") as handle:
+                solution = PrecheckFile(handle.read(), solution_info["file-type"])
+            if solution["alphabet"] is not None and set(result["alphabet"]) != set(
+                solution["alphabet"]
+            ):
+                error = (
+                    f"Error on line {result['alphabet-line']}: the alphabet doesn't "
+                    "match the reference solution's alphabet.\n"
+                )
+    if error is None:
+        return True
+    StoreGrade(grading, problem_id, 0, error, False)
+    return False
+
+
+# grade a problem using the given grader (one of GradeRegular(),
+# GradeContextFree(), or GradeUnrestricted()) and record how long it took and
+# its hashes (see ProblemHashes()) in 'grades', unless 'time_budget' has
+# already run out, in which case the problem isn't graded. if the file has a
+# mistake that would make mentor fail, that is reported instead (see
+# 'precheck_submissions'). if the same submission (in canonical form) was
+# graded before, its result is reused instead, see 'verdict_memo_dir'. returns
+# whether the problem's result is final, i.e., unless the time budget ran out
+# (before the problem was started, or while one of its mentor commands ran).
+def GradeWithinBudget(grading, grader, problem_info, solution_info, hashes) -> bool:
+    problem_id = problem_info["id"]
+    grades = grading["grades"]
+    start = time.monotonic()
+
+    if precheck_submissions and not PrecheckSubmission(
+        grading, problem_info, solution_info
+    ):
+        return True
+
+    verdict_key = None
+    if verdict_memo_dir is not None:
+        with TracePhase(grading, "canonicalization", problem_id):
+            verdict_key = VerdictKey(grading, problem_info, hashes)
+            verdict = ReadVerdict(verdict_key)
+        if verdict is not None:
+            StoreGrade(grading, problem_id, verdict["score"], verdict["output"], True)
+            grades[problem_id].update(hashes)
+            return True
+
+    if start >= grading["deadline"]:
+        StoreOverBudget(grading, problem_id)
+        return False
+    with TracePhase(grading, "grading", problem_id):
+        grader(grading, problem_info, solution_info)
+    if grades[problem_id]["graded"]:
+        grades[problem_id]["grading-time"] = round(time.monotonic() - start, 3)
+        grades[problem_id].update(hashes)
+        if verdict_key is not None:
+            WriteVerdict(
+                verdict_key, grades[problem_id]["score"], grades[problem_id]["output"]
+            )
+    return not grades[problem_id].get("over-budget", False)
+
+
+# fill in 'previous-info' in 'grading' from the submission metadata (see
+# 'submission_metadata_file').
+def ReadPreviousInfo(grading: Dict[str, Any], metadata: Dict[str, Any]) -> None:
+    previous_info = grading["previous-info"]
+
+    # get the current submission time.
+    now = GetTimeFromString(metadata["created_at"])
+
+    # the results of graded problems by their hashes, as a tuple (elapsed time,
+    # result) for each pair of hashes, so that the most recent one is kept.
+    hashed_results: Dict[str, Dict[str, Tuple[int, Dict[str, Any]]]] = {}
+
+    # fill in 'previous-info' with the information about previous submissions.
+    for submission in metadata["previous_submissions"]:
+        # elapsed time since previous submission, in minutes.
+        elapsed_time = int(
+            (now - GetTimeFromString(submission["submission_time"])).total_seconds()
+            // 60
+        )
+
+        if not "tests" in submission["results"]:
+            continue
+
+        for problem in submission["results"]["tests"]:
+            problem_id = problem["name"]
+            if problem["extra_data"]["graded"] != True:
+                continue
+            extra_data = problem["extra_data"]
+            # only the most recent result for each pair of hashes has its
+            # output, see ReadSubmissionMetadata().
+            if (
+                "submission-hash" in extra_data
+                and "solution-hash" in extra_data
+                and "output" in problem
+            ):
+                hashes = (
+                    f"{extra_data['submission-hash']} {extra_data['solution-hash']}"
+                )
+                results = hashed_results.setdefault(problem_id, {})
+                if hashes not in results or results[hashes][0] > elapsed_time:
+                    results[hashes] = (
+                        elapsed_time,
+                        {"score": int(problem["score"]), "output": problem["output"]},
+                    )
+            if (
+                problem_id in previous_info
+                and previous_info[problem_id]["elapsed-time"] < elapsed_time
+            ):
+                continue
+            previous_info[problem_id] = {
+                "elapsed-time": elapsed_time,
+                "previous-score": int(problem["score"]),
+            }
+            if "grading-time" in problem["extra_data"]:
+                previous_info[problem_id]["grading-time"] = problem["extra_data"][
+                    "grading-time"
+                ]
+
+    for problem_id, results in hashed_results.items():
+        previous_info[problem_id]["hashed-results"] = {
+            hashes: result for hashes, (_, result) in results.items()
+        }
+
+
+# read and check the submitted file of a problem (from GetProblemInfo()) in a
+# single pass: files larger than 'max_submission_bytes' aren't read at all, dos
+# line endings are converted to unix line endings in place (only rewriting the
+# file if it has any), and the hash of the converted contents is added to
+# 'problem_info' as 'submission-hash' (the same as FileDigest() of the converted
+# file, see ProblemHashes()), along with its size in bytes as 'size'. returns an
+# error message for the student, or None if the file can be graded.
+def IngestFile(problem_info: Dict[str, Any]) -> str:
+    with open(problem_info["file"], "rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size > max_submission_bytes:
+            return (
+                f"The submitted file is too large ({size} bytes; "
+                f"the limit is {max_submission_bytes} bytes)"
+            )
+        if size >= mmap_bytes:
+            content = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            content = handle.read()
+        try:
+            converted = None
+            if content.find(b"\r\n") != -1:
+                converted = content[:].replace(b"\r\n", b"\n")
+            digest = hashlib.sha256(converted or content).hexdigest()
+        finally:
+            if isinstance(content, mmap.mmap):
+                content.close()
+    if converted is not None:
+        with open(problem_info["file"], "wb") as handle:
+            handle.write(converted)
+        size = len(converted)
+    problem_info["size"] = size
+    problem_info["submission-hash"] = digest
+    return None
+
+
+# prepare the given submitted files for grading, storing a grade right away for
+# every file that won't be graded: files whose name isn't in the right format,
+# problems that are still in cooldown (whose files aren't read at all), and
+# files that IngestFile() finds a problem with. returns the submission in the
+# format:
+#
+# { 'order': [<key>, ...], // the key in 'grades' of each submitted file (its
+#                          // problem id, or its name if it isn't valid), in the
+#                          // order they were submitted
+#   'problems': [<problem info>, ...], // the problems left to grade, see
+#                                      // GetProblemInfo() and IngestFile()
+# }
+#
+# the previous info has to be read first (see ReadPreviousInfo()).
+def IngestSubmission(grading: Dict[str, Any], submitted_files: List[str]):
+    previous_info = grading["previous-info"]
+    submission: Dict[str, Any] = {"order": [], "problems": []}
+    for problem_file in submitted_files:
+        problem_info = GetProblemInfo(grading, problem_file)
+        if not problem_info:
+            submission["order"].append(problem_file)
+            StoreGrade(
+                grading,
+                problem_file,
+                0,
+                f"Invalid submitted file: {problem_file}",
+                False,
+            )
             continue
+
+        problem_id = problem_info["id"]
+        submission["order"].append(problem_id)
+
+        # if this problem is in cooldown, re-use the previous score instead of
+        # grading it again.
         if (
             problem_id in previous_info
-            and previous_info[problem_id]["elapsed-time"] < elapsed_time
+            and previous_info[problem_id]["elapsed-time"] <= cooldown
         ):
+            time_remaining = cooldown - previous_info[problem_id]["elapsed-time"]
+            StoreGrade(
+                grading,
+                problem_id,
+                previous_info[problem_id]["previous-score"],
+                f"Cooldown still in effect for this problem; {time_remaining} minutes remaining.",
+                False,
+            )
             continue
-        previous_info[problem_id] = {
-            "elapsed-time": elapsed_time,
-            "previous-score": int(problem["score"]),
-        }
 
-# the main computation loop: iterate through the submitted problems and grade
-# them as appropriate.
-for problem_file in submitted_files:
-    problem_info = GetProblemInfo(problem_file)
-    if not problem_info:
-        StoreGrade(problem_file, 0, f"Invalid submitted file: {problem_file}", False)
-        continue
+        error = IngestFile(problem_info)
+        if error is not None:
+            StoreGrade(grading, problem_id, 0, error, False)
+            continue
+        submission["problems"].append(problem_info)
+    return submission
+
+
+# grade the problems of the given submission (from IngestSubmission()), filling
+# in 'grades' in 'grading' in the same order as the submitted files.
+def GradeProblems(grading: Dict[str, Any], submission: Dict[str, Any]) -> None:
+    grades = grading["grades"]
+    previous_info = grading["previous-info"]
+
+    # problems are independent of each other, so they are graded in parallel in
+    # 'problem_pool', cheapest first. we first collect the problems to grade in
+    # 'to_grade' as tuples (estimated grading time, grader, problem info,
+    # solution info, hashes). problems can finish in any order, so we remember
+    # the order in which they were submitted (by their key in 'grades') in
+    # 'grading_order'.
+    problem_pool = ThreadPoolExecutor(max_workers=max_concurrency)
+    to_grade: List[Tuple[float, Callable, Any, Any, Dict[str, str]]] = []
+    grading_order: List[str] = submission["order"]
+
+    # the main computation loop: iterate through the submitted problems and
+    # grade them as appropriate.
+    for problem_info in submission["problems"]:
+        problem_id = problem_info["id"]
+
+        # find the solution file for this problem (handling any errors).
+        with TracePhase(grading, "solution-lookup", problem_id):
+            solution_file = FindMatchingSolutionFile(grading, problem_id)
+        if solution_file == "no matching solution":
+            StoreGrade(
+                grading,
+                problem_id,
+                0,
+                "There is no matching solution for this problem",
+                False,
+            )
+            continue
+        if solution_file == "multiple matching solutions":
+            StoreGrade(
+                grading,
+                problem_id,
+                0,
+                "There are conflicting solutions for this problem",
+                False,
+            )
+            continue
 
-    problem_id = problem_info["id"]
+        with TracePhase(grading, "solution-lookup", problem_id):
+            solution_info = GetSolutionInfo(grading, solution_file)
+        if (not solution_info) or LanguageClass(
+            solution_info["file-type"]
+        ) != LanguageClass(solution_info["expected-type"]):
+            StoreGrade(
+                grading, problem_id, 0, f"Invalid solution file: {solution_file}", False
+            )
+            continue
 
-    # if this problem is in cooldown, re-use the previous score instead of
-    # grading it again.
-    if (
-        problem_id in previous_info
-        and previous_info[problem_id]["elapsed-time"] <= cooldown
-    ):
-        time_remaining = cooldown - previous_info[problem_id]["elapsed-time"]
-        StoreGrade(
-            problem_id,
-            previous_info[problem_id]["previous-score"],
-            f"Cooldown still in effect for this problem; {time_remaining} minutes remaining.",
-            False,
-        )
-        continue
+        # we could now check whether this problem was already graded and
+        # received the maximum point-value and if so not bother grading it
+        # again, but this would be a mistake. the problem occurs when the
+        # initially provided solution is incorrect (which realistically does
+        # happen), the student receives maximum points (incorrectly because of
+        # the wrong solution), the solution is updated to be correct, and now
+        # the student needs to resubmit and get an updated score. if we add this
+        # check, the student wouldn't get an updated score for the updated
+        # solution.
+
+        # verify that the submitted problem and the solution are compatible,
+        # i.e., belong to the same language class.
+        problem_type = problem_info["file-type"]
+        solution_type = solution_info["file-type"]
+        if LanguageClass(problem_type) != LanguageClass(solution_type):
+            StoreGrade(
+                grading,
+                problem_id,
+                0,
+                f"The submitted problem is type {problem_type}, but the solution is type {solution_type}",
+                False,
+            )
+            continue
 
-    # find the solution file for this problem (handling any errors).
-    solution_file = FindMatchingSolutionFile(problem_id)
-    if solution_file == "no matching solution":
-        StoreGrade(
-            problem_id, 0, "There is no matching solution for this problem", False
-        )
-        continue
-    if solution_file == "multiple matching solutions":
-        StoreGrade(
-            problem_id, 0, "There are conflicting solutions for this problem", False
-        )
-        continue
-
-    solution_info = GetSolutionInfo(solution_file)
-    if (not solution_info) or LanguageClass(
-        solution_info["file-type"]
-    ) != LanguageClass(solution_info["expected-type"]):
-        StoreGrade(problem_id, 0, f"Invalid solution file: {solution_file}", False)
-        continue
-
-    # we could now check whether this problem was already graded and received
-    # the maximum point-value and if so not bother grading it again, but this
-    # would be a mistake. the problem occurs when the initially provided
-    # solution is incorrect (which realistically does happen), the student
-    # receives maximum points (incorrectly because of the wrong solution), the
-    # solution is updated to be correct, and now the student needs to resubmit
-    # and get an updated score. if we add this check, the student wouldn't get
-    # an updated score for the updated solution.
-
-    # verify that the submitted problem and the solution are compatible, i.e.,
-    # belong to the same language class.
-    problem_type = problem_info["file-type"]
-    solution_type = solution_info["file-type"]
-    if LanguageClass(problem_type) != LanguageClass(solution_type):
-        StoreGrade(
-            problem_id,
-            0,
-            f"The submitted problem is type {problem_type}, but the solution is type {solution_type}",
-            False,
-        )
-        continue
+        # if the same submitted file was graded with the same solution before,
+        # reuse that result.
+        with TracePhase(grading, "hashing", problem_id):
+            hashes = ProblemHashes(problem_info, solution_info)
+        # if an earlier run of the grader on this submission already graded
+        # this problem (see 'checkpoint_file'), keep that result.
+        checkpointed = grading["checkpoint"].pop(problem_id, None)
+        if checkpointed is not None and checkpointed["hashes"] == hashes:
+            grades[problem_id] = checkpointed["grade"]
+            grading["checkpoint"][problem_id] = checkpointed
+            continue
+
+        previous = previous_info.get(problem_id, {}).get("hashed-results", {})
+        key = f"{hashes['submission-hash']} {hashes['solution-hash']}"
+        if reuse_results and key in previous:
+            StoreGrade(
+                grading,
+                problem_id,
+                previous[key]["score"],
+                previous[key]["output"],
+                False,
+            )
+            continue
+
+        # grade the problem based on what type it is.
+        if LanguageClass(problem_type) == "regular":
+            grader = GradeRegular
+        elif LanguageClass(problem_type) == "context-free":
+            grader = GradeContextFree
+        else:  # must be unrestricted.
+            grader = GradeUnrestricted
+        estimate = EstimateGradingTime(grading, problem_id, problem_type)
+        to_grade.append((estimate, grader, problem_info, solution_info, hashes))
+
+    # grade the problems, cheapest first ('problem_pool' starts them in the
+    # order they are submitted). sorting is stable, so problems with the same
+    # estimate are graded in submission order.
+    to_grade.sort(key=lambda problem: problem[0])
+    grading_futures = {
+        problem_pool.submit(
+            GradeWithinBudget, grading, grader, problem_info, solution_info, hashes
+        ): (problem_info["id"], hashes)
+        for _, grader, problem_info, solution_info, hashes in to_grade
+    }
+
+    # wait for all the problems to be graded (this re-raises any error that
+    # happened while grading), recording each one as it finishes (see
+    # 'checkpoint_file').
+    pending = {problem_id for problem_id, _ in grading_futures.values()}
+    for future in as_completed(grading_futures):
+        problem_id, hashes = grading_futures[future]
+        if future.result():
+            grading["checkpoint"][problem_id] = {
+                "hashes": hashes,
+                "grade": grades[problem_id],
+            }
+        pending.discard(problem_id)
+        WriteProgress(grading, grading_order, pending)
+    problem_pool.shutdown()
+
+    # put 'grades' back into submission order, so that the results are exactly
+    # the same as if the problems had been graded one at a time.
+    for problem_id in grading_order:
+        grades[problem_id] = grades.pop(problem_id)
 
-    # grade the problem based on what type it is.
-    if LanguageClass(problem_type) == "regular":
-        GradeRegular(problem_info, solution_info)
-    elif LanguageClass(problem_type) == "context-free":
-        GradeContextFree(problem_info, solution_info)
-    else:  # must be unrestricted.
-        GradeUnrestricted(problem_info, solution_info)
 
 # if there are any problems that were previously graded but not submitted this
 # time, give them their previous scores.
-for problem_id in previous_info:
-    if not problem_id in grades:
+def StoreNotSubmitted(grading: Dict[str, Any]) -> None:
+    previous_info = grading["previous-info"]
+    for problem_id in previous_info:
+        if not problem_id in grading["grades"]:
+            StoreGrade(
+                grading,
+                problem_id,
+                previous_info[problem_id]["previous-score"],
+                f"Problem not submitted, using previous score: {previous_info[problem_id]['previous-score']}",
+                False,
+            )
+
+
+# return the key of the checkpoint (see 'checkpoint_file') for the given
+# grading: a hash of the mentor executable and the settings that change what
+# feedback is given, as in VerdictKey().
+def CheckpointKey(grading: Dict[str, Any]) -> str:
+    return MemoKey(
+        "checkpoint",
+        FileDigest(grading["mentor"]),
+        [verify_candidates, feedback_words, max_output_bytes],
+    )
+
+
+# read the checkpoint in 'checkpoint_file' into 'checkpoint' in 'grading', if
+# there is one for the same key (see CheckpointKey()).
+def ReadCheckpoint(grading: Dict[str, Any], checkpoint_file: str) -> None:
+    try:
+        with open(checkpoint_file, "r") as handle:
+            checkpoint = json.loads(handle.read())
+    except (OSError, ValueError):
+        return
+    if checkpoint.get("key") == CheckpointKey(grading):
+        grading["checkpoint"] = checkpoint["problems"]
+
+
+# write the given text to the file at 'path', replacing it all at once, so that
+# whoever reads the file (or a grader that is stopped while writing it) never
+# sees a partly written file.
+def WriteFileAtomically(path: str, text: str) -> None:
+    handle = tempfile.NamedTemporaryFile(
+        "w", dir=os.path.dirname(path) or ".", prefix=".tmp-", delete=False
+    )
+    try:
+        with handle:
+            handle.write(text)
+        os.replace(handle.name, path)
+    except BaseException:
+        os.unlink(handle.name)
+        raise
+
+
+# record the progress of grading (see 'checkpoint_file'): write the checkpoint
+# of the finished problems, and the results so far, with the problems that are
+# still 'pending' (by problem id) keeping their previous scores for now.
+# 'grading_order' is the order of the submitted problems, see GradeProblems().
+def WriteProgress(grading: Dict[str, Any], grading_order: List[str], pending) -> None:
+    if grading["checkpoint-file"] is not None:
+        checkpoint = {"key": CheckpointKey(grading), "problems": grading["checkpoint"]}
+        WriteFileAtomically(grading["checkpoint-file"], json.dumps(checkpoint))
+    if grading["results-file"] is None:
+        return
+    # the results of problems that are still being graded can change at any
+    # time, so the results are written from copies of 'grades' and 'timings'
+    # without them.
+    progress = dict(grading, grades={})
+    with grading["trace-lock"]:
+        progress["timings"] = {
+            problem_id: dict(timing)
+            for problem_id, timing in grading["timings"].items()
+            if problem_id not in pending
+        }
+    for problem_id in grading_order:
+        if problem_id in progress["grades"]:
+            continue
+        if problem_id not in pending:
+            progress["grades"][problem_id] = grading["grades"][problem_id]
+            continue
+        score = grading["previous-info"].get(problem_id, {}).get("previous-score", 0)
         StoreGrade(
+            progress,
             problem_id,
-            previous_info[problem_id]["previous-score"],
-            f"Problem not submitted, using previous score: {previous_info[problem_id]['previous-score']}",
+            score,
+            f"Not graded yet. Using previous score: {score}",
             False,
         )
+    StoreNotSubmitted(progress)
+    WriteResults(GetResults(progress), grading["results-file"])
+
+
+# return the results of grading in the format of 'results_file'.
+def GetResults(grading: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    grades = grading["grades"]
+
+    # the datastructure to be written out to 'results_file'.
+    results: Dict[str, List[Dict[str, Any]]] = {"tests": []}
+
+    # fill in 'results' from 'grades'.
+    for problem_id in grades:
+        results["tests"].append(
+            {
+                "name": problem_id,
+                "score": grades[problem_id]["score"],
+                "output": grades[problem_id]["output"],
+                "extra_data": {"graded": grades[problem_id]["graded"]},
+            }
+        )
+        for key in ["grading-time", "submission-hash", "solution-hash"]:
+            if key in grades[problem_id]:
+                results["tests"][-1]["extra_data"][key] = grades[problem_id][key]
+        if trace_results and problem_id in grading["timings"]:
+            results["tests"][-1]["extra_data"]["timing"] = grading["timings"][
+                problem_id
+            ]
+    return results
+
+
+# grade a submission: the submitted files in 'submission_dir' against the
+# solutions in 'solution_dir' (see 'student_submission_dir' and 'solution_dir'),
+# taking into account the previous submissions in 'metadata_file' (see
+# 'submission_metadata_file'), or assuming that there aren't any if it is None.
+# 'solution_wordlists' are any pre-generated solution wordlists and 'manifest'
+# is a manifest of the solutions in memory, see NewGrading(). the submitted
+# files are converted to unix line endings in place. returns the results in the
+# format of 'results_file'.
+#
+# if 'results_file' and 'checkpoint_file' are given, the results so far and a
+# checkpoint are written to them while grading, and the problems that are
+# already in the checkpoint aren't graded again (see 'checkpoint_file').
+def GradeSubmission(
+    submission_dir: str,
+    solution_dir: str,
+    metadata_file: str,
+    mentor: str,
+    solution_wordlists: Dict[str, Dict[str, Any]] = None,
+    results_file: str = None,
+    checkpoint_file: str = None,
+    manifest: Dict[str, Any] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    grading = NewGrading(
+        submission_dir, solution_dir, mentor, solution_wordlists, manifest
+    )
+    try:
+        submission_dir = grading["submission-dir"]
+        grading["results-file"] = results_file
+        grading["checkpoint-file"] = checkpoint_file
+        if checkpoint_file is not None:
+            ReadCheckpoint(grading, checkpoint_file)
+
+        # the submitted files in 'submission_dir'.
+        submitted_files = [
+            file
+            for file in listdir(submission_dir)
+            if isfile(join(submission_dir, file))
+            and LanguageClass(file.split(".").pop()) != "unknown"
+        ]
 
-# the datastructure to be written out to 'results_file'.
-results: Dict[str, List[Dict[str, Any]]] = {"tests": []}
+        # the submission metadata from 'metadata_file'.
+        metadata = {"previous_submissions": []}
+        if metadata_file is not None:
+            with TracePhase(grading, "metadata"):
+                metadata = ReadSubmissionMetadata(metadata_file)
 
-# fill in 'results' from 'grades'.
-for problem_id in grades:
-    results["tests"].append(
-        {
-            "name": problem_id,
-            "score": grades[problem_id]["score"],
-            "output": grades[problem_id]["output"],
-            "extra_data": {"graded": grades[problem_id]["graded"]},
-        }
-    )
+        if metadata["previous_submissions"]:
+            with TracePhase(grading, "previous-submissions"):
+                ReadPreviousInfo(grading, metadata)
 
-# write out the final results.
-with open(results_file, "w") as out:
-    out.write(json.dumps(results))
+        # read the submitted files, converting dos text format to unix format.
+        with TracePhase(grading, "ingestion"):
+            submission = IngestSubmission(grading, submitted_files)
+
+        GradeProblems(grading, submission)
+
+        StoreNotSubmitted(grading)
+        return GetResults(grading)
+    finally:
+        FinishGrading(grading)
+
+
+# write out the results returned by GradeSubmission() to 'results_file'.
+def WriteResults(results: Dict[str, List[Dict[str, Any]]], results_file: str) -> None:
+    WriteFileAtomically(results_file, json.dumps(results))
+
+
+# when run as a script (by run_autograder, on gradescope), grade the submission
+# using the paths above. the grader can also be imported to grade submissions
+# elsewhere, see regrade.py.
+if __name__ == "__main__":
+    WriteResults(
+        GradeSubmission(
+            student_submission_dir,
+            solution_dir,
+            submission_metadata_file,
+            mentor,
+            results_file=results_file,
+            checkpoint_file=checkpoint_file,
+        ),
+        results_file,
+    )
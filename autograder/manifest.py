@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+# write the manifest of a solutions directory (see 'solution_manifest' in
+# grader.py), which has the solution info and the hash of every solution file,
+# so that the grader can look up a problem's solution without reading any
+# solution files. zip-autograder.sh runs this on solutions/ before zipping the
+# autograder; run it again after changing a solution (the grader ignores the
+# manifest for solutions that changed after it was written, and reads them as
+# usual).
+#
+# usage: ./manifest.py [solutions-dir]
+
+import json
+import os
+import sys
+
+import grader
+
+autograder_dir = os.path.dirname(os.path.abspath(__file__))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        sys.exit("usage: ./manifest.py [solutions-dir]")
+    solution_dir = (
+        sys.argv[1] if len(sys.argv) == 2 else os.path.join(autograder_dir, "solutions")
+    )
+    grading = grader.NewGrading(solution_dir, solution_dir, grader.mentor)
+    try:
+        manifest = grader.BuildSolutionManifest(grading)
+    finally:
+        grader.FinishGrading(grading)
+    grader.WriteFileAtomically(
+        os.path.join(solution_dir, grader.solution_manifest),
+        json.dumps(manifest, indent=1),
+    )
+    print(f"wrote the manifest of {len(manifest['solutions'])} solution files")
@@ -0,0 +1,131 @@
+# an on-disk memo of results that are expensive to compute but are determined by
+# a few inputs (e.g., the output of a mentor command, which only depends on the
+# mentor executable, the command, and the files the command reads). each result
+# is stored in its own file in a memo directory, named after a key that hashes
+# all of its inputs (see MemoKey()), so a result is found again whenever the
+# inputs are the same, no matter where they came from.
+#
+# several processes may use the same memo directory at the same time: results
+# are written to a temporary file that is then renamed into place, so a result
+# is either there in full or not at all, and two processes writing the same
+# result just write the same contents. the directory is kept under a given size
+# by removing the least recently used results (see EvictMemos()).
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import IO, Callable, Dict, Optional
+
+# when a memo directory has grown larger than its size limit, results are
+# removed until it takes up at most this fraction of the limit, so that it is
+# only scanned again after a good number of results were written.
+evict_fraction = 0.9
+
+# the estimated size in bytes of each memo directory written to by this
+# process: its size after it was last scanned (see EvictMemos()), plus the
+# results written since. results written by other processes aren't counted, so
+# the directory can be over its limit by as much as they wrote since.
+estimated_bytes: Dict[str, int] = {}
+estimated_bytes_lock = threading.Lock()
+
+
+# return the sha256 hash of the contents of the given file, as a hex string. the
+# hash is remembered for as long as the file isn't modified.
+def FileDigest(path: str) -> str:
+    stat = os.stat(path)
+    return HashFile(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+# hash the file at 'path', remembering the hash for the given modification
+# time and size (see FileDigest()).
+@functools.lru_cache(maxsize=1024)
+def HashFile(path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# return the memo key for the given inputs, which can be anything that can be
+# converted to JSON (e.g., file digests from FileDigest() rather than the files
+# themselves).
+def MemoKey(*inputs) -> str:
+    return hashlib.sha256(json.dumps(inputs).encode("utf-8")).hexdigest()
+
+
+# return the result stored in 'memo_dir' under 'key', as a binary file open for
+# reading, or None if there isn't one. the result is marked as recently used.
+def OpenMemo(memo_dir: str, key: str) -> Optional[IO[bytes]]:
+    path = os.path.join(memo_dir, key)
+    try:
+        handle = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:  # evicted in the meantime, but 'handle' is fine.
+        pass
+    return handle
+
+
+# store a result in 'memo_dir' under 'key'. 'write' is called with a binary file
+# open for writing and writes the result into it. afterwards, the least
+# recently used results are removed if the directory has grown larger than
+# 'max_bytes' (see 'estimated_bytes'), which doesn't need to look at the
+# directory for every result.
+def WriteMemo(
+    memo_dir: str, key: str, write: Callable[[IO[bytes]], None], max_bytes: int
+) -> None:
+    os.makedirs(memo_dir, exist_ok=True)
+    handle = tempfile.NamedTemporaryFile(dir=memo_dir, prefix=".tmp-", delete=False)
+    try:
+        with handle:
+            write(handle)
+        size = os.path.getsize(handle.name)
+        os.replace(handle.name, os.path.join(memo_dir, key))
+    except BaseException:
+        os.remove(handle.name)
+        raise
+    with estimated_bytes_lock:
+        estimate = estimated_bytes.get(memo_dir)
+        if estimate is not None:
+            estimated_bytes[memo_dir] = estimate = estimate + size
+    if estimate is None or estimate > max_bytes:
+        total = EvictMemos(memo_dir, max_bytes)
+        with estimated_bytes_lock:
+            estimated_bytes[memo_dir] = total
+
+
+# if 'memo_dir' takes up more than 'max_bytes' bytes, remove the least recently
+# used results from it until it takes up at most 'evict_fraction' of that.
+# returns the number of bytes it takes up afterwards.
+def EvictMemos(memo_dir: str, max_bytes: int) -> int:
+    entries = []
+    total = 0
+    with os.scandir(memo_dir) as scan:
+        for entry in scan:
+            # temporary files are still being written by someone.
+            if entry.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return total
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes * evict_fraction:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # someone else evicted it first.
+            pass
+        total -= size
+    return total
@@ -0,0 +1,308 @@
+# reading the submission metadata that gradescope provides (see
+# 'submission_metadata_file' in grader.py) without loading all of it. the
+# metadata includes the full results of every previous submission, with the
+# output shown to the student for every problem, so for a student who submits
+# often it can be large, while the grader only needs a few fields of each
+# result. the file is read a piece at a time by a small incremental json reader,
+# which only keeps those fields, and skips over everything else without
+# decoding it.
+
+import json
+import re
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+# the number of characters read from the file at a time.
+chunk_size = 2**16
+
+# the fields of a previous result's 'extra_data' that the grader uses (see
+# ReadPreviousInfo() in grader.py).
+extra_data_fields = ["graded", "grading-time", "submission-hash", "solution-hash"]
+
+whitespace = re.compile(r"[ \t\n\r]*")
+# the characters of a number, true, false, or null.
+literal = re.compile(r"[-+0-9.eEa-z]*")
+# the text of a string up to its closing quote, and the text inside an object or
+# array up to its next bracket, with any strings in it (see ScanJsonValue()).
+# each stops early at a string or escape that continues in the next chunk.
+string_text = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+container_text = re.compile(r'[^"{}[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}[\]]*)*', re.S)
+
+
+# read the submission metadata in 'metadata_file' and return the parts of it
+# that the grader uses, in the same format (see 'submission_metadata_file' in
+# grader.py):
+#
+# { 'created_at': "<time>",
+#   'previous_submissions': [
+#     { 'submission_time': "<time>",
+#       'results': {
+#         'tests': [
+#           { 'name': "<problem-id>",
+#             'score': <score>,
+#             'extra_data': { ... }, // only the 'extra_data_fields'
+#             'output': "<message to student>" // see below
+#           },
+#           ...
+#         ]
+#       }
+#     },
+#     ...
+#   ]
+# }
+#
+# a result's output is only needed to reuse it for an unchanged problem (see
+# 'reuse_results' in grader.py), where the most recent graded result with the
+# same hashes is reused, so only that result keeps its output.
+def ReadSubmissionMetadata(metadata_file: str) -> Dict[str, Any]:
+    metadata: Dict[str, Any] = {"previous_submissions": []}
+    # the result that keeps its output for each problem and pair of hashes, as
+    # a pair (submission time, result).
+    latest: Dict[Any, Any] = {}
+    with open(metadata_file, "r") as handle:
+        reader = NewJsonReader(handle)
+        for key in JsonObjectKeys(reader):
+            if key == "created_at":
+                metadata["created_at"] = ReadJsonValue(reader)
+            elif key == "previous_submissions" and PeekJson(reader) == "[":
+                for _ in JsonArrayItems(reader):
+                    submission = ReadPreviousSubmission(reader)
+                    KeepLatestOutputs(submission, latest)
+                    metadata["previous_submissions"].append(submission)
+            else:
+                SkipJsonValue(reader)
+    return metadata
+
+
+# read a previous submission from the metadata (see ReadSubmissionMetadata()).
+def ReadPreviousSubmission(reader: Dict[str, Any]) -> Dict[str, Any]:
+    submission: Dict[str, Any] = {"results": {}}
+    for key in JsonObjectKeys(reader):
+        if key == "submission_time":
+            submission["submission_time"] = ReadJsonValue(reader)
+        elif key == "results" and PeekJson(reader) == "{":
+            for results_key in JsonObjectKeys(reader):
+                if results_key == "tests" and PeekJson(reader) == "[":
+                    tests = submission["results"]["tests"] = []
+                    for _ in JsonArrayItems(reader):
+                        tests.append(ReadPreviousTest(reader))
+                else:
+                    SkipJsonValue(reader)
+        else:
+            SkipJsonValue(reader)
+    return submission
+
+
+# read the result of one problem of a previous submission from the metadata,
+# keeping only the fields that the grader uses.
+def ReadPreviousTest(reader: Dict[str, Any]) -> Dict[str, Any]:
+    test: Dict[str, Any] = {"extra_data": {}}
+    if PeekJson(reader) != "{":
+        SkipJsonValue(reader)
+        return test
+    for key in JsonObjectKeys(reader):
+        if key in ["name", "score", "output"]:
+            test[key] = ReadJsonValue(reader)
+        elif key == "extra_data" and PeekJson(reader) == "{":
+            for field in JsonObjectKeys(reader):
+                if field in extra_data_fields:
+                    test["extra_data"][field] = ReadJsonValue(reader)
+                else:
+                    SkipJsonValue(reader)
+        else:
+            SkipJsonValue(reader)
+    return test
+
+
+# drop the outputs of the results in 'submission' that aren't needed (see
+# ReadSubmissionMetadata()), keeping track of the results that keep theirs in
+# 'latest'. submission times are in the same iso format, so comparing them as
+# strings (without the fraction of a second, as in GetTimeFromString() in
+# grader.py) compares them in time.
+def KeepLatestOutputs(submission: Dict[str, Any], latest: Dict[Any, Any]) -> None:
+    time = submission.get("submission_time", "")[:19]
+    for test in submission["results"].get("tests", []):
+        extra_data = test["extra_data"]
+        if "output" not in test:
+            continue
+        if (
+            extra_data.get("graded") != True
+            or "submission-hash" not in extra_data
+            or "solution-hash" not in extra_data
+        ):
+            del test["output"]
+            continue
+        key = (
+            test.get("name"),
+            extra_data["submission-hash"],
+            extra_data["solution-hash"],
+        )
+        if key in latest and latest[key][0] >= time:
+            del test["output"]
+            continue
+        if key in latest:
+            del latest[key][1]["output"]
+        latest[key] = (time, test)
+
+
+# return a new record for reading the json document in the open file 'handle'
+# incrementally, in the format:
+#
+# { 'handle': <file>,
+#   'buffer': "<text>", // text read from the file that may still be needed
+#   'position': <int>, // the position in 'buffer' of the next character
+# }
+#
+# the document is read with the functions below, which read one value at a
+# time (or, for objects and arrays, one key or item at a time), and raise
+# ValueError if the document isn't valid json.
+def NewJsonReader(handle: IO[str]) -> Dict[str, Any]:
+    return {"handle": handle, "buffer": "", "position": 0}
+
+
+# read the next chunk of the file into 'buffer', dropping the text before the
+# current position (which is at most a few characters from the end of 'buffer'
+# whenever this is called, so the text is only copied once). returns False at
+# the end of the file.
+def ReadJsonChunk(reader: Dict[str, Any]) -> bool:
+    chunk = reader["handle"].read(chunk_size)
+    if not chunk:
+        return False
+    reader["buffer"] = reader["buffer"][reader["position"] :] + chunk
+    reader["position"] = 0
+    return True
+
+
+# return the next character that isn't whitespace without reading it, or "" at
+# the end of the file.
+def PeekJson(reader: Dict[str, Any]) -> str:
+    buffer = reader["buffer"]
+    position = reader["position"]
+    if position < len(buffer) and buffer[position] not in " \t\n\r":
+        return buffer[position]
+    while True:
+        position = whitespace.match(reader["buffer"], reader["position"]).end()
+        reader["position"] = position
+        if position < len(reader["buffer"]):
+            return reader["buffer"][position]
+        if not ReadJsonChunk(reader):
+            return ""
+
+
+# read the next character that isn't whitespace, which has to be 'expected'.
+def ExpectJson(reader: Dict[str, Any], expected: str) -> None:
+    found = PeekJson(reader)
+    if found != expected:
+        raise ValueError(f"expected {expected!r} but found {found!r} in json")
+    reader["position"] += 1
+
+
+# read the next value, which is built as with json.loads(). the whole value is
+# kept in memory, so this is meant for values that aren't large. its text is
+# collected while scanning over it (see ScanJsonValue()) and then decoded by the
+# json module.
+def ReadJsonValue(reader: Dict[str, Any]) -> Any:
+    pieces: List[str] = []
+    ScanJsonValue(reader, pieces)
+    return json.loads("".join(pieces))
+
+
+# skip over the next value without decoding it. only where it ends is checked,
+# not whether everything in it is valid json.
+def SkipJsonValue(reader: Dict[str, Any]) -> None:
+    ScanJsonValue(reader, None)
+
+
+# move past the next value, appending its text to 'pieces' unless that is None.
+# only strings and the nesting of objects and arrays are followed, to find where
+# the value ends, and the text in between is passed over by a regex match.
+def ScanJsonValue(reader: Dict[str, Any], pieces: Optional[List[str]]) -> None:
+    first = PeekJson(reader)
+    if first == "":
+        raise ValueError("unexpected end of json")
+    if first not in '"{[-0123456789tfn':
+        raise ValueError(f"unexpected {first!r} in json")
+    buffer = reader["buffer"]
+    # the text of the value before 'start' has been appended to 'pieces'
+    # already, and the text before 'position' has been scanned over.
+    start = reader["position"]
+    position = start + 1
+    in_string = first == '"'
+    depth = 1 if first in "{[" else 0
+    while True:
+        if in_string:
+            position = string_text.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == '"':
+                position += 1
+                in_string = False
+                if depth == 0:
+                    break
+                continue
+        elif depth > 0:
+            position = container_text.match(buffer, position).end()
+            if position < len(buffer):
+                char = buffer[position]
+                position += 1
+                if char == '"':
+                    in_string = True
+                    continue
+                depth += 1 if char in "{[" else -1
+                if depth == 0:
+                    break
+                continue
+        else:
+            # a literal (unlike other values) can't tell where it ends, so it
+            # ends at the first character that can't be part of it, or at the
+            # end of the file.
+            position = literal.match(buffer, position).end()
+            if position < len(buffer):
+                break
+        if pieces is not None:
+            pieces.append(buffer[start:position])
+        reader["position"] = position
+        if not ReadJsonChunk(reader):
+            if in_string or depth > 0:
+                raise ValueError("unexpected end of json")
+            return
+        buffer = reader["buffer"]
+        start = position = 0
+    if pieces is not None:
+        pieces.append(buffer[start:position])
+    reader["position"] = position
+
+
+# read the next value, which has to be an object, one key at a time: yields
+# each key, after which the caller has to read (or skip) its value before
+# getting the next key.
+def JsonObjectKeys(reader: Dict[str, Any]) -> Iterator[str]:
+    ExpectJson(reader, "{")
+    if PeekJson(reader) == "}":
+        reader["position"] += 1
+        return
+    while True:
+        if PeekJson(reader) != '"':
+            raise ValueError("expected a key in json object")
+        key = ReadJsonValue(reader)
+        ExpectJson(reader, ":")
+        yield key
+        if PeekJson(reader) == ",":
+            reader["position"] += 1
+            continue
+        ExpectJson(reader, "}")
+        return
+
+
+# read the next value, which has to be an array, one item at a time: yields
+# (None) before each item, which the caller has to read (or skip) before
+# getting the next one.
+def JsonArrayItems(reader: Dict[str, Any]) -> Iterator[None]:
+    ExpectJson(reader, "[")
+    if PeekJson(reader) == "]":
+        reader["position"] += 1
+        return
+    while True:
+        yield None
+        if PeekJson(reader) == ",":
+            reader["position"] += 1
+            continue
+        ExpectJson(reader, "]")
+        return
@@ -0,0 +1,723 @@
+# quick checks of submitted files for mistakes that make mentor fail, such as
+# syntax errors, transitions to states that don't exist, or symbols that aren't
+# in the alphabet, so that these files are rejected with an error message that
+# points at the line with the mistake, without starting mentor at all (see
+# 'precheck_submissions' in grader.py).
+#
+# the checks read each file type the way mentor does, so that they only report
+# mistakes that mentor would certainly reject the file for. mentor reads most
+# files as a sequence of tokens, ignoring line breaks: a token is either one of
+# a few delimiters (e.g., "{" or "->"), or a run of characters up to whitespace
+# or a delimiter, and some tokens are single characters instead (e.g., the
+# symbols of a tm). comments are skipped between tokens. cfg files are read line
+# by line instead. anything the checks aren't sure about (e.g., whether an nfa
+# that mentions a state without any transitions is valid) is left for mentor to
+# decide.
+
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from canonical import block_comment, comment_patterns, line_comment
+
+# the delimiters and reserved words (which can't be used as names) of each file
+# type that is read as a sequence of tokens.
+automaton_delimiters = ["->", "{", "}", "(", ")", ","]
+delimiters = {
+    "dfa": automaton_delimiters,
+    "nfa": automaton_delimiters,
+    "pda": automaton_delimiters,
+    "tm": automaton_delimiters,
+    "re": automaton_delimiters + ["|", "&", "-", "*", "+", "?", ".", "_"],
+    "htm": ["->", "[[", "]]", "{", "}", "(", ")", ",", "-"],
+}
+reserved_words = {
+    "dfa": ["alphabet:", "start:", "accepting:"],
+    "nfa": ["alphabet:", "start:", "accepting:"],
+    "pda": ["alphabet:", "start:", "accepting:"],
+    "tm": ["alphabet:", "start:", "accepting:"],
+    "re": ["alphabet:"],
+    "htm": ["alphabet:", "start:", "def", "if", "else", "while", "accept", "reject"],
+}
+
+# the comments of each file type that is read as a sequence of tokens, which are
+# skipped between tokens.
+automaton_comments = re.compile(rf"{line_comment}|{block_comment}", re.S)
+comments = {
+    "dfa": automaton_comments,
+    "nfa": automaton_comments,
+    "pda": automaton_comments,
+    "tm": automaton_comments,
+    "re": re.compile(line_comment),
+    "htm": re.compile(line_comment),
+}
+
+# the tape directions of a tm.
+directions = ["L", "R", "S", "H"]
+
+
+# a mistake in a file, at the given line (or None if it isn't about one line).
+class FileMistake(Exception):
+    def __init__(self, line: Optional[int], message: str):
+        super().__init__(message)
+        self.line = line
+        self.message = message
+
+
+# check the given contents of a submitted file of the given type. returns a
+# record:
+#
+# { 'error': "<message>", // the first mistake found, or None if there is none
+#   'alphabet': [<symbol>, ...], // the file's alphabet, or None if it has none
+#                                // or it couldn't be read
+#   'alphabet-line': <int>, // the line of the alphabet (if 'alphabet' is set)
+# }
+#
+# the error message says what is wrong, starting with the line it is on.
+def PrecheckFile(content: str, file_type: str) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"error": None, "alphabet": None}
+    try:
+        if file_type == "cfg":
+            PrecheckGrammar(content)
+        elif file_type in delimiters:
+            tokens = NewTokens(content, file_type)
+            if file_type == "re":
+                result["alphabet"] = PrecheckRegex(tokens)
+            elif file_type == "htm":
+                result["alphabet"] = PrecheckHtm(tokens)
+            else:
+                result["alphabet"] = PrecheckAutomaton(tokens, file_type)
+            result["alphabet-line"] = tokens["alphabet-line"]
+    except FileMistake as mistake:
+        result["error"] = MistakeMessage(mistake)
+    return result
+
+
+# return the message for the given mistake.
+def MistakeMessage(mistake: FileMistake) -> str:
+    if mistake.line is None:
+        return f"Error: {mistake.message}.\n"
+    return f"Error on line {mistake.line}: {mistake.message}.\n"
+
+
+# return a new record for reading the given contents of a file of the given type
+# as a sequence of tokens, in the format:
+#
+# { 'content': "<file contents>",
+#   'position': <int>, // the position of the next character to read
+#   'delimiters': [<delimiter>, ...], // longest first
+#   'reserved': {<word>, ...},
+#   'comment': <compiled pattern>, // a comment, see SkipSpace()
+#   'line': <int>, // the line number at 'line-position', see CurrentLine()
+#   'line-position': <int>,
+#   'alphabet-line': <int>, // the line of the alphabet, once it has been read
+# }
+def NewTokens(content: str, file_type: str) -> Dict[str, Any]:
+    return {
+        "content": content,
+        "position": 0,
+        "line": 1,
+        "line-position": 0,
+        "delimiters": sorted(delimiters[file_type], key=len, reverse=True),
+        "reserved": set(reserved_words[file_type]),
+        "comment": comments[file_type],
+    }
+
+
+# skip the whitespace and comments before the next token.
+def SkipSpace(tokens: Dict[str, Any]) -> None:
+    content = tokens["content"]
+    while True:
+        position = tokens["position"]
+        while position < len(content) and content[position].isspace():
+            position += 1
+        tokens["position"] = position
+        comment = tokens["comment"].match(content, position)
+        if not comment or comment.end() == position:
+            return
+        tokens["position"] = comment.end()
+
+
+# return the line number of the next token. the line number is kept up to date
+# by counting only the line breaks since the last time it was asked for, so
+# asking for it for every token doesn't take quadratic time.
+def CurrentLine(tokens: Dict[str, Any]) -> int:
+    SkipSpace(tokens)
+    content, position = tokens["content"], tokens["position"]
+    if position >= tokens["line-position"]:
+        tokens["line"] += content.count("\n", tokens["line-position"], position)
+    else:
+        tokens["line"] -= content.count("\n", position, tokens["line-position"])
+    tokens["line-position"] = position
+    return tokens["line"]
+
+
+# return the next token without reading it, or "" at the end of the file.
+def PeekToken(tokens: Dict[str, Any]) -> str:
+    SkipSpace(tokens)
+    return TokenAt(tokens, tokens["position"])
+
+
+# return the token starting at 'position' (without skipping anything).
+def TokenAt(tokens: Dict[str, Any], position: int) -> str:
+    content = tokens["content"]
+    for delimiter in tokens["delimiters"]:
+        if content.startswith(delimiter, position):
+            return delimiter
+    end = position
+    while end < len(content) and not content[end].isspace():
+        if any(content.startswith(d, end) for d in tokens["delimiters"]):
+            break
+        end += 1
+    return content[position:end]
+
+
+# read the next token, or "" at the end of the file.
+def ReadToken(tokens: Dict[str, Any]) -> str:
+    token = PeekToken(tokens)
+    tokens["position"] += len(token)
+    return token
+
+
+# read the next token, which has to be 'expected'.
+def ExpectToken(tokens: Dict[str, Any], expected: str) -> None:
+    line = CurrentLine(tokens)
+    token = ReadToken(tokens)
+    if token != expected:
+        raise FileMistake(line, f"expected '{expected}' but {Found(token)}")
+
+
+# read the next token as a name (of a state, symbol, or function), which can be
+# anything but a delimiter or, unless 'allow_reserved', a reserved word. 'what'
+# says what kind of name it is, for error messages.
+def ReadName(tokens: Dict[str, Any], what: str, allow_reserved=False) -> str:
+    line = CurrentLine(tokens)
+    token = ReadToken(tokens)
+    if (
+        token == ""
+        or token in tokens["delimiters"]
+        or (token in tokens["reserved"] and not allow_reserved)
+    ):
+        raise FileMistake(line, f"expected {what} but {Found(token)}")
+    return token
+
+
+# read the next single character as a symbol, which can be anything but a
+# delimiter or reserved word.
+def ReadCharacter(tokens: Dict[str, Any], what: str) -> str:
+    line = CurrentLine(tokens)
+    content = tokens["content"]
+    position = tokens["position"]
+    if position == len(content):
+        raise FileMistake(line, f"expected {what} but the file ended")
+    character = content[position]
+    if character in tokens["delimiters"] or character in tokens["reserved"]:
+        raise FileMistake(line, f"expected {what} but found '{character}'")
+    tokens["position"] += 1
+    return character
+
+
+# describe the token that was found instead of the expected one.
+def Found(token: str) -> str:
+    if token == "":
+        return "the file ended"
+    return f"found '{token}'"
+
+
+# read a set of symbols or names ("{a, b, ...}"), using 'read' to read each one.
+def ReadSet(tokens: Dict[str, Any], read, allow_empty=False) -> List[str]:
+    ExpectToken(tokens, "{")
+    elements = []
+    if not (allow_empty and PeekToken(tokens) == "}"):
+        elements.append(read())
+        while PeekToken(tokens) == ",":
+            ReadToken(tokens)
+            elements.append(read())
+    ExpectToken(tokens, "}")
+    return elements
+
+
+# check a dfa, nfa, pda, or tm, and return its alphabet.
+def PrecheckAutomaton(tokens: Dict[str, Any], file_type: str) -> List[str]:
+    # dfa and nfa symbols are names; pda and tm symbols are single characters.
+    if file_type in ["dfa", "nfa"]:
+        read_symbol = lambda: ReadName(tokens, "a symbol")
+    else:
+        read_symbol = lambda: ReadCharacter(tokens, "a symbol")
+    read_state = lambda: ReadName(tokens, "a state")
+
+    ExpectToken(tokens, "alphabet:")
+    tokens["alphabet-line"] = CurrentLine(tokens)
+    alphabet = ReadSet(tokens, read_symbol)
+    if file_type in ["pda", "tm"] and ("_" in alphabet or "." in alphabet):
+        raise FileMistake(
+            tokens["alphabet-line"], "the alphabet can't contain '_' or '.'"
+        )
+    ExpectToken(tokens, "start:")
+    start = read_state()
+    if file_type != "tm":
+        ExpectToken(tokens, "accepting:")
+        ReadSet(tokens, read_state, allow_empty=True)
+
+    # the transitions of each state, as a list of records { 'line': <int>,
+    # 'reads': [<symbol>, ...], 'write': <symbol>, 'direction': <direction>,
+    # 'destination': <state> } (with 'write' and 'direction' only for a tm).
+    # a state can be given without any transitions, or on several lines.
+    transitions: Dict[str, List[Dict[str, Any]]] = {}
+    while PeekToken(tokens) != "":
+        state = read_state()
+        transitions.setdefault(state, [])
+        while PeekToken(tokens) == "(":
+            transitions[state].append(ReadTransition(tokens, file_type, read_symbol))
+
+    CheckTransitions(file_type, alphabet, start, transitions)
+    return alphabet
+
+
+# read one transition of an automaton of the given type (see
+# PrecheckAutomaton()).
+def ReadTransition(tokens: Dict[str, Any], file_type: str, read_symbol):
+    ExpectToken(tokens, "(")
+    transition: Dict[str, Any] = {"line": CurrentLine(tokens)}
+    if PeekToken(tokens) == "{":
+        transition["reads"] = ReadSet(tokens, read_symbol)
+    else:
+        transition["reads"] = [read_symbol()]
+    if file_type == "pda":
+        ExpectToken(tokens, ",")
+        ReadCharacter(tokens, "a stack symbol")
+        ExpectToken(tokens, "->")
+        ReadName(tokens, "the symbols to push")
+        ExpectToken(tokens, ",")
+    else:
+        ExpectToken(tokens, "->")
+    if file_type == "tm":
+        transition["write"] = read_symbol()
+        ExpectToken(tokens, ",")
+        transition["direction"] = ReadCharacter(tokens, "a tape direction")
+    transition["destination"] = ReadName(tokens, "a state", allow_reserved=True)
+    ExpectToken(tokens, ")")
+    return transition
+
+
+# check the transitions of an automaton (see PrecheckAutomaton()) the way mentor
+# does once it has read them.
+def CheckTransitions(file_type, alphabet, start, transitions) -> None:
+    symbols = set(alphabet)
+    for state, state_transitions in transitions.items():
+        reads: Set[str] = set()
+        for transition in state_transitions:
+            line = transition["line"]
+            expanded = []
+            for symbol in transition["reads"]:
+                if symbol == ".":
+                    # for a tm, '.' also reads the blank.
+                    expanded += alphabet + (["_"] if file_type == "tm" else [])
+                    continue
+                expanded.append(symbol)
+                if symbol in symbols or (symbol == "_" and file_type != "dfa"):
+                    continue
+                if file_type != "dfa":
+                    raise FileMistake(line, f"'{symbol}' is not in the alphabet")
+
+            if file_type in ["dfa", "tm"]:
+                for symbol in expanded:
+                    if symbol in reads:
+                        raise FileMistake(
+                            line,
+                            f"state {state} has more than one transition for {symbol}",
+                        )
+                    reads.add(symbol)
+
+            if file_type == "tm":
+                write = transition["write"]
+                if write not in symbols and write not in ["_", "."]:
+                    raise FileMistake(line, f"'{write}' is not in the alphabet")
+                if transition["direction"] not in directions:
+                    raise FileMistake(
+                        line,
+                        f"'{transition['direction']}' is not a tape direction "
+                        "(L, R, S, or H)",
+                    )
+                if state in ["accept", "reject"]:
+                    raise FileMistake(line, f"the {state} state can't have transitions")
+
+    # every state of a dfa that can be reached from the start state needs
+    # exactly one transition for each symbol of the alphabet.
+    if file_type == "dfa":
+        reached = [start]
+        seen = {start}  # the states in 'reached', for looking them up quickly.
+        for state in reached:  # 'reached' grows as new states are reached.
+            if not transitions.get(state):
+                raise FileMistake(None, f"state {state} doesn't have any transitions")
+            line = transitions[state][0]["line"]
+            reads = {s for t in transitions[state] for s in t["reads"]}
+            if "." in reads:
+                reads = (reads - {"."}) | symbols
+            if reads - symbols:
+                extra = ", ".join(sorted(reads - symbols))
+                raise FileMistake(
+                    line, f"state {state} reads {extra}, which isn't in the alphabet"
+                )
+            if symbols - reads:
+                missing = ", ".join(sorted(symbols - reads))
+                raise FileMistake(
+                    line, f"state {state} doesn't have a transition for {missing}"
+                )
+            for transition in transitions[state]:
+                if transition["destination"] not in seen:
+                    seen.add(transition["destination"])
+                    reached.append(transition["destination"])
+
+
+# check a regular expression, and return its alphabet. the expression is read
+# one character at a time:
+#
+# expression -> term (('|' | '&') term)*
+# term -> factor factor*
+# factor -> '-'? atom ('*' | '+' | '?')?
+# atom -> <symbol> | '_' | '.' | '(' expression ')'
+#
+# mentor stops reading at the end of the expression, so anything after it
+# (e.g., an unmatched ')') is ignored.
+def PrecheckRegex(tokens: Dict[str, Any]) -> List[str]:
+    ExpectToken(tokens, "alphabet:")
+    tokens["alphabet-line"] = CurrentLine(tokens)
+    alphabet = ReadSet(tokens, lambda: ReadCharacter(tokens, "a symbol"))
+    ReadRegex(tokens, set(alphabet))
+    return alphabet
+
+
+# read an expression (see PrecheckRegex()).
+def ReadRegex(tokens: Dict[str, Any], alphabet: Set[str]) -> None:
+    ReadRegexTerm(tokens, alphabet)
+    while PeekCharacter(tokens) in ["|", "&"]:
+        tokens["position"] += 1
+        ReadRegexTerm(tokens, alphabet)
+
+
+# read a term (see PrecheckRegex()).
+def ReadRegexTerm(tokens: Dict[str, Any], alphabet: Set[str]) -> None:
+    ReadRegexFactor(tokens, alphabet)
+    while PeekCharacter(tokens) not in ["", ")", "|", "&"]:
+        ReadRegexFactor(tokens, alphabet)
+
+
+# read a factor (see PrecheckRegex()).
+def ReadRegexFactor(tokens: Dict[str, Any], alphabet: Set[str]) -> None:
+    if PeekCharacter(tokens) == "-":
+        tokens["position"] += 1
+    character = PeekCharacter(tokens)
+    if character == "(":
+        tokens["position"] += 1
+        ReadRegex(tokens, alphabet)
+        ExpectToken(tokens, ")")
+    elif character in ["_", "."]:
+        tokens["position"] += 1
+    else:
+        line = CurrentLine(tokens)
+        symbol = ReadCharacter(tokens, "a symbol")
+        if symbol not in alphabet:
+            raise FileMistake(line, f"'{symbol}' is not in the alphabet")
+    if PeekCharacter(tokens) in ["*", "+", "?"]:
+        tokens["position"] += 1
+
+
+# return the next character (after whitespace and comments) without reading it,
+# or "" at the end of the file.
+def PeekCharacter(tokens: Dict[str, Any]) -> str:
+    SkipSpace(tokens)
+    return tokens["content"][tokens["position"] : tokens["position"] + 1]
+
+
+# check a cfg. mentor reads a cfg one line at a time: every line that isn't
+# empty (after removing // comments) is a rule "<nonterminal> -> <rhs> | ...",
+# where no alternative but the last may be empty.
+def PrecheckGrammar(content: str) -> None:
+    content = comment_patterns["cfg"].sub("", content)
+    rules = 0
+    for number, line in enumerate(content.split("\n"), 1):
+        if not line.strip():
+            continue
+        match = re.match(r"[ \t]*(\S+?)[ \t]*->", line)
+        if not match or match.group(1).startswith("->"):
+            first = line.split()[0]
+            if first.startswith("->"):
+                raise FileMistake(number, "expected a nonterminal but found '->'")
+            raise FileMistake(number, f"expected '->' after '{first}'")
+        rhs = line[match.end() :]
+        if "->" in rhs:
+            raise FileMistake(number, "found a second '->' in the same rule")
+        alternatives = rhs.split("|")
+        if any(not alternative.strip() for alternative in alternatives[:-1]):
+            raise FileMistake(
+                number, f"empty alternative for {match.group(1)} (use _ for ε)"
+            )
+        rules += 1
+    if rules == 0:
+        raise FileMistake(None, "the grammar doesn't have any rules")
+
+
+# check an htm, and return its alphabet (which always includes the blank '_').
+# besides reading it, this checks that the functions it defines and calls fit
+# together the way mentor requires.
+def PrecheckHtm(tokens: Dict[str, Any]) -> List[str]:
+    ExpectToken(tokens, "alphabet:")
+    tokens["alphabet-line"] = CurrentLine(tokens)
+    alphabet = ReadSet(tokens, lambda: ReadCharacter(tokens, "a symbol"))
+    if "_" in alphabet or "." in alphabet:
+        raise FileMistake(
+            tokens["alphabet-line"], "the alphabet can't contain '_' or '.'"
+        )
+    symbols = set(alphabet) | {"_"}
+
+    # the functions by name, as records { 'line': <int>, 'parameters': [<name>,
+    # ...], 'calls': [<call>, ...], 'transitions': <transitions> (for a function
+    # that is a tm), 'start': <state> (likewise) }, where each call is a record
+    # { 'line': <int>, 'function': <name>, 'arguments': [<argument>, ...] } and
+    # each argument is a parameter ("$<name>") or a list of symbols.
+    functions: Dict[str, Dict[str, Any]] = {}
+    while PeekToken(tokens) != "":
+        ExpectToken(tokens, "def")
+        line = CurrentLine(tokens)
+        name = ReadName(tokens, "a function name")
+        if name in functions:
+            raise FileMistake(line, f"there is already a function named {name}")
+        function: Dict[str, Any] = {"line": line, "parameters": [], "calls": []}
+        functions[name] = function
+        if PeekToken(tokens) == "(":
+            ReadToken(tokens)
+            function["parameters"].append(ReadName(tokens, "a parameter"))
+            while PeekToken(tokens) == ",":
+                ReadToken(tokens)
+                line = CurrentLine(tokens)
+                parameter = ReadName(tokens, "a parameter")
+                if parameter in function["parameters"]:
+                    raise FileMistake(
+                        line, f"{name} already has a parameter {parameter}"
+                    )
+                function["parameters"].append(parameter)
+            ExpectToken(tokens, ")")
+        if PeekToken(tokens) == "[[":
+            ReadToken(tokens)
+            ReadHtmMachine(tokens, function, symbols)
+            ExpectToken(tokens, "]]")
+        else:
+            ExpectToken(tokens, "{")
+            ReadHtmStatements(tokens, function, symbols)
+
+    if "Main" not in functions:
+        raise FileMistake(None, "there is no Main function")
+    if functions["Main"]["parameters"]:
+        raise FileMistake(functions["Main"]["line"], "Main can't have parameters")
+    for name, function in functions.items():
+        for call in function["calls"]:
+            if call["function"] not in functions:
+                raise FileMistake(
+                    call["line"], f"there is no function named {call['function']}"
+                )
+    CheckHtmRecursion(functions)
+
+    # mentor only builds the functions that Main (indirectly) calls, so that's
+    # where the arguments of calls and the transitions of tms are checked.
+    used = ["Main"]
+    for name in used:  # 'used' grows as new functions are found.
+        function = functions[name]
+        for call in function["calls"]:
+            callee = functions[call["function"]]
+            if len(call["arguments"]) != len(callee["parameters"]):
+                raise FileMistake(
+                    call["line"],
+                    f"{call['function']} takes {len(callee['parameters'])} "
+                    f"arguments, not {len(call['arguments'])}",
+                )
+            for argument in call["arguments"]:
+                if (
+                    isinstance(argument, str)
+                    and argument[1:] not in function["parameters"]
+                ):
+                    raise FileMistake(
+                        call["line"], f"{name} doesn't have a parameter {argument[1:]}"
+                    )
+            if call["function"] not in used:
+                used.append(call["function"])
+        if "transitions" in function:
+            CheckHtmMachine(function, symbols)
+    return alphabet + ["_"]
+
+
+# read the statements of an htm function up to its closing '}' (see
+# PrecheckHtm()), adding the calls to 'function'.
+def ReadHtmStatements(tokens: Dict[str, Any], function, symbols) -> None:
+    line = CurrentLine(tokens)
+    if PeekToken(tokens) == "}":
+        raise FileMistake(line, "expected a statement but found '}'")
+    while PeekToken(tokens) != "}":
+        ReadHtmStatement(tokens, function, symbols)
+    ReadToken(tokens)
+
+
+# read a single htm statement (see PrecheckHtm()):
+#
+# statement -> 'accept' | 'reject' | call
+#            | 'if' 'not'? call block ('else' block)? | 'while' 'not'? call block
+# block -> statement | '{' statement+ '}'
+def ReadHtmStatement(tokens: Dict[str, Any], function, symbols) -> None:
+    token = PeekToken(tokens)
+    if token in ["accept", "reject"]:
+        ReadToken(tokens)
+        return
+    if token not in ["if", "while"]:
+        ReadHtmCall(tokens, function, symbols)
+        return
+    ReadToken(tokens)
+    if PeekToken(tokens) == "not":
+        ReadToken(tokens)
+    ReadHtmCall(tokens, function, symbols)
+    ReadHtmBlock(tokens, function, symbols)
+    if token == "if" and PeekToken(tokens) == "else":
+        ReadToken(tokens)
+        ReadHtmBlock(tokens, function, symbols)
+
+
+# read a block of htm statements (see ReadHtmStatement()).
+def ReadHtmBlock(tokens: Dict[str, Any], function, symbols) -> None:
+    if PeekToken(tokens) == "{":
+        ReadToken(tokens)
+        ReadHtmStatements(tokens, function, symbols)
+    else:
+        ReadHtmStatement(tokens, function, symbols)
+
+
+# read an htm function call, with its arguments if it has any, and add it to
+# 'function'. each argument is a parameter ("$<name>"), a symbol, or a set or
+# the complement of a set of symbols ("{a, b}" or "-{a, b}").
+def ReadHtmCall(tokens: Dict[str, Any], function, symbols) -> None:
+    line = CurrentLine(tokens)
+    call = {"line": line, "function": ReadName(tokens, "a statement"), "arguments": []}
+    function["calls"].append(call)
+    if PeekToken(tokens) != "(":
+        return
+    ReadToken(tokens)
+    while True:
+        line = CurrentLine(tokens)
+        if PeekCharacter(tokens) == "$":
+            tokens["position"] += 1
+            parameter = ReadName(tokens, "a parameter")
+            call["arguments"].append("$" + parameter)
+        else:
+            if PeekToken(tokens) == "-":
+                ReadToken(tokens)
+            if PeekToken(tokens) == "{":
+                read = lambda: ReadCharacter(tokens, "a symbol")
+                argument = ReadSet(tokens, read)
+            else:
+                argument = [ReadCharacter(tokens, "a symbol")]
+                if PeekToken(tokens) not in [",", ")"]:
+                    raise FileMistake(line, "each argument has to be a single symbol")
+            for symbol in argument:
+                if symbol not in symbols:
+                    raise FileMistake(line, f"'{symbol}' is not in the alphabet")
+            call["arguments"].append(argument)
+        if PeekToken(tokens) != ",":
+            break
+        ReadToken(tokens)
+    ExpectToken(tokens, ")")
+
+
+# read the tm of an htm function (between '[[' and ']]'), which is written like
+# a tm file without an alphabet, and whose symbols may also be the function's
+# parameters ("$<name>").
+def ReadHtmMachine(tokens: Dict[str, Any], function, symbols) -> None:
+    parameters = function["parameters"]
+
+    def ReadSymbol():
+        # a '$' right before the name of a parameter is that parameter;
+        # otherwise it is just a symbol.
+        position = tokens["position"]
+        if PeekCharacter(tokens) == "$":
+            name = TokenAt(tokens, tokens["position"] + 1)
+            if name in parameters:
+                tokens["position"] += 1 + len(name)
+                return "$" + name
+        tokens["position"] = position
+        return ReadCharacter(tokens, "a symbol")
+
+    # '-' is only a delimiter outside of the tm.
+    htm_delimiters = tokens["delimiters"]
+    tokens["delimiters"] = [d for d in htm_delimiters if d != "-"]
+
+    ExpectToken(tokens, "start:")
+    function["start"] = ReadName(tokens, "a state", allow_reserved=True)
+    function["transitions"] = transitions = {}
+    while PeekToken(tokens) not in ["]]", ""]:
+        state = ReadName(tokens, "a state", allow_reserved=True)
+        transitions.setdefault(state, [])
+        while PeekToken(tokens) == "(":
+            ExpectToken(tokens, "(")
+            transition: Dict[str, Any] = {"line": CurrentLine(tokens)}
+            if PeekToken(tokens) == "{":
+                transition["reads"] = ReadSet(
+                    tokens, lambda: ReadCharacter(tokens, "a symbol")
+                )
+            else:
+                transition["reads"] = [ReadSymbol()]
+            ExpectToken(tokens, "->")
+            transition["write"] = ReadSymbol()
+            ExpectToken(tokens, ",")
+            transition["direction"] = ReadCharacter(tokens, "a tape direction")
+            transition["destination"] = ReadName(tokens, "a state", allow_reserved=True)
+            ExpectToken(tokens, ")")
+            transitions[state].append(transition)
+    tokens["delimiters"] = htm_delimiters
+
+
+# check the tm of an htm function (see ReadHtmMachine()) the way mentor checks a
+# tm, except that transitions that use parameters may overlap with others.
+def CheckHtmMachine(function, symbols) -> None:
+    for state, state_transitions in function["transitions"].items():
+        reads: Set[str] = set()
+        for transition in state_transitions:
+            line = transition["line"]
+            expanded = []
+            for symbol in transition["reads"] + [transition["write"]]:
+                if symbol not in symbols and symbol != "." and symbol[0] != "$":
+                    raise FileMistake(line, f"'{symbol}' is not in the alphabet")
+            for symbol in transition["reads"]:
+                if symbol == ".":
+                    expanded += sorted(symbols)
+                elif symbol[0] != "$":
+                    expanded.append(symbol)
+            for symbol in expanded:
+                if symbol in reads:
+                    raise FileMistake(
+                        line, f"state {state} has more than one transition for {symbol}"
+                    )
+                reads.add(symbol)
+            if transition["direction"] not in directions:
+                raise FileMistake(
+                    line,
+                    f"'{transition['direction']}' is not a tape direction "
+                    "(L, R, S, or H)",
+                )
+            if state in ["accept", "reject"]:
+                raise FileMistake(line, f"the {state} state can't have transitions")
+
+
+# raise a mistake if any htm function (indirectly) calls itself.
+def CheckHtmRecursion(functions: Dict[str, Dict[str, Any]]) -> None:
+    # depth-first search for a cycle of calls, keeping the functions on the
+    # current path in 'path' and the ones that are known not to be on a cycle in
+    # 'done'.
+    done: Set[str] = set()
+
+    def Visit(name: str, path: List[str]) -> None:
+        if name in done:
+            return
+        if name in path:
+            raise FileMistake(functions[name]["line"], f"{name} calls itself")
+        for call in functions[name]["calls"]:
+            Visit(call["function"], path + [name])
+        done.add(name)
+
+    for name in functions:
+        Visit(name, [])
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+# generate the wordlists of the context-free solutions in a solutions directory
+# that don't come with one (see format (3) of 'solution_dir' in grader.py), so
+# that the grader doesn't have to run the solution's gen_words for every
+# submission. zip-autograder.sh runs this on solutions/ before zipping the
+# autograder.
+#
+# the wordlists are generated in parallel, one mentor command per core, and are
+# named '<problem-id>.{cfg, pda}.wordlist'. every wordlist that was generated is
+# recorded in the solutions directory (see ReadPrecomputeRecord() in grader.py)
+# as soon as it is done, so an interrupted run can just be started again: it
+# only generates the wordlists that are missing, and regenerates those whose
+# solution, <num-words>, or mentor executable changed since they were generated
+# (or that were changed themselves). the grader compares <num-words> words of a
+# submission against a generated wordlist even if it has fewer (as the
+# solution's language may be finite). wordlists that weren't generated here
+# (i.e., written by hand) are never changed, but a warning is printed if one
+# doesn't have the number of words its solution file names.
+#
+# usage: ./precompute.py [solutions-dir] [--mentor PATH] [--jobs N] [--binary]
+#        (see ./precompute.py --help)
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict
+
+import grader
+from memo import FileDigest
+from wordlist import ConvertWordlistFile, CountWordlistFileWords
+
+autograder_dir = os.path.dirname(os.path.abspath(__file__))
+
+# the suffix of the wordlists that are being generated.
+partial_suffix = ".partial"
+
+
+# return the path of the record of the wordlists generated in 'solution_dir'.
+def RecordFile(solution_dir: str) -> str:
+    return os.path.join(solution_dir, grader.solution_precompute_record)
+
+
+# replace the record of the wordlists generated in 'solution_dir'.
+def WriteRecord(solution_dir: str, record: Dict[str, Any]) -> None:
+    grader.WriteFileAtomically(
+        RecordFile(solution_dir), json.dumps(record, indent=1, sort_keys=True)
+    )
+
+
+# return whether the wordlist recorded in 'entry' (see ReadPrecomputeRecord() in
+# grader.py) is still up to date for the given solution and the mentor
+# executable of 'grading' (see IsPrecomputeCurrent() in grader.py), and wasn't
+# changed since it was generated.
+def IsUpToDate(grading: Dict[str, Any], entry: Dict[str, Any], solution_info) -> bool:
+    wordlist_file = solution_info.get("wordlist-file")
+    return (
+        wordlist_file is not None
+        and os.path.basename(wordlist_file) == entry["wordlist-file"]
+        and grader.IsPrecomputeCurrent(grading, entry, solution_info)
+        and entry["wordlist-hash"] == FileDigest(wordlist_file)
+    )
+
+
+# remove the wordlist recorded in 'entry' (see ReadPrecomputeRecord() in
+# grader.py) from 'solution_dir', if it is still there.
+def RemoveWordlist(solution_dir: str, entry: Dict[str, Any]) -> None:
+    wordlist_file = os.path.join(solution_dir, entry["wordlist-file"])
+    if os.path.exists(wordlist_file):
+        os.remove(wordlist_file)
+
+
+# return the number of words named in the filename of a context-free solution
+# (which CountSolutionWords() in grader.py replaces by the number of words in a
+# wordlist that wasn't generated here).
+def NamedWords(solution_info) -> int:
+    return int(os.path.basename(solution_info["file"]).split(".")[2])
+
+
+# generate the wordlist for a context-free solution into 'wordlist_file', in the
+# binary format (see wordlist.py) if 'binary' is set. the wordlist is written to
+# a partial file first and then replaces 'wordlist_file' all at once, so that an
+# interrupted run never leaves a partial wordlist behind (and if it is killed,
+# the next run removes the partial file). returns None, or an error message if
+# mentor failed.
+def GenerateWordlist(
+    grading: Dict[str, Any], solution_info, wordlist_file: str, binary: bool
+) -> str:
+    partial_file = text_file = wordlist_file + partial_suffix
+    binary_file = wordlist_file + ".binary" + partial_suffix
+    cmd = [
+        grading["mentor"],
+        solution_info["file"],
+        "gen_words",
+        str(NamedWords(solution_info)),
+    ]
+    try:
+        status, output, _ = grader.ExecMentor(grading, cmd, partial_file)
+        if status != "ok":
+            return f"gen_words failed ({status}):\n{output}"
+        if binary:
+            text_file, partial_file = partial_file, binary_file
+            ConvertWordlistFile(text_file, partial_file, True)
+        os.replace(partial_file, wordlist_file)
+        return None
+    finally:
+        for file in [text_file, binary_file]:
+            if os.path.exists(file):
+                os.remove(file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate the missing wordlists of context-free solutions."
+    )
+    parser.add_argument(
+        "solutions_dir",
+        nargs="?",
+        default=os.path.join(autograder_dir, "solutions"),
+        help="the solutions directory (default: solutions/)",
+    )
+    parser.add_argument(
+        "--mentor",
+        default=os.path.join(autograder_dir, "mentor"),
+        help="the mentor executable to use (default: mentor)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of wordlists to generate at once (default: number of cores)",
+    )
+    parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="write the wordlists in the smaller binary format (see wordlist.py)",
+    )
+    args = parser.parse_args()
+
+    # generating a wordlist isn't limited by the grader's time budget, only by
+    # 'mentor_timeout' for each command.
+    grader.time_budget = float("inf")
+    solution_dir = os.path.abspath(args.solutions_dir)
+    mentor = os.path.abspath(args.mentor)
+    mentor_hash = FileDigest(mentor)
+    record = grader.ReadPrecomputeRecord(solution_dir)
+    for file in os.listdir(solution_dir):
+        if file.endswith(partial_suffix):
+            os.remove(os.path.join(solution_dir, file))
+
+    grading = grader.NewGrading(solution_dir, solution_dir, mentor)
+    # the solutions have to be read as they are now, not as the manifest has
+    # them (see BuildSolutionManifest()).
+    grading["manifest"] = None
+    try:
+        # the solutions whose wordlists need to be generated.
+        to_generate = []
+        solved = set()
+        for solution_file in sorted(grading["solution-files"]):
+            solution_info = grader.GetSolutionInfo(grading, solution_file)
+            if (
+                not solution_info
+                or grader.LanguageClass(solution_info["file-type"]) != "context-free"
+            ):
+                continue
+            problem_id = solution_file.split(".")[0]
+            solved.add(problem_id)
+            if problem_id in record:
+                if IsUpToDate(grading, record[problem_id], solution_info):
+                    continue
+                # a wordlist generated here that is out of date is replaced.
+                solution_info.pop("wordlist-file", None)
+                RemoveWordlist(solution_dir, record.pop(problem_id))
+            if "wordlist-file" in solution_info:
+                grader.CountSolutionWords(solution_info)
+                if solution_info["num-words"] != NamedWords(solution_info):
+                    print(
+                        f"warning: {os.path.basename(solution_info['wordlist-file'])} "
+                        f"has {solution_info['num-words']} words, but "
+                        f"{solution_file} names {NamedWords(solution_info)}"
+                    )
+                continue
+            to_generate.append((problem_id, solution_info))
+
+        # the wordlists generated for solutions that were removed since.
+        for problem_id in set(record) - solved:
+            RemoveWordlist(solution_dir, record.pop(problem_id))
+
+        # returns the record entry for the wordlist it generates, or None if
+        # mentor failed.
+        def Generate(problem_id: str, solution_info):
+            wordlist_file = os.path.join(
+                solution_dir, f"{problem_id}.{solution_info['file-type']}.wordlist"
+            )
+            error = GenerateWordlist(grading, solution_info, wordlist_file, args.binary)
+            if error is not None:
+                print(f"{problem_id}: {error}")
+                return None
+            return {
+                "wordlist-file": os.path.basename(wordlist_file),
+                "solution-hash": FileDigest(solution_info["file"]),
+                "num-words": NamedWords(solution_info),
+                "mentor-hash": mentor_hash,
+                "wordlist-hash": FileDigest(wordlist_file),
+            }
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {
+                pool.submit(Generate, problem_id, solution_info): problem_id
+                for problem_id, solution_info in to_generate
+            }
+            for future in as_completed(futures):
+                problem_id = futures[future]
+                entry = future.result()
+                if entry is None:
+                    failed.append(problem_id)
+                    continue
+                record[problem_id] = entry
+                WriteRecord(solution_dir, record)
+                wordlist_file = os.path.join(solution_dir, entry["wordlist-file"])
+                print(
+                    f"generated {entry['wordlist-file']} "
+                    f"({CountWordlistFileWords(wordlist_file)} words)"
+                )
+    finally:
+        grader.FinishGrading(grading)
+
+    # the record is written even if nothing was generated, e.g., when an out of
+    # date wordlist was removed without being replaced.
+    WriteRecord(solution_dir, record)
+    print(f"generated {len(to_generate) - len(failed)} of {len(to_generate)} wordlists")
+    if failed:
+        sys.exit(f"failed to generate: {', '.join(sorted(failed))}")
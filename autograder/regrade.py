@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+# regrade a whole batch of submissions at once, e.g., after fixing a wrong
+# solution file, instead of re-running the autograder on gradescope once per
+# student. this runs outside of gradescope, using grader.py as a library.
+#
+# the submissions are the subdirectories of 'submissions-dir' (e.g., an export
+# of the submissions from gradescope), one per student, named after the student.
+# each holds the student's submitted files, and optionally the student's
+# submission metadata as submission_metadata.json (see
+# 'submission_metadata_file' in grader.py), which is used for the scores of
+# problems that the submission doesn't include. the cooldown doesn't apply to a
+# regrade, so every submitted problem is graded again.
+#
+# the results for each student are written to
+# 'output-dir'/<student>/results.json, in the same format as on gradescope, and
+# a summary of the scores of all the students to 'output-dir'/summary.csv.
+#
+# the submissions are graded in parallel by a pool of worker processes, each
+# grading one submission at a time. the solution wordlists for context-free
+# problems are generated just once, before grading starts, and shared by all the
+# workers (see PrecomputeSolutionWordlists()). the results of mentor commands
+# are remembered in a directory (see 'mentor_memo_dir' in grader.py) shared by
+# the workers, and across regrades, so a command that was already run, e.g.,
+# for a submission that didn't change since the last regrade, isn't run again.
+# likewise, the results of grading problems are remembered by the canonical form
+# of the submitted file (see 'verdict_memo_dir' in grader.py), so submissions
+# that are the same up to comments, formatting, and names are graded only once.
+#
+# usage: ./regrade.py <submissions-dir> <output-dir> [--solutions DIR] ...
+#        (see ./regrade.py --help)
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict
+
+import grader
+from wordlist import FingerprintWordlistFile, WriteFingerprints
+
+autograder_dir = os.path.dirname(os.path.abspath(__file__))
+
+# the name of the submission metadata file in a student's submission directory.
+metadata_name = "submission_metadata.json"
+
+
+# generate the wordlists of the context-free solutions in 'solution_dir' that
+# don't already come with one, running up to 'jobs' mentor commands at once, and
+# write them (and, for large wordlists, their fingerprints) into 'artifact_dir'.
+# returns the pre-generated solution wordlists for GradeSubmission() in
+# grader.py. solutions whose gen_words fails are left out, so that grading
+# reports the error for them as usual.
+def PrecomputeSolutionWordlists(
+    solution_dir: str, artifact_dir: str, mentor: str, jobs: int
+) -> Dict[str, Dict[str, Any]]:
+    grading = grader.NewGrading(solution_dir, solution_dir, mentor)
+    try:
+        # returns the pre-generated wordlist record for the given solution, or
+        # None if there isn't one.
+        def Precompute(solution_info):
+            problem_id = os.path.basename(solution_info["file"]).split(".")[0]
+            wordlist_file = os.path.join(artifact_dir, f"{problem_id}.wordlist")
+            cmd = [
+                mentor,
+                solution_info["file"],
+                "gen_words",
+                str(solution_info["num-words"]),
+            ]
+            status, output, _ = grader.ExecMentor(grading, cmd, wordlist_file)
+            if status != "ok":
+                print(f"gen_words failed for {problem_id} ({status}):\n{output}")
+                os.remove(wordlist_file)
+                return None
+            # the wordlist of a finite language can have fewer words than
+            # <num-words>, but the student's words beyond those still have to be
+            # compared.
+            record = {
+                "wordlist-file": wordlist_file,
+                "num-words": solution_info["num-words"],
+            }
+            if record["num-words"] >= grader.fingerprint_words:
+                record["fingerprint-file"] = wordlist_file + ".fingerprints"
+                WriteFingerprints(
+                    FingerprintWordlistFile(wordlist_file), record["fingerprint-file"]
+                )
+            return (problem_id, record)
+
+        # a wordlist that precompute.py generated but that is out of date
+        # doesn't show up in the solution info (see GetSolutionInfo()), so it is
+        # generated again here.
+        to_precompute = []
+        for solution_file in sorted(grading["solution-files"]):
+            solution_info = grader.GetSolutionInfo(grading, solution_file)
+            if (
+                solution_info
+                and grader.LanguageClass(solution_info["file-type"]) == "context-free"
+                and "wordlist-file" not in solution_info
+            ):
+                to_precompute.append(solution_info)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            records = pool.map(Precompute, to_precompute)
+            return dict(record for record in records if record is not None)
+    finally:
+        grader.FinishGrading(grading)
+
+
+# set up grader.py in a worker process: each worker grades one problem at a
+# time, since the workers already keep all the cores busy, and a regrade has no
+# time budget or cooldown. 'memo_dir' and 'verdict_dir' are the
+# 'mentor_memo_dir' and 'verdict_memo_dir' to use.
+def InitWorker(memo_dir: str, verdict_dir: str) -> None:
+    grader.mentor_memo_dir = memo_dir
+    grader.verdict_memo_dir = verdict_dir
+    grader.max_concurrency = 1
+    grader.time_budget = float("inf")
+    grader.cooldown = -1
+
+
+# grade the submission in 'student_dir' and return its results (see
+# GradeSubmission() in grader.py). the grader converts the submitted files in
+# place, so it grades a copy of them.
+def RegradeStudent(
+    student_dir: str,
+    solution_dir: str,
+    mentor: str,
+    solution_wordlists: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    metadata_file = os.path.join(student_dir, metadata_name)
+    if not os.path.isfile(metadata_file):
+        metadata_file = None
+    with tempfile.TemporaryDirectory(prefix="regrade-") as tmp:
+        submission_dir = os.path.join(tmp, "submission")
+        shutil.copytree(student_dir, submission_dir)
+        return grader.GradeSubmission(
+            submission_dir, solution_dir, metadata_file, mentor, solution_wordlists
+        )
+
+
+# write 'output_dir'/summary.csv with one row per student (in the order of
+# 'students') giving the score for each problem and the total score.
+def WriteSummary(output_dir: str, students, results: Dict[str, Any]) -> None:
+    problem_ids = sorted(
+        {test["name"] for student in results for test in results[student]["tests"]}
+    )
+    with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["student"] + problem_ids + ["total"])
+        for student in students:
+            if student not in results:
+                continue
+            scores = {test["name"]: test["score"] for test in results[student]["tests"]}
+            writer.writerow(
+                [student]
+                + [scores.get(problem_id, "") for problem_id in problem_ids]
+                + [sum(scores.values())]
+            )
+
+
+# the workers are separate processes, which may import this file, so the
+# regrade itself only runs when this is the main program.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regrade a batch of submissions.")
+    parser.add_argument(
+        "submissions_dir", help="directory with one subdirectory per student submission"
+    )
+    parser.add_argument("output_dir", help="directory to write the results to")
+    parser.add_argument(
+        "--solutions",
+        default=os.path.join(autograder_dir, "solutions"),
+        help="the solutions directory (default: solutions/)",
+    )
+    parser.add_argument(
+        "--mentor",
+        default=os.path.join(autograder_dir, "mentor"),
+        help="the mentor executable to use (default: mentor)",
+    )
+    parser.add_argument(
+        "--memo",
+        help="directory to remember mentor results in (default: <output-dir>/mentor-memo)",
+    )
+    parser.add_argument(
+        "--verdicts",
+        help="directory to remember grading results in (default: <output-dir>/verdict-memo)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of submissions to grade at once (default: number of cores)",
+    )
+    args = parser.parse_args()
+
+    mentor = os.path.abspath(args.mentor)
+    solution_dir = os.path.abspath(args.solutions)
+    students = sorted(
+        student
+        for student in os.listdir(args.submissions_dir)
+        if os.path.isdir(os.path.join(args.submissions_dir, student))
+    )
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # the pre-generated solution wordlists are kept in 'output_dir', alongside
+    # the results.
+    artifact_dir = os.path.join(args.output_dir, "solution-wordlists")
+    os.makedirs(artifact_dir, exist_ok=True)
+    memo_dir = os.path.abspath(
+        args.memo or os.path.join(args.output_dir, "mentor-memo")
+    )
+    verdict_dir = os.path.abspath(
+        args.verdicts or os.path.join(args.output_dir, "verdict-memo")
+    )
+    grader.mentor_memo_dir = memo_dir
+    grader.time_budget = float("inf")
+    solution_wordlists = PrecomputeSolutionWordlists(
+        solution_dir, os.path.abspath(artifact_dir), mentor, args.jobs
+    )
+
+    results = {}
+    failed = []
+    with ProcessPoolExecutor(
+        max_workers=args.jobs, initializer=InitWorker, initargs=(memo_dir, verdict_dir)
+    ) as pool:
+        futures = {
+            pool.submit(
+                RegradeStudent,
+                os.path.abspath(os.path.join(args.submissions_dir, student)),
+                solution_dir,
+                mentor,
+                solution_wordlists,
+            ): student
+            for student in students
+        }
+        for future in as_completed(futures):
+            student = futures[future]
+            try:
+                results[student] = future.result()
+            except Exception as error:
+                print(f"grading {student} failed: {error!r}")
+                failed.append(student)
+                continue
+            os.makedirs(os.path.join(args.output_dir, student), exist_ok=True)
+            grader.WriteResults(
+                results[student], os.path.join(args.output_dir, student, "results.json")
+            )
+
+    WriteSummary(args.output_dir, students, results)
+    print(f"regraded {len(results)} of {len(students)} submissions")
+    if failed:
+        sys.exit(f"failed to grade: {', '.join(sorted(failed))}")
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+# a resident grader, for grading many submissions one after another (e.g., a
+# batch regrade, or a TA trying out changes to a submission) without paying for
+# starting python, importing the grader, and reading the solutions every time.
+# this runs outside of gradescope, using grader.py as a library.
+#
+# the server keeps a manifest of the solutions in memory (see
+# 'solution_manifest' in grader.py), and listens for grading jobs on a unix
+# socket. every job is graded in a child process forked from the server, which
+# starts out with everything the server has already loaded and grades the
+# submission exactly as a run of grader.py would (with the same settings from
+# grader.py, and the same results). the manifest is rebuilt before a job if any
+# solution file changed since it was built, so the solutions are never stale.
+#
+# a job is a single line of json sent to the socket, in the format:
+#
+# { 'submission-dir': "</path/to/dir>", // see 'student_submission_dir'
+#   'metadata-file': "</path/to/file>", // optional, see
+#                                       // 'submission_metadata_file'
+#   'results-file': "</path/to/file>", // optional, see 'results_file'
+#   'checkpoint-file': "</path/to/file>" // optional, see 'checkpoint_file'
+# }
+#
+# and the server answers with a single line of json, which is either
+# {'results': <results>} with the results (in the format of 'results_file'),
+# or {'error': "<message>"} if grading failed. the results are also written to
+# 'results-file', if it is given, as grader.py writes them.
+#
+# usage: ./server.py serve [--socket PATH] [--solutions DIR] [--mentor PATH] ...
+#        ./server.py grade <submission-dir> [--socket PATH] [--metadata FILE] ...
+#        (see ./server.py serve --help and ./server.py grade --help)
+
+import argparse
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import tempfile
+import traceback
+from typing import Any, Dict, List, Tuple
+
+import grader
+
+autograder_dir = os.path.dirname(os.path.abspath(__file__))
+
+# the default path of the server's socket. it is in a directory that only the
+# user can access (the user's runtime directory, or one in the temporary
+# directory), so that other users can't send the server jobs or replace its
+# socket.
+default_socket = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR")
+    or os.path.join(tempfile.gettempdir(), f"mentor-grader-{os.getuid()}"),
+    "mentor-grader.sock",
+)
+
+
+# return the size and modification time of every file in 'solution_dir', which
+# tell whether the solutions changed since they were read.
+def SolutionStats(solution_dir: str) -> List[Tuple[str, int, int]]:
+    stats = []
+    with os.scandir(solution_dir) as entries:
+        for entry in entries:
+            if entry.is_file():
+                info = entry.stat()
+                stats.append((entry.name, info.st_size, info.st_mtime_ns))
+    return sorted(stats)
+
+
+# return a manifest of the solutions in 'solution_dir' (see 'manifest' in
+# NewGrading()) for the solution files with the given 'stats', from
+# SolutionStats() before building it. a solution file that changes after that
+# has a later modification time, so the grader doesn't use the manifest for it.
+def BuildManifest(solution_dir: str, mentor: str, stats) -> Dict[str, Any]:
+    grading = grader.NewGrading(solution_dir, solution_dir, mentor)
+    try:
+        manifest = grader.BuildSolutionManifest(grading)
+    finally:
+        grader.FinishGrading(grading)
+    manifest["modified"] = max((modified for _, _, modified in stats), default=0)
+    return manifest
+
+
+# grade the given job (see above) against the solutions in 'solution_dir' and
+# return the answer to it.
+def GradeJob(
+    job: Dict[str, Any], solution_dir: str, mentor: str, manifest: Dict[str, Any]
+) -> Dict[str, Any]:
+    try:
+        results = grader.GradeSubmission(
+            job["submission-dir"],
+            solution_dir,
+            job.get("metadata-file"),
+            mentor,
+            results_file=job.get("results-file"),
+            checkpoint_file=job.get("checkpoint-file"),
+            manifest=manifest,
+        )
+        if job.get("results-file") is not None:
+            grader.WriteResults(results, job["results-file"])
+        return {"results": results}
+    except Exception:
+        return {"error": traceback.format_exc()}
+
+
+# answer the job on the given connection, in a child process.
+def ServeJob(
+    connection: socket.socket, solution_dir: str, mentor: str, manifest
+) -> None:
+    with connection, connection.makefile("rwb") as stream:
+        try:
+            job = json.loads(stream.readline())
+        except ValueError as error:
+            answer = {"error": f"invalid job: {error}"}
+        else:
+            answer = GradeJob(job, solution_dir, mentor, manifest)
+        stream.write(json.dumps(answer).encode("utf-8") + b"\n")
+
+
+# wait for child processes in 'children' to finish, until fewer than 'jobs' of
+# them are running. waits for all of them if 'jobs' is 1.
+def ReapChildren(children: set, jobs: int) -> None:
+    while children:
+        block = len(children) >= jobs
+        pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+        if pid == 0:
+            return
+        children.discard(pid)
+
+
+# make 'socket_path' free for the server to listen on. exits if another server
+# is already listening on it, or if it is something other than a socket. a
+# socket that nothing is listening on was left behind by a server that didn't
+# stop cleanly, and is removed.
+def ClaimSocket(socket_path: str) -> None:
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        sys.exit(f"{socket_path} already exists and isn't a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    sys.exit(f"a server is already listening on {socket_path}")
+
+
+# create the directory 'path' of the default socket, if it doesn't exist yet, so
+# that only the user can access it. exits if it belongs to another user or
+# others can access it (e.g., another user created it first in the shared
+# temporary directory).
+def MakeSocketDir(path: str) -> None:
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        sys.exit(f"{path} has to be a directory that only you can access")
+
+
+# run the server on 'socket_path' until it is interrupted, grading up to 'jobs'
+# submissions at once.
+def Serve(socket_path: str, solution_dir: str, mentor: str, jobs: int) -> None:
+    # the cores are shared by the jobs that run at the same time.
+    grader.max_concurrency = max(1, grader.max_concurrency // jobs)
+    stats = SolutionStats(solution_dir)
+    manifest = BuildManifest(solution_dir, mentor, stats)
+    print(f"read {len(manifest['solutions'])} solution files")
+
+    if socket_path == default_socket:
+        MakeSocketDir(os.path.dirname(socket_path))
+    ClaimSocket(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    # only the user may send jobs, even if the socket is somewhere others can
+    # get to.
+    os.chmod(socket_path, 0o600)
+    listener.listen()
+    # stop cleanly (removing the socket) on SIGTERM as on ctrl-c.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"listening on {socket_path}")
+    children: set = set()
+    try:
+        while True:
+            connection, _ = listener.accept()
+            ReapChildren(children, jobs)
+            current = SolutionStats(solution_dir)
+            if current != stats:
+                stats = current
+                manifest = BuildManifest(solution_dir, mentor, stats)
+                print(f"reread {len(manifest['solutions'])} solution files")
+            sys.stdout.flush()
+            pid = os.fork()
+            if pid == 0:
+                # the child grades the job and exits without running any of the
+                # server's cleanup.
+                status = 0
+                try:
+                    listener.close()
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    ServeJob(connection, solution_dir, mentor, manifest)
+                except BaseException:
+                    traceback.print_exc()
+                    status = 1
+                finally:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    os._exit(status)
+            connection.close()
+            children.add(pid)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        os.remove(socket_path)
+        ReapChildren(children, 1)
+
+
+# send a job (see above) to the server on 'socket_path' and return its answer.
+def SendJob(socket_path: str, job: Dict[str, Any]) -> Dict[str, Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        with connection.makefile("rwb") as stream:
+            stream.write(json.dumps(job).encode("utf-8") + b"\n")
+            stream.flush()
+            connection.shutdown(socket.SHUT_WR)
+            return json.loads(stream.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A resident grader.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the server")
+    serve.add_argument(
+        "--socket", default=default_socket, help=f"(default: {default_socket})"
+    )
+    serve.add_argument(
+        "--solutions",
+        default=os.path.join(autograder_dir, "solutions"),
+        help="the solutions directory (default: solutions/)",
+    )
+    serve.add_argument(
+        "--mentor",
+        default=os.path.join(autograder_dir, "mentor"),
+        help="the mentor executable to use (default: mentor)",
+    )
+    serve.add_argument(
+        "--jobs", type=int, default=1, help="number of submissions to grade at once"
+    )
+    grade = commands.add_parser("grade", help="grade a submission with the server")
+    grade.add_argument("submission_dir", help="the submitted files")
+    grade.add_argument(
+        "--socket", default=default_socket, help=f"(default: {default_socket})"
+    )
+    grade.add_argument("--metadata", help="the submission metadata file")
+    grade.add_argument(
+        "--results", help="file to write the results to (default: print them)"
+    )
+    grade.add_argument("--checkpoint", help="the checkpoint file")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        Serve(
+            args.socket,
+            os.path.abspath(args.solutions),
+            os.path.abspath(args.mentor),
+            args.jobs,
+        )
+        sys.exit()
+
+    # the server runs in a different directory, so the paths are absolute.
+    job = {"submission-dir": os.path.abspath(args.submission_dir)}
+    for key, path in [
+        ("metadata-file", args.metadata),
+        ("results-file", args.results),
+        ("checkpoint-file", args.checkpoint),
+    ]:
+        if path is not None:
+            job[key] = os.path.abspath(path)
+    answer = SendJob(args.socket, job)
+    if "error" in answer:
+        sys.exit(f"grading failed:\n{answer['error']}")
+    if args.results is None:
+        print(json.dumps(answer["results"]))
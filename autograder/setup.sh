@@ -8,5 +8,6 @@ apt update
 apt install -y build-essential libgoogle-glog-dev libgtest-dev libgmp-dev libgmp10
 apt full-upgrade -y
 
-# install numpy. Used for cfg/pda output.
+# install numpy. optional, used to compare very large context-free wordlists
+# (see 'fingerprint_words' in grader.py).
 pip3 install numpy
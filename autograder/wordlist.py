@@ -0,0 +1,428 @@
+# helpers for the wordlists used to grade context-free problems. a wordlist is
+# a list of words in shortlex order, as generated by mentor's gen_words command
+# (or pre-generated into a .wordlist solution file).
+#
+# wordlist files are either text, with one word per line (as mentor writes
+# them), or in a compact binary format (see 'binary_magic'). the functions here
+# that read wordlist files read either format, and WordlistFileWords() reads
+# either one a word at a time (a block at a time for the binary format). the
+# binary format is smaller, and counting its words and looking up single words
+# is fast, but reading through all of its words (decoding them in python) is
+# somewhat slower than reading a text file. to convert between them, run:
+#
+#   python3 wordlist.py {binary, text} <wordlist-file> <output-file>
+
+import hashlib
+import itertools
+import mmap
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# a binary wordlist file starts with these bytes (which a text wordlist never
+# does). words in shortlex order share long prefixes with the word before them,
+# so each word is front-coded: stored as the number of leading bytes (of its
+# utf-8 encoding) that it shares with the previous word, followed by the rest of
+# it. the words are grouped into blocks of 'block_words' words, the first of
+# which is stored whole, so that any word can be found by decoding only its
+# block. after 'binary_magic', the file has:
+#
+# - the blocks, with each word as <shared bytes> <rest length> <rest>, where the
+#   two numbers are varints (7 bits per byte, least significant first, with the
+#   high bit set on all but the last byte)
+# - padding to a multiple of 8 bytes
+# - the offset of each block in the file
+# - the number of words, the offset of the block offsets, and the number of
+#   words per block
+#
+# where the offsets and the numbers at the end are 8 bytes each, in the same
+# byte order as fingerprint files (see WriteFingerprints()).
+binary_magic = b"\x00wordlist\x01\n"
+
+# the number of words per block in the binary wordlist files that are written.
+block_words = 64
+
+# the number of words fingerprinted at a time (see FingerprintWordlistFile()).
+fingerprint_chunk = 2**12
+
+
+# the sort key for shortlex order, which is the order mentor generates words in:
+# shorter words come first, and words of the same length are in lexicographic
+# order. mentor prints the empty word as "ε".
+def ShortlexKey(word: str) -> Tuple[int, str]:
+    if word == "ε":
+        return (0, "")
+    return (len(word), word)
+
+
+# return whether the given wordlist is strictly increasing in shortlex order
+# (i.e., sorted and without duplicates).
+def IsShortlexOrdered(wordlist: List[str]) -> bool:
+    # "ε" can only be the first word; after that we compare lengths and words
+    # directly, which is much faster than building a ShortlexKey() per word.
+    start = 1 if wordlist and wordlist[0] == "ε" else 0
+    previous = None
+    previous_length = -1
+    for word in itertools.islice(wordlist, start, None):
+        length = len(word)
+        if word == "ε" or length < previous_length:
+            return False
+        if length == previous_length and word <= previous:
+            return False
+        previous = word
+        previous_length = length
+    return True
+
+
+# return the given wordlist in shortlex order with duplicates removed. a list
+# that is already in order (which is the normal case) is returned as is.
+def ShortlexOrdered(wordlist: List[str]) -> List[str]:
+    if IsShortlexOrdered(wordlist):
+        return wordlist
+    return sorted(set(wordlist), key=ShortlexKey)
+
+
+# compute the differences between a student wordlist and a solution wordlist.
+# returns a pair (false positives, false negatives) s.t. false positives are
+# words in the student list that aren't in the solution and false negatives are
+# words in the solution that aren't in the student list, both in shortlex order
+# so that the shortest counterexamples come first.
+#
+# because mentor generates both lists in shortlex order this is a linear merge
+# of the two lists; lists that aren't in order (e.g., a hand-written wordlist
+# file) are sorted first.
+def ShortlexDiff(
+    student_wordlist: List[str], solution_wordlist: List[str]
+) -> Tuple[List[str], List[str]]:
+    # a correct submission generates exactly the solution wordlist; comparing
+    # the lists directly is much faster than merging them.
+    if student_wordlist == solution_wordlist:
+        return ([], [])
+
+    student_wordlist = ShortlexOrdered(student_wordlist)
+    solution_wordlist = ShortlexOrdered(solution_wordlist)
+
+    false_positives = []
+    false_negatives = []
+    i = j = 0
+    while i < len(student_wordlist) and j < len(solution_wordlist):
+        student_word = student_wordlist[i]
+        solution_word = solution_wordlist[j]
+        if student_word == solution_word:
+            i += 1
+            j += 1
+        elif ShortlexKey(student_word) < ShortlexKey(solution_word):
+            false_positives.append(student_word)
+            i += 1
+        else:
+            false_negatives.append(solution_word)
+            j += 1
+    false_positives.extend(student_wordlist[i:])
+    false_negatives.extend(solution_wordlist[j:])
+    return (false_positives, false_negatives)
+
+
+# iterate over the words in a wordlist file. in a text wordlist file, which
+# contains one word per line, blank lines are ignored.
+def WordlistFileWords(wordlist_file: str) -> Iterator[str]:
+    if IsBinaryWordlistFile(wordlist_file):
+        yield from BinaryWordlistWords(MapBinaryWordlist(wordlist_file))
+        return
+    with open(wordlist_file, "r", encoding="utf-8") as handle:
+        for line in handle:
+            word = line.strip()
+            if word:
+                yield word
+
+
+# read the words in a wordlist file into a list.
+def ReadWordlistFile(wordlist_file: str) -> List[str]:
+    return list(WordlistFileWords(wordlist_file))
+
+
+# count the words in a wordlist file without keeping them in memory. a binary
+# wordlist file records its number of words, so it doesn't need to be read.
+def CountWordlistFileWords(wordlist_file: str) -> int:
+    if IsBinaryWordlistFile(wordlist_file):
+        return MapBinaryWordlist(wordlist_file)["count"]
+    return sum(1 for _ in WordlistFileWords(wordlist_file))
+
+
+# return whether the given wordlist file is in the binary format (see
+# 'binary_magic').
+def IsBinaryWordlistFile(wordlist_file: str) -> bool:
+    with open(wordlist_file, "rb") as handle:
+        return handle.read(len(binary_magic)) == binary_magic
+
+
+# write the given words (in any order) to 'wordlist_file' in the binary format
+# (see 'binary_magic'). the words are written as they come, so they don't all
+# need to be in memory at once.
+def WriteBinaryWordlist(words: Iterable[str], wordlist_file: str) -> None:
+    offsets = array("Q")
+    count = 0
+    previous = b""
+    with open(wordlist_file, "wb") as handle:
+        handle.write(binary_magic)
+        position = len(binary_magic)
+        buffer = bytearray()
+        for word in words:
+            encoded = word.encode("utf-8")
+            if count % block_words == 0:
+                offsets.append(position + len(buffer))
+                shared = 0
+            else:
+                shared = SharedPrefixLength(previous, encoded)
+            rest = len(encoded) - shared
+            if shared < 0x80 and rest < 0x80:
+                buffer += bytes((shared, rest))
+            else:
+                buffer += Varint(shared) + Varint(rest)
+            buffer += encoded[shared:]
+            previous = encoded
+            count += 1
+            if len(buffer) >= 2**16:
+                handle.write(buffer)
+                position += len(buffer)
+                buffer = bytearray()
+        buffer += bytes(-(position + len(buffer)) % 8)
+        handle.write(buffer)
+        position += len(buffer)
+        handle.write(offsets.tobytes())
+        handle.write(array("Q", [count, position, block_words]).tobytes())
+
+
+# return the length of the longest common prefix of two byte strings. the
+# first byte that differs is the highest nonzero byte of the two (equally long)
+# prefixes xor-ed as big numbers, which is much faster than comparing byte by
+# byte.
+def SharedPrefixLength(first: bytes, second: bytes) -> int:
+    length = min(len(first), len(second))
+    difference = int.from_bytes(first[:length], "big") ^ int.from_bytes(
+        second[:length], "big"
+    )
+    return length - (difference.bit_length() + 7) // 8
+
+
+# return the given non-negative number as a varint (see 'binary_magic').
+def Varint(number: int) -> bytes:
+    if number < 0x80:
+        return bytes([number])
+    encoded = bytearray()
+    while number >= 0x80:
+        encoded.append(number & 0x7F | 0x80)
+        number >>= 7
+    encoded.append(number)
+    return bytes(encoded)
+
+
+# return a pair (the varint at 'position' in 'data', the position after it).
+def ReadVarint(data, position: int) -> Tuple[int, int]:
+    number = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return (number, position)
+        shift += 7
+
+
+# return a binary wordlist file (see 'binary_magic'), memory-mapped rather than
+# read, so that only the parts of it that are used take up memory. returns a
+# record in the format:
+#
+# { 'data': <the memory-mapped file>,
+#   'count': <int>, // the number of words
+#   'offsets': <the offset of each block>, // a memoryview of format 'Q'
+#   'block-words': <int>, // the number of words per block
+# }
+def MapBinaryWordlist(wordlist_file: str) -> Dict[str, Any]:
+    with open(wordlist_file, "rb") as handle:
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    count, index, words = memoryview(data)[-24:].cast("Q")
+    blocks = -(-count // words)
+    return {
+        "data": data,
+        "count": count,
+        "offsets": memoryview(data)[index : index + 8 * blocks].cast("Q"),
+        "block-words": words,
+    }
+
+
+# iterate over the words of a block of a memory-mapped binary wordlist (see
+# MapBinaryWordlist()).
+def BinaryWordlistBlock(wordlist: Dict[str, Any], block: int) -> Iterator[str]:
+    offsets = wordlist["offsets"]
+    end = offsets[block + 1] if block + 1 < len(offsets) else len(wordlist["data"])
+    # the block is copied out of the file first, since indexing bytes is much
+    # faster than indexing the memory-mapped file. the words are decoded all at
+    # once at the end.
+    data = wordlist["data"][offsets[block] : end]
+    first = block * wordlist["block-words"]
+    words = []
+    previous = b""
+    position = 0
+    for _ in range(min(wordlist["block-words"], wordlist["count"] - first)):
+        # most words share fewer than 128 bytes with the previous word and are
+        # shorter than 128 bytes, so their varints are a single byte.
+        shared = data[position]
+        if shared < 0x80:
+            position += 1
+        else:
+            shared, position = ReadVarint(data, position)
+        length = data[position]
+        if length < 0x80:
+            position += 1
+        else:
+            length, position = ReadVarint(data, position)
+        previous = previous[:shared] + data[position : position + length]
+        position += length
+        words.append(previous)
+    return iter(b"\n".join(words).decode("utf-8").split("\n") if words else [])
+
+
+# iterate over the words of a memory-mapped binary wordlist (see
+# MapBinaryWordlist()).
+def BinaryWordlistWords(wordlist: Dict[str, Any]) -> Iterator[str]:
+    for block in range(len(wordlist["offsets"])):
+        yield from BinaryWordlistBlock(wordlist, block)
+
+
+# convert 'wordlist_file' (in either format) to 'output_file', in the binary
+# format if 'binary' is set and in the text format otherwise.
+def ConvertWordlistFile(wordlist_file: str, output_file: str, binary: bool) -> None:
+    if binary:
+        WriteBinaryWordlist(WordlistFileWords(wordlist_file), output_file)
+        return
+    with open(output_file, "w", encoding="utf-8") as handle:
+        for word in WordlistFileWords(wordlist_file):
+            handle.write(word + "\n")
+
+
+# very large wordlists take a lot of memory as lists of python strings, so they
+# can instead be fingerprinted: each word is replaced by a 64-bit hash of the
+# word, and the words themselves stay in the wordlist file until they are
+# needed (e.g., to give a counterexample to the student). a fingerprinted
+# wordlist is a record in the format:
+#
+# { 'file': "</path/to/file>", // the wordlist file (in either format)
+#   'fingerprints': <the fingerprints of the words, in the same order>
+# }
+#
+# the fingerprints are an array('Q'), or a memoryview of the same format if they
+# are memory-mapped from a fingerprint file (see MapFingerprints()). either way
+# they take 8 bytes per word. two different words have the same fingerprint
+# with probability 2^-64, which for 10^6 words makes a false match less likely
+# than one in ten million.
+
+
+# return the fingerprint of a word, as the 8 bytes of an array('Q') entry.
+def Fingerprint(word: str) -> bytes:
+    return hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+
+
+# return the fingerprinted version of the given wordlist file. the fingerprints
+# are added to the array 'fingerprint_chunk' words at a time, so that the
+# fingerprints are the only thing kept for the whole wordlist.
+def FingerprintWordlistFile(wordlist_file: str) -> Dict[str, Any]:
+    fingerprints = array("Q")
+    words = WordlistFileWords(wordlist_file)
+    while True:
+        chunk = b"".join(map(Fingerprint, itertools.islice(words, fingerprint_chunk)))
+        if not chunk:
+            break
+        fingerprints.frombytes(chunk)
+    return {"file": wordlist_file, "fingerprints": fingerprints}
+
+
+# write the fingerprints of a fingerprinted wordlist to 'fingerprint_file', so
+# that they can be memory-mapped later using MapFingerprints().
+def WriteFingerprints(wordlist: Dict[str, Any], fingerprint_file: str) -> None:
+    with open(fingerprint_file, "wb") as handle:
+        handle.write(memoryview(wordlist["fingerprints"]).cast("B"))
+
+
+# return the fingerprinted version of the given wordlist file, using the
+# fingerprints previously written to 'fingerprint_file' by WriteFingerprints().
+# the fingerprints are memory-mapped rather than read, so they only take up
+# memory as they are used and can be shared between processes.
+def MapFingerprints(wordlist_file: str, fingerprint_file: str) -> Dict[str, Any]:
+    with open(fingerprint_file, "rb") as handle:
+        if handle.seek(0, 2) == 0:  # an empty file can't be memory-mapped.
+            return {"file": wordlist_file, "fingerprints": array("Q")}
+        mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    return {"file": wordlist_file, "fingerprints": memoryview(mapping).cast("Q")}
+
+
+# the fingerprinted version of ShortlexDiff(). returns a pair (false positives,
+# false negatives) s.t. false positives are the indices of the words in the
+# student list whose fingerprints aren't in the solution and false negatives are
+# the indices of the words in the solution whose fingerprints aren't in the
+# student list, both in increasing order and containing at most 'limit' indices.
+# use WordlistFileWordsAt() to get the actual words.
+#
+# this uses numpy if it is installed, which is much faster and doesn't need any
+# memory beyond the fingerprints themselves; numpy is optional, so without it
+# this uses python sets instead.
+def FingerprintDiff(
+    student_wordlist: Dict[str, Any], solution_wordlist: Dict[str, Any], limit: int
+) -> Tuple[List[int], List[int]]:
+    student = student_wordlist["fingerprints"]
+    solution = solution_wordlist["fingerprints"]
+    if student == solution:
+        return ([], [])
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        student = np.frombuffer(student, dtype=np.uint64)
+        solution = np.frombuffer(solution, dtype=np.uint64)
+        false_positives = np.flatnonzero(~np.isin(student, solution))
+        false_negatives = np.flatnonzero(~np.isin(solution, student))
+        return (
+            false_positives[:limit].tolist(),
+            false_negatives[:limit].tolist(),
+        )
+
+    # returns the first 'limit' indices of fingerprints in 'first' that aren't
+    # in 'second'.
+    def Missing(first, second) -> List[int]:
+        second = set(second)
+        missing = (i for i, f in enumerate(first) if f not in second)
+        return list(itertools.islice(missing, limit))
+
+    return (Missing(student, solution), Missing(solution, student))
+
+
+# return the words at the given indices (as returned by FingerprintDiff()) of a
+# fingerprinted wordlist, in the same order as the indices. for a binary
+# wordlist file, only the blocks with those words are read.
+def WordlistFileWordsAt(wordlist: Dict[str, Any], indices: List[int]) -> List[str]:
+    wanted = set(indices)
+    words = {}
+    if wanted and IsBinaryWordlistFile(wordlist["file"]):
+        binary = MapBinaryWordlist(wordlist["file"])
+        size = binary["block-words"]
+        for i in wanted:
+            block = BinaryWordlistBlock(binary, i // size)
+            words[i] = next(itertools.islice(block, i % size, None))
+    elif wanted:
+        for i, word in enumerate(WordlistFileWords(wordlist["file"])):
+            if i in wanted:
+                words[i] = word
+                if len(words) == len(wanted):
+                    break
+    return [words[i] for i in indices]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ["binary", "text"]:
+        sys.exit(
+            "usage: python3 wordlist.py {binary, text} <wordlist-file> <output-file>"
+        )
+    ConvertWordlistFile(sys.argv[2], sys.argv[3], sys.argv[1] == "binary")
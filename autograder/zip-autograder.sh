@@ -1,2 +1,8 @@
 #!/usr/bin/env bash
+
+# generate the solution wordlists that are missing (see precompute.py), and
+# index the solutions first, so that the grader can look them up without
+# reading them (see manifest.py).
+python3 precompute.py solutions || exit 1
+python3 manifest.py solutions || exit 1
 zip -r mentor-autograder.zip .